@@ -0,0 +1,102 @@
+# bench/auth.py
+"""
+Authenticated request throughput with and without stateless JWT authorization.
+
+    python -m bench.auth --requests 2000
+
+Calls a permission-protected endpoint in-process (no network) as a user holding the
+permission through a role, in three modes: every check hitting the database, the
+per-user permission cache, and STATELESS_AUTH answering from the token claims.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from core.database import AsyncSessionLocal, engine  # noqa: E402
+from core.models.base import Base  # noqa: E402
+from core.services.auth import create_user_access_token, principal_cache  # noqa: E402
+from core.settings import settings  # noqa: E402
+from hymnal.models import hymn, hymn_book, hymn_search_document, hymn_variant_group, sync_change  # noqa: E402,F401
+from main import app  # noqa: E402
+from user_management.models import audit_log  # noqa: E402,F401
+from user_management.models.permission import Permission, RolePermission  # noqa: E402
+from user_management.models.role import Role, UserRole  # noqa: E402
+from user_management.models.user import User  # noqa: E402
+
+ENDPOINT = "/api/v1/hymnal/cache/stats"
+PERMISSION = "view_cache_stats"
+
+
+async def create_user() -> str:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        role = Role(name="bench")
+        permission = Permission(name=PERMISSION)
+        db.add_all([user, role, permission])
+        await db.flush()
+        db.add_all([UserRole(user_id=user.id, role_id=role.id), RolePermission(role_id=role.id, permission_id=permission.id)])
+        await db.commit()
+        return await create_user_access_token(db, user)
+
+
+async def throughput(client: httpx.AsyncClient, token: str) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    per_worker = args.requests // args.concurrency
+
+    async def worker():
+        for _ in range(per_worker):
+            response = await client.get(ENDPOINT, headers=headers)
+            assert response.status_code == 200, response.text
+
+    await worker()  # warm-up
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return per_worker * args.concurrency / (time.perf_counter() - start)
+
+
+async def main():
+    engine.echo = False
+    token = await create_user()
+    modes = {
+        "database": dict(STATELESS_AUTH=False, max_entries=0),
+        "permission cache": dict(STATELESS_AUTH=False, max_entries=settings.PERMISSION_CACHE_MAX_ENTRIES),
+        "stateless": dict(STATELESS_AUTH=True, max_entries=0),
+    }
+    print(f"{'mode':<18}{'requests/s':>12}")
+    for label, mode in modes.items():
+        settings.STATELESS_AUTH = mode["STATELESS_AUTH"]
+        principal_cache.max_entries = mode["max_entries"]
+        principal_cache.clear()
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                print(f"{label:<18}{await throughput(client, token):>12.0f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+# bench/corpus.py
+"""Deterministic synthetic hymnal corpus for benchmarks."""
+import itertools
+import random
+import uuid
+from typing import Dict, Iterator, List
+
+FUNCTION_WORDS = "the and of to in a is with for on be we he his me that".split()
+
+WORDS = (
+    "grace love lord holy spirit glory praise king jesus saviour cross blood heaven light faith hope "
+    "joy peace mercy soul heart rock shepherd lamb throne crown river mountain morning evening night "
+    "great wonderful mighty blessed precious sweet eternal faithful abide lead guide keep walk sing "
+    "rejoice come near thee thy thou my our all every day home land shore sea wind fire name word "
+    "redeemer friend father power victory refuge strength song trumpet angels zion jordan calvary"
+).split()
+
+SYLLABLES = "ba be bi bo da de di do fa fe fi ga ge go ha he ka ke la le li lo ma me mi mo na ne ni no ra re ri ro sa se si so ta te ti to va ve wa we ya yo za".split()
+
+# Real lyrics are Zipf-distributed: a few hundred common words and a long tail of rare ones
+_TAIL = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in ("", "n", "th", "s")})
+_rng = random.Random(0)
+_rng.shuffle(_TAIL)
+VOCABULARY = FUNCTION_WORDS + WORDS + _TAIL[:6000]
+_CUMULATIVE_WEIGHTS = list(itertools.accumulate(1.0 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def _line(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=_CUMULATIVE_WEIGHTS, k=length)).capitalize()
+
+
+def synthetic_hymn(rng: random.Random, number: int) -> Dict:
+    title = _line(rng, rng.randint(2, 5))
+    verses = [
+        {
+            "verse_tag": f"v{index}",
+            "verse_name": f"Verse {index}",
+            "verse_content": "\n".join(_line(rng, rng.randint(5, 9)) for _ in range(4)),
+        }
+        for index in range(1, rng.randint(3, 6))
+    ]
+    content = {"verses": verses}
+    if rng.random() < 0.6:
+        content["chorus"] = "\n".join(_line(rng, rng.randint(5, 9)) for _ in range(2))
+    return {"title": title, "number": number, "content": content, "variant_key": None}
+
+
+def synthetic_books(books: int, hymns_per_book: int, seed: int = 7) -> Iterator[Dict]:
+    """
+    Yield `books` hymn books of `hymns_per_book` hymns each.
+
+    Roughly one hymn in ten reappears in later books under the same `variant_key`,
+    the way a popular hymn is printed in several hymnals.
+    """
+    rng = random.Random(seed)
+    shared: List[Dict] = []
+    for book_index in range(books):
+        book_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        hymns = []
+        for number in range(1, hymns_per_book + 1):
+            if shared and rng.random() < 0.1:
+                original = rng.choice(shared)
+                hymn = dict(original, number=number)
+            else:
+                hymn = synthetic_hymn(rng, number)
+                if rng.random() < 0.1:
+                    hymn["variant_key"] = f"variant-{len(shared)}"
+                    shared.append(hymn)
+            hymns.append(dict(hymn, id=str(uuid.UUID(int=rng.getrandbits(128))), hymn_book_id=book_id))
+        yield {"id": book_id, "title": f"Hymnal {book_index + 1}", "hymns": hymns}
+
+
+def synthetic_users(count: int, seed: int = 11) -> Iterator[Dict]:
+    """Yield `count` users with distinct usernames and emails; passwords are left to the caller."""
+    rng = random.Random(seed)
+    for index in range(count):
+        first, last = (rng.choice(WORDS).capitalize() for _ in range(2))
+        username = f"{first.lower()}.{last.lower()}.{index}"
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "username": username,
+            "email": f"{username}@example.com",
+            "first_name": first,
+            "last_name": last,
+        }
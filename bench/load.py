@@ -0,0 +1,345 @@
+# bench/load.py
+"""
+Load test of the main endpoints against a synthetic hymnal, reported as JSON.
+
+    python -m bench.load --books 20 --hymns-per-book 500 --users 200 --concurrency 16 --output run.json
+
+Loads `--books` x `--hymns-per-book` multi-verse hymns (about one in ten a variant printed in
+several books), `--users` users in reader and editor roles, then drives the ASGI app in process
+(no network) with `--concurrency` clients for `--duration` seconds per scenario. Every scenario
+reports p50/p95/p99 latency in milliseconds, requests per second and error count; the JSON also
+records the corpus, settings and git commit so two runs can be compared.
+
+Uses a throwaway SQLite file unless --database-url is given; with --reuse an already loaded
+database is benchmarked as it is. --baseline prints each scenario's change against an earlier report.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+SCENARIOS = ("search", "list_books", "list_book_hymns", "bundle", "hymn", "variants", "login", "create_hymn")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=20)
+    parser.add_argument("--hymns-per-book", type=int, default=500)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds per scenario not measured")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--reuse", action="store_true", help="benchmark the database as it is instead of loading a corpus")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="JSON report of an earlier run to print changes against")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import random  # noqa: E402
+import subprocess  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+from typing import Callable, Dict, List  # noqa: E402
+
+import httpx  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from bench.corpus import WORDS, synthetic_books, synthetic_hymn, synthetic_users  # noqa: E402
+from core.database import AsyncSessionLocal, engine  # noqa: E402
+from core.models.base import Base  # noqa: E402
+from core.services.auth import create_access_token, get_password_hash  # noqa: E402
+from core.settings import settings  # noqa: E402
+from hymnal.models import hymn_search_document  # noqa: E402,F401
+from hymnal.models.hymn import Hymn  # noqa: E402
+from hymnal.models.hymn_book import HymnBook  # noqa: E402
+from hymnal.services import bundles  # noqa: E402
+from hymnal.services.variant_groups import rebuild_variant_groups  # noqa: E402
+from main import app  # noqa: E402
+from user_management.models import audit_log  # noqa: E402,F401
+from user_management.models.permission import Permission, RolePermission  # noqa: E402
+from user_management.models.role import Role, UserRole  # noqa: E402
+from user_management.models.user import User  # noqa: E402
+
+PASSWORD = "correct horse battery"
+
+# Role name -> permissions; every tenth user is an editor
+ROLES = {
+    "reader": [],
+    "editor": ["create_hymn", "update_hymn", "delete_hymn", "update_hymn_book"],
+}
+EDITOR_EVERY = 10
+
+# Hymns written by the create_hymn scenario go here, not into the corpus books
+WRITES_BOOK_TITLE = "Bench writes"
+
+API = "/api/v1/hymnal"
+LOGIN = "/api/v1/user_management/login"
+
+
+async def load_corpus():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    # One bcrypt hash for everyone: hashing thousands of passwords would dominate the load time
+    hashed_password = get_password_hash(PASSWORD)
+    async with AsyncSessionLocal() as db:
+        for book in synthetic_books(args.books, args.hymns_per_book, args.seed):
+            await db.execute(insert(HymnBook), [{"id": book["id"], "title": book["title"]}])
+            await db.execute(insert(Hymn), book["hymns"])
+        await rebuild_variant_groups(db)
+
+        roles = {name: Role(name=name) for name in ROLES}
+        permissions = {name: Permission(name=name) for names in ROLES.values() for name in names}
+        db.add_all([*roles.values(), *permissions.values()])
+        await db.flush()
+        await db.execute(insert(RolePermission), [
+            {"role_id": roles[role].id, "permission_id": permissions[name].id}
+            for role, names in ROLES.items() for name in names
+        ])
+        users = [dict(user, hashed_password=hashed_password) for user in synthetic_users(args.users, args.seed)]
+        if users:
+            await db.execute(insert(User), users)
+            await db.execute(insert(UserRole), [
+                {"user_id": user["id"], "role_id": roles["editor" if index % EDITOR_EVERY == 0 else "reader"].id}
+                for index, user in enumerate(users)
+            ])
+        await db.commit()
+
+
+async def load_targets() -> Dict[str, List]:
+    """Ids and names the scenarios pick from, read back so --reuse works on any loaded database."""
+    async with AsyncSessionLocal() as db:
+        writes_book_id = await db.scalar(select(HymnBook.id).where(HymnBook.title == WRITES_BOOK_TITLE))
+        if writes_book_id is None:
+            writes_book = HymnBook(title=WRITES_BOOK_TITLE)
+            db.add(writes_book)
+            await db.commit()
+            writes_book_id = writes_book.id
+        last_written = await db.scalar(select(func.max(Hymn.number)).where(Hymn.hymn_book_id == writes_book_id))
+        book_ids = list((await db.scalars(select(HymnBook.id).where(HymnBook.id != writes_book_id))).all())
+        hymn_ids = list((await db.scalars(select(Hymn.id).where(Hymn.hymn_book_id != writes_book_id).order_by(Hymn.id).limit(10000))).all())
+        variant_ids = list((await db.scalars(
+            select(Hymn.id).where(Hymn.variant_key.is_not(None)).order_by(Hymn.id).limit(10000)
+        )).all())
+        book_sizes = dict((await db.execute(select(Hymn.hymn_book_id, func.count()).where(Hymn.hymn_book_id != writes_book_id).group_by(Hymn.hymn_book_id))).all())
+        usernames = list((await db.scalars(select(User.username).where(User.hashed_password.is_not(None)))).all())
+        editors = list((await db.scalars(
+            select(User.username).join(UserRole, UserRole.user_id == User.id).join(Role, Role.id == UserRole.role_id)
+            .where(Role.name == "editor")
+        )).all())
+    if not (book_ids and hymn_ids):
+        raise SystemExit("No hymns to benchmark; drop --reuse to load a corpus")
+    return {
+        "book_ids": book_ids,
+        "hymn_ids": hymn_ids,
+        "variant_ids": variant_ids or hymn_ids,
+        "book_sizes": book_sizes,
+        "usernames": usernames,
+        "editor_tokens": [create_access_token({"sub": username}) for username in editors],
+        "writes_book_id": writes_book_id,
+        "next_number": itertools.count((last_written or 0) + 1),
+    }
+
+
+def scenario_requests(targets: Dict[str, List]) -> Dict[str, Callable]:
+    """Scenario name -> function building one request (method, url, keyword arguments) from a random source."""
+
+    def search(rng):
+        words = " ".join(rng.sample(WORDS, rng.choice((1, 1, 2))))
+        return "GET", f"{API}/search", {"params": {"title": words, "limit": 20}}
+
+    def list_books(rng):
+        return "GET", f"{API}/hymn_books", {}
+
+    def list_book_hymns(rng):
+        book_id = rng.choice(targets["book_ids"])
+        skip = rng.randrange(max(1, targets["book_sizes"].get(book_id, 0)))
+        return "GET", f"{API}/hymn_books/{book_id}/hymns", {"params": {"skip": skip, "limit": 50}}
+
+    def bundle(rng):
+        return "GET", f"{API}/hymn_books/{rng.choice(targets['book_ids'])}/bundle", {}
+
+    def hymn(rng):
+        return "GET", f"{API}/hymns/{rng.choice(targets['hymn_ids'])}", {}
+
+    def variants(rng):
+        return "GET", f"{API}/hymns/{rng.choice(targets['variant_ids'])}/variants", {}
+
+    def login(rng):
+        return "POST", LOGIN, {"data": {"username": rng.choice(targets["usernames"]), "password": PASSWORD}}
+
+    def create_hymn(rng):
+        hymn = synthetic_hymn(rng, next(targets["next_number"]))
+        return "POST", f"{API}/hymns", {
+            "params": {"title": hymn["title"], "number": hymn["number"], "hymn_book_id": targets["writes_book_id"]},
+            "json": hymn["content"],
+            "headers": {"Authorization": f"Bearer {rng.choice(targets['editor_tokens'])}"},
+        }
+
+    available = {
+        "search": search,
+        "list_books": list_books,
+        "list_book_hymns": list_book_hymns,
+        "bundle": bundle,
+        "hymn": hymn,
+        "variants": variants,
+        "login": login if targets["usernames"] else None,
+        "create_hymn": create_hymn if targets["editor_tokens"] else None,
+    }
+    return {name: build for name, build in available.items() if build is not None}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+async def run_scenario(client: httpx.AsyncClient, build: Callable) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    measuring = False
+
+    async def worker(rng: random.Random, deadline: float):
+        while time.perf_counter() < deadline:
+            method, url, kwargs = build(rng)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - start
+            if not measuring:
+                continue
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            else:
+                latencies.append(elapsed * 1000)
+
+    rngs = [random.Random(args.seed * 1000 + index) for index in range(args.concurrency)]
+    if args.warmup > 0:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(worker(rng, deadline) for rng in rngs))
+    measuring = True
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(worker(rng, deadline) for rng in rngs))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_changes(baseline: Dict, report: Dict):
+    def change(before: float, after: float) -> str:
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    print(f"\nagainst {baseline.get('git_commit')} ({baseline.get('started_at')})", file=sys.stderr)
+    print(f"{'scenario':<18}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        latency, before_latency = result["latency_ms"], before["latency_ms"]
+        print(f"{name:<18}{change(before['throughput_rps'], result['throughput_rps']):>10}"
+              + "".join(f"{change(before_latency[p], latency[p]):>10}" for p in ("p50", "p95", "p99")), file=sys.stderr)
+
+
+async def main():
+    engine.echo = False
+    # Bundles built during the run are thrown away with it rather than left in media/
+    bundles.BUNDLE_DIR = tempfile.mkdtemp(prefix="bundles-")
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    if not args.reuse:
+        start = time.perf_counter()
+        await load_corpus()
+        print(f"Loaded {args.books * args.hymns_per_book} hymns and {args.users} users "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    targets = await load_targets()
+    builders = scenario_requests(targets)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench", timeout=None) as client:
+            print(f"{'scenario':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}", file=sys.stderr)
+            for name in selected:
+                if name not in builders:
+                    print(f"{name:<18}skipped: no users or editors in the database", file=sys.stderr)
+                    continue
+                result = results[name] = await run_scenario(client, builders[name])
+                latency = result["latency_ms"]
+                print(f"{name:<18}{result['throughput_rps']:>10.1f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+                      f"{latency['p99']:>10.2f}{sum(result['errors'].values()):>8}", file=sys.stderr)
+    await engine.dispose()
+
+    report = {
+        "started_at": started_at,
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "corpus": {
+            "books": len(targets["book_ids"]),
+            "hymns": sum(targets["book_sizes"].values()),
+            "users": len(targets["usernames"]),
+            "reused": args.reuse,
+        },
+        "load": {"concurrency": args.concurrency, "duration_seconds": args.duration, "warmup_seconds": args.warmup},
+        "settings": {
+            name: getattr(settings, name)
+            for name in ("SEARCH_INDEX_ENABLED", "HYMN_CACHE_MAX_ENTRIES", "PERMISSION_CACHE_MAX_ENTRIES",
+                         "STATELESS_AUTH", "PASSWORD_HASH_WORKERS", "AUDIT_LOG_SYNC", "DB_POOL_SIZE")
+        },
+        "scenarios": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_changes(json.load(f), report)
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+# bench/login_storm.py
+"""
+Latency of public reads during a burst of logins, with bcrypt inline vs on the hash pool.
+
+    python -m bench.login_storm --logins 40 --workers 4
+
+Fires `--logins` concurrent logins while a reader keeps requesting `/hymn_books`, in process
+(no network), and reports the reader's latency and the login throughput for each mode.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from core.database import AsyncSessionLocal, engine  # noqa: E402
+from core.models.base import Base  # noqa: E402
+from core.services import auth  # noqa: E402
+from hymnal.models import hymn, hymn_book, hymn_search_document, hymn_variant_group, sync_change  # noqa: E402,F401
+from main import app  # noqa: E402
+from user_management.models import audit_log, permission, role  # noqa: E402,F401
+from user_management.models.user import User  # noqa: E402
+
+PASSWORD = "correct horse battery"
+
+
+async def create_user():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        db.add(User(username="storm", email="storm@example.com", hashed_password=auth.get_password_hash(PASSWORD)))
+        await db.commit()
+
+
+async def storm(client: httpx.AsyncClient):
+    read_ms = []
+    done = asyncio.Event()
+
+    async def reader():
+        while not done.is_set():
+            start = time.perf_counter()
+            response = await client.get("/api/v1/hymnal/hymn_books")
+            assert response.status_code == 200, response.text
+            read_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.005)
+
+    async def login():
+        response = await client.post("/api/v1/user_management/login", data={"username": "storm", "password": PASSWORD})
+        assert response.status_code == 200, response.text
+
+    reading = asyncio.create_task(reader())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await reading
+    read_ms.sort()
+    return {
+        "reads": len(read_ms),
+        "read p50 ms": statistics.median(read_ms),
+        "read p99 ms": read_ms[min(len(read_ms) - 1, int(len(read_ms) * 0.99))],
+        "read max ms": read_ms[-1],
+        "logins/s": args.logins / elapsed,
+    }
+
+
+async def main():
+    engine.echo = False
+    await create_user()
+    print(f"{'mode':<12}{'reads':>7}{'read p50 ms':>13}{'read p99 ms':>13}{'read max ms':>13}{'logins/s':>10}")
+    for label, workers in (("inline", 0), (f"pool x{args.workers}", args.workers)):
+        auth.password_hash_pool = auth.PasswordHashPool(workers, max_queued=args.logins)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                result = await storm(client)
+        print(f"{label:<12}{result['reads']:>7}{result['read p50 ms']:>13.1f}{result['read p99 ms']:>13.1f}"
+              f"{result['read max ms']:>13.1f}{result['logins/s']:>10.1f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# bench/search_index.py
+"""
+Compare `/search` served from the in-process inverted index with the SQL `ilike` path.
+
+    python -m bench.search_index --books 50 --hymns-per-book 1000
+
+Uses a throwaway SQLite file unless --database-url is given. On SQLite the SQL content
+fallback (`json_array_elements`) is unavailable, so lyric-only queries are reported as such.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50)
+    parser.add_argument("--hymns-per-book", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from bench.corpus import synthetic_books  # noqa: E402
+from core.database import AsyncSessionLocal, engine  # noqa: E402
+from core.models.base import Base  # noqa: E402
+from core.settings import settings  # noqa: E402
+from hymnal.models.hymn import Hymn  # noqa: E402
+from hymnal.models.hymn_book import HymnBook  # noqa: E402
+from hymnal.services.hymn import search_hymns_by_filters  # noqa: E402
+from hymnal.services.search_index import hymn_search_index  # noqa: E402
+from user_management.models import audit_log, permission, role, user  # noqa: E402,F401
+
+QUERIES = {
+    "title word": "grace",
+    "two words": "holy spirit",
+    "prefix": "redeem",
+    "number": "42",
+    "lyrics only": "zion jordan calvary",
+}
+
+
+async def load_corpus():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        for book in synthetic_books(args.books, args.hymns_per_book):
+            await db.execute(insert(HymnBook), [{"id": book["id"], "title": book["title"]}])
+            await db.execute(insert(Hymn), book["hymns"])
+        await db.commit()
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    engine.echo = False
+    total = args.books * args.hymns_per_book
+    print(f"Loading {total} hymns into {settings.DATABASE_URL} ...")
+    await load_corpus()
+
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        await hymn_search_index.rebuild(db)
+        print(f"Index build: {time.perf_counter() - start:.2f}s for {len(hymn_search_index)} hymns\n")
+
+        print(f"{'query':<14}{'index (ms)':>12}{'service+index':>15}{'sql (ms)':>12}")
+        for label, query in QUERIES.items():
+            async def index_only():
+                hymn_search_index.search(query)
+
+            async def service():
+                return await search_hymns_by_filters(db, title=query)
+
+            index_ms = await timed(index_only, args.repeat)
+            settings.SEARCH_INDEX_ENABLED = True
+            service_ms = await timed(service, args.repeat)
+            settings.SEARCH_INDEX_ENABLED = False
+            try:
+                sql_ms = f"{await timed(service, max(1, args.repeat // 10)):.3f}"
+            except Exception as exc:  # json_array_elements is Postgres-only
+                await db.rollback()
+                sql_ms = f"n/a ({type(exc).__name__})"
+            settings.SEARCH_INDEX_ENABLED = True
+            print(f"{label:<14}{index_ms:>12.3f}{service_ms:>15.3f}{sql_ms:>12}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
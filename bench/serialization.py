@@ -0,0 +1,152 @@
+# bench/serialization.py
+"""
+Per-row cost of building hymn list responses: ORM entities validated into HymnSearchResult
+and encoded by FastAPI's JSONResponse, against column rows encoded by ORJSONResponse.
+
+    python -m bench.serialization --rows 1000
+
+Reports the serialization step alone and query plus serialization, per row, and checks
+both paths produce byte-identical bodies (titles include non-ASCII and control characters).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import List  # noqa: E402
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from bench.corpus import synthetic_books  # noqa: E402
+from core.database import AsyncSessionLocal, engine  # noqa: E402
+from core.models.base import Base  # noqa: E402
+from hymnal.controllers.api.v1.hymn import _hymn_list_response  # noqa: E402
+from hymnal.models.hymn import Hymn  # noqa: E402
+from hymnal.models.hymn_book import HymnBook  # noqa: E402
+from hymnal.models import hymn_search_document, hymn_variant_group, sync_change  # noqa: E402,F401
+from hymnal.schemas.hymn import HymnSearchResult  # noqa: E402
+from hymnal.services.hymn import get_hymns_by_hymn_book_id  # noqa: E402
+from user_management.models import audit_log, permission, role, user  # noqa: E402,F401
+
+# What FastAPI builds for response_model=List[HymnSearchResult]
+RESPONSE_FIELD = create_model_field("Response_bench", List[HymnSearchResult], mode="serialization")
+
+# Characters JSON encoders are known to disagree on: non-ASCII, escapes, controls, line separators
+AWKWARD_TITLES = ['Ó "Sacred" Head', "Tab\there\\", "Bell\x07 \x7f", "Line\u2028break\nnext", "Nkosi 🙏 ñ </script>"]
+
+
+async def load_book() -> str:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    book = next(synthetic_books(1, args.rows))
+    for hymn, title in zip(book["hymns"], AWKWARD_TITLES):
+        hymn["title"] = title
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(HymnBook), [{"id": book["id"], "title": book["title"]}])
+        await db.execute(insert(Hymn), book["hymns"])
+        await db.commit()
+    return book["id"]
+
+
+async def query_entities(db, hymn_book_id: str):
+    # The query the list endpoints ran before selecting columns
+    result = await db.execute(
+        select(Hymn, HymnBook.title.label("hymn_book_title"))
+        .join(HymnBook)
+        .filter(Hymn.hymn_book_id == hymn_book_id)
+        .order_by(Hymn.number.asc(), Hymn.id.asc())
+        .limit(args.rows)
+    )
+    return [
+        HymnSearchResult(
+            id=hymn.id,
+            title=hymn.title,
+            number=hymn.number,
+            hymn_book_id=hymn.hymn_book_id,
+            hymn_book_title=hymn_book_title,
+            variant_key=hymn.variant_key,
+        )
+        for hymn, hymn_book_title in result.all()
+    ]
+
+
+async def model_body(hymns) -> bytes:
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=hymns)
+    return JSONResponse(content).body
+
+
+async def row_body(hymns) -> bytes:
+    return _hymn_list_response(hymns).body
+
+
+async def model_body_from_query(db, hymn_book_id: str) -> bytes:
+    db.expunge_all()  # as a fresh request's session would be
+    return await model_body(await query_entities(db, hymn_book_id))
+
+
+async def row_body_from_query(db, hymn_book_id: str) -> bytes:
+    return await row_body(await get_hymns_by_hymn_book_id(db, hymn_book_id, limit=args.rows))
+
+
+async def timed(fn, repeat) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+async def main():
+    engine.echo = False
+    hymn_book_id = await load_book()
+
+    async with AsyncSessionLocal() as db:
+        models = await query_entities(db, hymn_book_id)
+        rows = await get_hymns_by_hymn_book_id(db, hymn_book_id, limit=args.rows)
+        assert len(rows) == args.rows, len(rows)
+        assert await model_body(models) == await row_body(rows), "bodies differ"
+        print(f"{args.rows} rows, identical bodies of {len(await row_body(rows))} bytes\n")
+
+        cases = {
+            "serialize only": (lambda: model_body(models), lambda: row_body(rows)),
+            "query+serialize": (
+                lambda: model_body_from_query(db, hymn_book_id),
+                lambda: row_body_from_query(db, hymn_book_id),
+            ),
+        }
+        print(f"{'step':<18}{'models (us/row)':>17}{'rows (us/row)':>15}{'speedup':>9}")
+        for label, (before, after) in cases.items():
+            before_s = await timed(before, args.repeat)
+            after_s = await timed(after, args.repeat)
+            per_row = 1e6 / args.rows
+            print(f"{label:<18}{before_s * per_row:>17.2f}{after_s * per_row:>15.2f}{before_s / after_s:>8.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+# core/cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire `ttl_seconds` after being stored.
+
+    Expiry only bounds staleness for writes this process never sees (other workers);
+    local writes are expected to `delete` or `clear` what they change. A cache created
+    with `max_entries=0` stores nothing, which is how caching is switched off.
+
+    A read-through caller should note `generation` before loading a value and pass it to
+    `set`: if a write invalidated anything meanwhile, the possibly stale value is dropped.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self.invalidated_at = float("-inf")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        if self.max_entries <= 0 or (generation is not None and generation != self.generation):
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._invalidated()
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._invalidated()
+        self._entries.clear()
+
+    def _invalidated(self):
+        self.generation += 1
+        self.invalidated_at = self._clock()
+
+    def seconds_since_invalidation(self) -> float:
+        return self._clock() - self.invalidated_at
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Sentinel telling a cached miss apart from a cached None
+MISSING = object()
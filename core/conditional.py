@@ -0,0 +1,86 @@
+# core/conditional.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+
+class Versioned(NamedTuple):
+    """A response body together with the validators describing its version."""
+    value: Any
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values identifying one version of a representation."""
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:27] + '"'
+
+
+def row_validators(key: Any, version: int, updated_at: Optional[datetime]) -> Tuple[str, Optional[datetime]]:
+    return make_etag(key, version), _as_utc(updated_at)
+
+
+def collection_validators(rows: Iterable[Tuple[int, Optional[datetime]]], *extra: Any) -> Tuple[str, Optional[datetime]]:
+    """
+    Validators of a list built from (version, updated_at) of its rows. Uses only the row count,
+    the version sum and the latest update so the same ETag can be computed with one aggregate
+    query (see `collection_validators_from_aggregate`) before loading any row.
+    """
+    count, version_sum, last_modified = 0, 0, None
+    for version, updated_at in rows:
+        count += 1
+        version_sum += version
+        updated_at = _as_utc(updated_at)
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    return collection_validators_from_aggregate(count, version_sum, last_modified, *extra)
+
+
+def collection_validators_from_aggregate(count: int, version_sum: Optional[int], last_modified: Optional[datetime],
+                                         *extra: Any) -> Tuple[str, Optional[datetime]]:
+    last_modified = _as_utc(last_modified)
+    # Adding or deleting rows moves the count, updating one moves the version sum and the latest update
+    return make_etag(count, int(version_sum or 0), last_modified and last_modified.isoformat(), *extra), last_modified
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match, or failing that If-Modified-Since, against the current validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands timestamps back naive; they are stored in UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
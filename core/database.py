@@ -1,16 +1,154 @@
 # core/database.py
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from fastapi import Request
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from core.metrics import instrument_engine, instrumentation_enabled
 from core.settings import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """The default async queue pool, counting checkouts and the time each took (waiting, or opening a new connection)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def recreate(self):
+        # Pool statistics describe the pool, not one generation of its connections
+        pool = super().recreate()
+        pool.__dict__.update({key: getattr(self, key) for key in ("checkouts", "timeouts", "wait_seconds_total", "wait_seconds_max")})
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    create_async_engine() keyword arguments for the DATABASE_URL and DB_PROFILE.
+
+    "dev" echoes SQL and keeps connections forever; "prod" is quiet, pre-pings connections
+    and recycles them before server-side idle timeouts. Each DB_* setting overrides its profile default.
+    """
+    production = settings.DB_PROFILE == "prod"
+    backend = make_url(url).get_backend_name()
+    options: Dict[str, Any] = {
+        "echo": settings.DB_ECHO if settings.DB_ECHO is not None else not production,
+    }
+    if backend == "sqlite" and make_url(url).database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection; pool sizing does not apply
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE if settings.DB_POOL_RECYCLE is not None else (1800 if production else -1),
+        pool_pre_ping=settings.DB_POOL_PRE_PING if settings.DB_POOL_PRE_PING is not None else production,
+    )
+    if backend == "postgresql":
+        # 0 when running behind PgBouncer in transaction mode, which breaks prepared statements
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        # Readers no longer block the writer (and the other way round)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+
+def create_engine_for(url: str) -> AsyncEngine:
+    created = create_async_engine(url, **engine_options(url))
+    if created.dialect.name == "sqlite":
+        event.listen(created.sync_engine, "connect", _set_sqlite_pragmas)
+    if instrumentation_enabled():
+        instrument_engine(created.sync_engine)
+    return created
+
+
+engine = create_engine_for(SQLALCHEMY_DATABASE_URL)
+
 AsyncSessionLocal = sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False
 )
+
+# Optional read replica for public reads; without one they share the primary
+read_engine = create_engine_for(settings.READ_DATABASE_URL) if settings.READ_DATABASE_URL else engine
+
+ReadSessionLocal = sessionmaker(
+    bind=read_engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False,
+    info={"replica": read_engine is not engine},
+)
+
 Base = declarative_base()
 
+
+def pool_stats(target: Optional[AsyncEngine] = None) -> Dict[str, Any]:
+    pool = (target or engine).pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            checked_in=pool.checkedin(),
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_ms_avg=round(pool.wait_seconds_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            wait_ms_max=round(pool.wait_seconds_max * 1000, 3),
+        )
+    return stats
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# Set on responses to successful writes while a replica is configured (see core.middleware)
+READ_PRIMARY_COOKIE = "read_primary"
+
+
+def read_session_factory(request: Request) -> sessionmaker:
+    """
+    Session factory for a public read, the read replica's when READ_DATABASE_URL is set.
+
+    Clients that just wrote carry the `read_primary` cookie for REPLICA_MAX_LAG_SECONDS and
+    read from the primary meanwhile, so they see their own writes despite replication lag.
+    """
+    if request.cookies.get(READ_PRIMARY_COOKIE):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+
+async def get_read_db(request: Request):
+    """Session for public reads; see `read_session_factory`."""
+    async with read_session_factory(request)() as session:
+        yield session
@@ -0,0 +1,190 @@
+# core/media.py
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+from core.settings import settings
+
+# Directory served at MEDIA_URL_PREFIX; stored paths start with it ("media/hymn_books/...")
+MEDIA_ROOT = "media"
+MEDIA_URL_PREFIX = "/media"
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Accepted upload formats, as detected by Pillow (not the client's content type), and their extension
+IMAGE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+# Every size in MEDIA_RENDITION_SIZES is stored in each of these formats
+RENDITION_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+RENDITION_QUALITY = 82
+
+# Images are stored under <base_dir>/<first 2 hex digits>/<sha256 of the upload>/
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Files uploaded before content hashing were named "<kind>_<id>_<uuid4>.<ext>", just as unique
+_UUID_NAME_RE = re.compile(r"_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.\w+$")
+
+# A file name never gets new content, so clients may keep media for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Decompression bomb guard: Pillow refuses larger images
+Image.MAX_IMAGE_PIXELS = settings.MEDIA_MAX_IMAGE_PIXELS
+
+# Decoding and resizing take tens of milliseconds per megapixel; Pillow releases the GIL meanwhile
+image_executor = ThreadPoolExecutor(max_workers=settings.MEDIA_IMAGE_WORKERS, thread_name_prefix="image")
+
+
+async def store_image(upload: UploadFile, base_dir: str) -> str:
+    """
+    Store an uploaded image and its resized renditions; returns the path of the stored original.
+
+    The upload is streamed to disk in chunks, never held in memory whole, and refused with 413
+    past MEDIA_MAX_UPLOAD_BYTES. Files are named by content hash, so uploading the same image
+    again reuses what is already stored instead of decoding it a second time.
+    """
+    await aiofiles.os.makedirs(base_dir, exist_ok=True)
+    upload_path = os.path.join(base_dir, f".upload-{uuid.uuid4()}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(upload_path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MEDIA_MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Image larger than {settings.MEDIA_MAX_UPLOAD_BYTES} bytes",
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+        content_hash = digest.hexdigest()
+        directory = os.path.join(base_dir, content_hash[:2], content_hash)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(image_executor, _store_renditions, upload_path, directory)
+    finally:
+        if await aiofiles.os.path.exists(upload_path):
+            await aiofiles.os.remove(upload_path)
+
+
+def _store_renditions(upload_path: str, directory: str) -> str:
+    sizes = sorted(settings.MEDIA_RENDITION_SIZES, reverse=True)
+    try:
+        with Image.open(upload_path) as image:
+            extension = IMAGE_FORMATS.get(image.format)
+            if extension is None:
+                raise HTTPException(status_code=400, detail="Invalid image format")
+            original_path = os.path.join(directory, f"original.{extension}")
+            if os.path.exists(original_path):
+                return original_path
+            # JPEGs can be decoded straight at a fraction of their size, enough for the largest rendition
+            image.draft("RGB", (sizes[0], sizes[0]))
+            rendition = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        # Not an image, truncated, or too many pixels
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    # Written next to the final directory and renamed into place, so readers never see half of it
+    staging = f"{directory}.{uuid.uuid4()}"
+    os.makedirs(staging)
+    try:
+        # Largest first, each one resized from the previous
+        for size in sizes:
+            rendition.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for rendition_extension, rendition_format in RENDITION_FORMATS.items():
+                _convert_for(rendition, rendition_format).save(
+                    os.path.join(staging, f"{size}.{rendition_extension}"), rendition_format, quality=RENDITION_QUALITY
+                )
+        os.replace(upload_path, os.path.join(staging, f"original.{extension}"))
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # The same image was stored concurrently; keep that copy
+            pass
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return original_path
+
+
+def _convert_for(image: Image.Image, image_format: str) -> Image.Image:
+    if image.mode in ("P", "LA"):
+        image = image.convert("RGBA")
+    if image_format == "JPEG" and image.mode == "RGBA":
+        # No alpha channel in JPEG: flatten onto white
+        flattened = Image.new("RGB", image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel("A"))
+        return flattened
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGB")
+    return image
+
+
+def is_content_addressed(path: Optional[str]) -> bool:
+    return bool(path) and bool(_CONTENT_HASH_RE.match(os.path.basename(os.path.dirname(path))))
+
+
+def is_fingerprinted(path: Optional[str]) -> bool:
+    """Whether the file name changes whenever the content does, i.e. it can be cached forever."""
+    return is_content_addressed(path) or bool(path) and bool(_UUID_NAME_RE.search(os.path.basename(path)))
+
+
+def media_url(path: Optional[str]) -> Optional[str]:
+    """URL of a stored media path ("media/x.png" -> "/media/x.png"), which also changes with its content."""
+    if not path:
+        return path
+    relative = os.path.relpath(path, MEDIA_ROOT).replace(os.sep, "/")
+    return f"{MEDIA_URL_PREFIX}/{relative}"
+
+
+def image_renditions(path: Optional[str]) -> Dict[str, str]:
+    """URLs of an image's renditions by "<size>.<format>", empty for images stored before renditions existed."""
+    if not is_content_addressed(path):
+        return {}
+    directory = os.path.dirname(path)
+    return {
+        f"{size}.{extension}": media_url(os.path.join(directory, f"{size}.{extension}"))
+        for size in settings.MEDIA_RENDITION_SIZES
+        for extension in RENDITION_FORMATS
+    }
+
+
+async def delete_image(path: Optional[str]):
+    """Delete an image with its renditions, off the event loop; callers check nothing else uses it."""
+    if not path:
+        return
+    if is_content_addressed(path):
+        await asyncio.to_thread(shutil.rmtree, os.path.dirname(path), True)
+    elif await aiofiles.os.path.exists(path):
+        await aiofiles.os.remove(path)
+
+
+class MediaFiles(StaticFiles):
+    """
+    StaticFiles for uploaded media. Fingerprinted files are sent as immutable with a one-year
+    max-age; anything else must be revalidated, which the ETag and Last-Modified StaticFiles
+    already send make cheap (304). Range requests are served as StaticFiles does.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if is_fingerprinted(str(full_path)) else REVALIDATE_CACHE_CONTROL
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,279 @@
+# core/metrics.py
+"""
+In-process request and database metrics, exposed in the Prometheus text format at /metrics.
+
+Every worker process keeps its own counters; Prometheus scrapes each worker (or sums them)
+the way it does for any multi-process server. Recording is a few dict updates per request
+and per query on the event loop thread, so it stays on under full load.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core import query_log, tracing
+from core.settings import settings
+
+# Request latency buckets in seconds, from a cached hymn (~1ms) to a bulk import
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label for requests no route matched; their paths are unbounded and would each become a series
+UNMATCHED_ROUTE = "unmatched"
+# Label for queries run outside any request (search index refresh, audit log writer, ...)
+BACKGROUND_ROUTE = "background"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class RequestStats:
+    __slots__ = ("method", "route", "queries", "db_seconds", "statements", "budget", "budget_action", "over_budget")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.queries = 0
+        self.db_seconds = 0.0
+        # statement -> times run, kept only with QUERY_INSPECTION (see core.query_log)
+        self.statements: Optional[Dict[str, int]] = {} if settings.QUERY_INSPECTION else None
+        self.budget = query_log.budget_for(method, route) if settings.QUERY_INSPECTION else 0
+        self.budget_action = settings.QUERY_BUDGET_ACTION
+        self.over_budget = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}" if self.method else self.route
+
+
+# The stats of the request being served, so engine events can charge queries to its route
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, List] = {}  # labels -> [count per bucket (+Inf last), sum]
+
+    def observe(self, labels: Labels, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+
+class Metrics:
+    def __init__(self):
+        self.requests: Dict[Labels, int] = {}  # (method, route, status) -> count
+        self.in_flight: Dict[Labels, int] = {}  # (method, route) -> requests being served
+        self.latency = Histogram(LATENCY_BUCKETS)  # (method, route) -> seconds
+        self.db_queries: Dict[str, int] = {}  # route -> queries
+        self.db_seconds: Dict[str, float] = {}  # route -> seconds spent in queries
+
+    def record_query(self, seconds: float):
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+        else:
+            self._add_db(BACKGROUND_ROUTE, 1, seconds)
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.latency.observe((method, route), seconds)
+        if stats.queries:
+            self._add_db(route, stats.queries, stats.db_seconds)
+
+    def _add_db(self, route: str, queries: int, seconds: float):
+        self.db_queries[route] = self.db_queries.get(route, 0) + queries
+        self.db_seconds[route] = self.db_seconds.get(route, 0.0) + seconds
+
+    def render(self, pools: Dict[str, object] = None) -> str:
+        """All metrics in the Prometheus text exposition format; `pools` maps a database name to its pool."""
+        lines: List[str] = []
+        _family(lines, "http_requests_total", "counter", "Requests served, by route and status code.",
+                ((("method", "route", "status"), key, value) for key, value in self.requests.items()))
+        _family(lines, "http_requests_in_flight", "gauge", "Requests being served.",
+                ((("method", "route"), key, value) for key, value in self.in_flight.items()))
+        lines.append("# HELP http_request_duration_seconds Time to serve a request, until its last byte was sent.")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route), (counts, total) in self.latency.series.items():
+            labels = _labels(("method", "route"), (method, route))
+            cumulative = 0
+            for bound, count in zip(self.latency.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+        _family(lines, "db_queries_total", "counter", "SQL statements executed, by the route that ran them.",
+                ((("route",), (route,), value) for route, value in self.db_queries.items()))
+        _family(lines, "db_query_seconds_total", "counter", "Time spent executing SQL statements, by route.",
+                ((("route",), (route,), value) for route, value in self.db_seconds.items()))
+        if pools:
+            _render_pools(lines, pools)
+        return "\n".join(lines) + "\n"
+
+
+def _render_pools(lines: List[str], pools: Dict[str, object]):
+    gauges = {
+        "db_pool_size": ("Connections the pool keeps open.", lambda pool: pool.size()),
+        "db_pool_checked_out": ("Connections in use.", lambda pool: pool.checkedout()),
+        "db_pool_overflow": ("Connections open beyond the pool size (negative while below it).", lambda pool: pool.overflow()),
+    }
+    counters = {
+        "db_pool_checkouts_total": ("Connections handed out.", lambda pool: pool.checkouts),
+        "db_pool_timeouts_total": ("Requests that gave up waiting for a connection.", lambda pool: pool.timeouts),
+        "db_pool_wait_seconds_total": ("Time spent waiting for a connection.", lambda pool: pool.wait_seconds_total),
+    }
+    # Only the instrumented queue pool (see core.database) has these; in-memory SQLite has none
+    instrumented = {name: pool for name, pool in pools.items() if hasattr(pool, "checkouts")}
+    for kind, families in (("gauge", gauges), ("counter", counters)):
+        for metric, (help_text, read) in families.items():
+            _family(lines, metric, kind, help_text,
+                    ((("database",), (name,), read(pool)) for name, pool in instrumented.items()))
+
+
+def _family(lines: List[str], name: str, kind: str, help_text: str, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for label_names, label_values, value in samples:
+        lines.append(f"{name}{{{_labels(label_names, label_values)}}} {value}")
+
+
+def _labels(names: Labels, values: Labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is not None and stats.statements is not None:
+        query_log.check_statement(stats, statement)
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.record_query(seconds)
+    tracing.record_query(statement, seconds)
+    if settings.SLOW_QUERY_MS and seconds * 1000 >= settings.SLOW_QUERY_MS:
+        query_log.log_slow_query(current_request.get(), statement, parameters, executemany, seconds)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrumentation_enabled() -> bool:
+    """Whether engines and requests are instrumented: for /metrics, query inspection or tracing."""
+    return settings.METRICS_ENABLED or bool(settings.SLOW_QUERY_MS) or settings.QUERY_INSPECTION or tracing.tracing_enabled()
+
+
+def instrument_engine(sync_engine):
+    """Charge every statement `sync_engine` executes to the route of the request running it."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """
+    Counts requests by route template (not raw path, which would make one series per hymn id),
+    method and status, times them, tracks how many are in flight and collects the queries each
+    one ran. With tracing on it also records the request's spans (see core.tracing).
+    `routes` are the application's routes, matched the way the router will.
+    """
+
+    def __init__(self, app: ASGIApp, routes: List):
+        self.app = app
+        self.routes = routes
+
+    def _route(self, scope: Scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                return route.path
+            if match is Match.PARTIAL and partial is None:
+                partial = route.path  # right path, wrong method: answered with 405
+        return partial or UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], self._route(scope)
+        key = (method, route)
+        status = 500
+        stats = RequestStats(method, route)
+        token = current_request.set(stats)
+        trace = tracing.start_trace(method, route, scope["path"])
+        trace_token = tracing.current_trace.set(trace)
+        metrics.in_flight[key] = metrics.in_flight.get(key, 0) + 1
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    trace.response_started()
+                    if settings.SERVER_TIMING:
+                        MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight[key] -= 1
+            metrics.record_request(method, route, status, time.perf_counter() - start, stats)
+            current_request.reset(token)
+            tracing.current_trace.reset(trace_token)
+            if stats.statements:
+                query_log.report_repeats(stats)
+        if trace is not None:
+            trace.root.end = time.perf_counter()
+            if tracing.should_export(trace, tracing.sample()):
+                await tracing.export_trace(trace, status)
+
+
+@contextmanager
+def query_budget(limit: int, label: str = "query_budget block"):
+    """
+    Raise QueryBudgetExceeded once the enclosed code runs more than `limit` statements, for tests:
+
+        with query_budget(6):
+            await update_hymn(db, hymn_id, hymn, user_id)
+
+    Repeated statements are reported as for a request. Engines are only hooked while
+    `instrumentation_enabled()`, which METRICS_ENABLED or QUERY_INSPECTION is enough for.
+    """
+    stats = RequestStats("", label)
+    stats.statements = {}
+    stats.budget = limit
+    stats.budget_action = "raise"
+    token = current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request.reset(token)
+        query_log.report_repeats(stats)
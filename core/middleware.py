@@ -0,0 +1,76 @@
+# core/middleware.py
+from typing import Iterable, List
+
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.database import READ_PRIMARY_COOKIE
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReadYourWritesMiddleware:
+    """
+    Marks clients whose write just succeeded with a short-lived cookie that `get_read_db`
+    honours by reading from the primary instead of a replica that may not have caught up yet.
+    Requests to `read_only_paths` (reads sent as POST) do not count as writes.
+    """
+
+    def __init__(self, app: ASGIApp, max_lag_seconds: int, read_only_paths: Iterable[str] = ()):
+        self.app = app
+        self.read_only_paths = frozenset(read_only_paths)
+        self.cookie = f"{READ_PRIMARY_COOKIE}=1; Max-Age={max_lag_seconds}; Path=/; HttpOnly; SameSite=Lax"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or scope["path"] in self.read_only_paths:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+class RequestBodyLimitMiddleware:
+    """
+    Refuses request bodies over `max_bytes` on `routes` with 413 before they are received in
+    full: at once when Content-Length announces more, otherwise as soon as the bytes read pass
+    it. Without it a multipart upload is spooled to disk whole before the endpoint sees it.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, routes: List):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.routes = routes
+        self.detail = f"Request body larger than {max_bytes} bytes"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not any(route.matches(scope)[0] is Match.FULL for route in self.routes):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": self.detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, which passes HTTPExceptions through to the handler
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
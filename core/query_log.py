@@ -0,0 +1,85 @@
+# core/query_log.py
+"""
+Query inspection on top of the per-request accounting in core.metrics: slow statements are
+logged with their route and parameter shape, a statement repeated within one request is
+flagged as a likely N+1, and routes can be held to a query budget.
+
+Parameter values are never logged, only their types, so logs carry no user data.
+"""
+import logging
+import re
+from typing import Any
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Statements are logged on one line, cut to this many characters
+MAX_STATEMENT_LENGTH = 500
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def budget_for(method: str, route: str) -> int:
+    """Statements a request to `route` may run, 0 for no limit. QUERY_BUDGETS keys look like "PUT /api/v1/..."."""
+    return settings.QUERY_BUDGETS.get(f"{method} {route}", settings.QUERY_BUDGET_DEFAULT)
+
+
+def check_statement(stats, statement: str):
+    """Count `statement` against the request's budget and repeats; called before it runs."""
+    stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    # stats.queries does not include this statement yet
+    if stats.budget and stats.queries + 1 > stats.budget:
+        message = f"{stats.name} ran more than its budget of {stats.budget} queries: {one_line(statement)}"
+        if stats.budget_action == "raise":
+            raise QueryBudgetExceeded(message)
+        if not stats.over_budget:
+            stats.over_budget = True
+            logger.warning(message)
+
+
+def log_slow_query(stats, statement: str, parameters: Any, executemany: bool, seconds: float):
+    logger.warning(
+        "Slow query (%.1f ms) in %s: %s params=%s",
+        seconds * 1000, stats.name if stats is not None else "background", one_line(statement), parameter_shape(parameters, executemany),
+    )
+
+
+def report_repeats(stats):
+    """Log statements the request ran at least QUERY_REPEAT_THRESHOLD times; called when it ends."""
+    threshold = settings.QUERY_REPEAT_THRESHOLD
+    for statement, count in stats.statements.items():
+        if count >= threshold:
+            logger.warning("%s ran the same statement %d times (N+1?): %s", stats.name, count, one_line(statement))
+
+
+def one_line(statement: str) -> str:
+    statement = _WHITESPACE_RE.sub(" ", statement).strip()
+    if len(statement) > MAX_STATEMENT_LENGTH:
+        return statement[:MAX_STATEMENT_LENGTH] + "..."
+    return statement
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """Types of the bound parameters, e.g. "(str, int)"; executemany batches as "12 x (str, int)"."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        if not parameters:
+            return "0 x ()"
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_type_name(value)}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_type_name(value) for value in parameters) + ")"
+    return _type_name(parameters)
+
+
+def _type_name(value: Any) -> str:
+    if value is None:
+        return "None"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
@@ -1,14 +1,23 @@
 # core/services/auth.py
+import asyncio
+import time
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, or_
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set, Union
 import pyotp
+from core.cache import MISSING, TTLCache
 from core.settings import settings
+from core.tracing import span
 from user_management.models.user import User
+from user_management.models.permission import Permission, RolePermission
+from user_management.models.role import UserRole
+from user_management.schemas.user import UserOut
 from core.database import get_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/user_management/api/v1/login")
@@ -20,6 +29,81 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+
+class PasswordHashPool:
+    """
+    Runs bcrypt, which takes a few hundred milliseconds per call, on a bounded thread pool
+    instead of the event loop (bcrypt releases the GIL while hashing). At most `workers`
+    hashes run at once; past `max_queued` waiting calls, new ones are refused with a 503
+    rather than letting a login storm queue up unbounded latency. `workers=0` hashes inline.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash") if workers > 0 else None
+        self.running = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self._executor is None:
+            self.completed += 1
+            return fn(*args)
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations",
+                headers={"Retry-After": "1"},
+            )
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        started = False
+
+        def call():
+            nonlocal started
+            started = True
+            loop.call_soon_threadsafe(self._started)
+            return fn(*args)
+
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            if started:
+                self.running -= 1
+            else:
+                self.queued -= 1
+            self.completed += 1
+
+    def _started(self):
+        self.queued -= 1
+        self.running += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hash_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUED)
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -33,16 +117,149 @@ def verify_2fa(user: User, token: str):
     totp = pyotp.TOTP(user.totp_secret)
     return totp.verify(token)
 
-async def get_current_user(token: str, db: AsyncSession) -> User:
+def decode_access_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        if payload.get("sub") is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except jwt.JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    result = await db.execute(select(User).filter(User.username == username, User.is_active == True))
-    user = result.scalars().first()
+    return payload
+
+def get_token_subject(token: str) -> str:
+    return decode_access_token(token)["sub"]
+
+async def get_current_user(token: str, db: AsyncSession) -> User:
+    with span("auth"):
+        username = get_token_subject(token)
+        result = await db.execute(select(User).filter(User.username == username, User.is_active == True))
+        user = result.scalars().first()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+
+class TokenUser(NamedTuple):
+    """The user as described by the claims of a stateless access token."""
+    id: str
+    username: str
+    is_admin: bool
+    is_super_user: bool
+    is_active: bool = True
+
+
+class Principal(NamedTuple):
+    user: Union[UserOut, TokenUser]
+    permissions: FrozenSet[str]  # empty for superusers and admins, who are allowed everything
+
+
+# Active users and their effective permissions by username, so that a warm permission check
+# runs no query. The user services invalidate entries when users, roles or grants change.
+principal_cache = TTLCache("principals", settings.PERMISSION_CACHE_MAX_ENTRIES, settings.PERMISSION_CACHE_TTL_SECONDS)
+
+
+async def load_user_permissions(db: AsyncSession, user: User) -> FrozenSet[str]:
+    if user.is_super_user or user.is_admin:
+        return frozenset()
+    result = await db.execute(
+        select(Permission.name)
+        .join(RolePermission)
+        .join(UserRole, UserRole.role_id == RolePermission.role_id)
+        .filter(UserRole.user_id == user.id)
+        .distinct()
+    )
+    return frozenset(result.scalars().all())
+
+
+async def get_principal(username: str, db: AsyncSession) -> Principal:
+    principal = principal_cache.get(username, MISSING)
+    if principal is MISSING:
+        generation = principal_cache.generation
+        result = await db.execute(select(User).filter(User.username == username, User.is_active == True))
+        user = result.scalars().first()
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        with span("permission"):
+            permissions = await load_user_permissions(db, user)
+        principal = Principal(UserOut.model_validate(user), permissions)
+        principal_cache.set(username, principal, generation)
+    return principal
+
+
+def invalidate_principal(username: Optional[str] = None):
+    """Forget one user's cached permissions, or everyone's when a role's grants change."""
+    if username is None:
+        principal_cache.clear()
+    else:
+        principal_cache.delete(username)
+
+
+async def create_user_access_token(db: AsyncSession, user: User) -> str:
+    """
+    Access token whose claims are enough to authorize its bearer without a database lookup
+    when STATELESS_AUTH is on: the user id, role flags, permission names and `auth_version`.
+    """
+    return create_access_token(data={
+        "sub": user.username,
+        "uid": user.id,
+        "is_admin": bool(user.is_admin),
+        "is_super_user": bool(user.is_super_user),
+        "permissions": sorted(await load_user_permissions(db, user)),
+        "auth_version": user.auth_version,
+    })
+
+
+class AuthVersionTable:
+    """
+    In-memory copy of the users whose stateless tokens can no longer be trusted: those whose
+    `auth_version` moved past 1 (the claim of older tokens no longer matches) and deactivated
+    ones. It stays small because untouched users are simply absent.
+
+    Local writes `invalidate` users at once; changes made by other workers arrive with the
+    next `refresh`. A token that fails the check is not rejected outright, it just takes the
+    database path, which then applies the current state. So does every token once the last
+    successful refresh is older than `max_age_seconds`, or after a failed one.
+    """
+
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self.ready = False
+        self._refreshed_at = 0.0
+        self._versions: Dict[str, Optional[int]] = {}  # None: untrusted until the next refresh
+        self._invalidated: Set[str] = set()
+
+    async def refresh(self, db: AsyncSession):
+        # Users invalidated while the query runs are applied on top of its (possibly older) rows
+        self._invalidated = invalidated = set()
+        result = await db.execute(
+            select(User.id, User.auth_version, User.is_active)
+            .filter(or_(User.auth_version != 1, User.is_active == False))
+        )
+        versions = {user_id: version if is_active else None for user_id, version, is_active in result.all()}
+        versions.update(dict.fromkeys(invalidated))
+        self._versions = versions
+        self._refreshed_at = time.monotonic()
+        self.ready = True
+
+    def invalidate(self, *user_ids: str):
+        for user_id in user_ids:
+            self._versions[user_id] = None
+            self._invalidated.add(user_id)
+
+    def is_current(self, user_id: str, auth_version: Optional[int]) -> bool:
+        if not self.ready or time.monotonic() - self._refreshed_at > self.max_age_seconds:
+            return False
+        current = self._versions.get(user_id, 1)
+        return current is not None and current == auth_version
+
+
+auth_versions = AuthVersionTable(settings.AUTH_VERSIONS_MAX_AGE_SECONDS)
+
+
+def get_stateless_principal(claims: dict) -> Optional[Principal]:
+    """Authorize straight from the token claims, or None when they cannot be trusted."""
+    user_id = claims.get("uid")
+    if user_id is None or not auth_versions.is_current(user_id, claims.get("auth_version")):
+        return None
+    user = TokenUser(user_id, claims["sub"], bool(claims.get("is_admin")), bool(claims.get("is_super_user")))
+    return Principal(user, frozenset(claims.get("permissions", ())))
@@ -1,5 +1,6 @@
 # core/settings.py
 import os
+from typing import Dict, List, Optional
 
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -13,6 +14,56 @@ class Settings(BaseSettings):
     PASSWORD_RESET_CODE_EXPIRE_IN_MINUTES: int = 15
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_REFRESH_SECONDS: int = 0  # 0 disables; set >0 to pick up writes from other workers
+    FUZZY_SEARCH_THRESHOLD: float = 0.3  # minimum trigram similarity, pg_trgm's default
+    HYMN_CACHE_MAX_ENTRIES: int = 10000  # per cache; 0 disables read caching
+    HYMN_CACHE_TTL_SECONDS: int = 60  # bounds staleness from writes made by other workers
+    PERMISSION_CACHE_MAX_ENTRIES: int = 10000  # 0 disables; each entry is one user's permission set
+    PERMISSION_CACHE_TTL_SECONDS: int = 60  # bounds staleness from changes made by other workers
+    STATELESS_AUTH: bool = False  # authorize from token claims, checked against an in-memory revocation table
+    AUTH_VERSIONS_REFRESH_SECONDS: int = 30  # how soon other workers' revocations reach this one
+    AUTH_VERSIONS_MAX_AGE_SECONDS: int = 90  # past this without a successful refresh, stateless tokens are checked in the DB
+    PASSWORD_HASH_WORKERS: int = 4  # bcrypt threads; 0 hashes inline on the event loop
+    PASSWORD_HASH_MAX_QUEUED: int = 64  # waiting hashes beyond this get a 503
+    AUDIT_LOG_SYNC: bool = False  # write each audit entry in its own transaction before returning
+    AUDIT_LOG_BATCH_SIZE: int = 100
+    AUDIT_LOG_FLUSH_SECONDS: float = 1.0
+    AUDIT_LOG_QUEUE_SIZE: int = 10000
+    DB_PROFILE: str = "dev"  # "prod": no SQL echo, pre-ping and recycle connections
+    DB_ECHO: Optional[bool] = None  # None follows the profile
+    DB_POOL_SIZE: int = 5  # per worker process; total connections = workers x (size + overflow)
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # seconds to wait for a connection before failing the request
+    DB_POOL_RECYCLE: Optional[int] = None  # seconds; None follows the profile (prod 1800, dev never)
+    DB_POOL_PRE_PING: Optional[bool] = None  # None follows the profile (prod on)
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpg prepared statements per connection; 0 behind PgBouncer
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # with WAL, NORMAL is durable against crashes of the app, not of the OS
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    VARIANT_GROUPS_REBUILD_SECONDS: int = 0  # 0 disables; >0 periodically reclusters all hymn variant groups
+    MEDIA_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    MEDIA_MAX_IMAGE_PIXELS: int = 50_000_000  # larger images are refused as decompression bombs
+    MEDIA_RENDITION_SIZES: List[int] = [64, 256, 1024]  # longest side in pixels, each stored as WebP and JPEG
+    MEDIA_IMAGE_WORKERS: int = 2  # threads decoding and resizing uploaded images
+    READ_DATABASE_URL: Optional[str] = None  # read replica for public GETs; unset reads from DATABASE_URL
+    REPLICA_MAX_LAG_SECONDS: int = 5  # how long a client reads from the primary after its own write
+    METRICS_ENABLED: bool = False  # per-route request and query metrics at /metrics
+    METRICS_TOKEN: Optional[str] = None  # when set, /metrics requires "Authorization: Bearer <token>"; set it wherever the port is reachable
+    SLOW_QUERY_MS: float = 0  # 0 disables; statements slower than this are logged with route and parameter types
+    QUERY_INSPECTION: bool = False  # count statements per request to flag repeats and enforce budgets
+    QUERY_REPEAT_THRESHOLD: int = 5  # one statement run this often in a request is logged as a likely N+1
+    QUERY_BUDGETS: Dict[str, int] = {}  # e.g. {"PUT /api/v1/hymnal/hymns/{hymn_id}": 8}; statements per request
+    QUERY_BUDGET_DEFAULT: int = 0  # budget of routes missing from QUERY_BUDGETS; 0 for none
+    QUERY_BUDGET_ACTION: str = "warn"  # "raise" fails the request (use in tests), "warn" logs it once
+    SERVER_TIMING: bool = False  # Server-Timing header splitting each response into auth, permission, db, serialize, app
+    TRACE_SAMPLE_RATE: float = 0.0  # fraction of requests written to TRACE_FILE as span trees
+    TRACE_SLOW_MS: float = 0  # 0 disables; also write every request slower than this (traces all requests)
+    TRACE_FILE: str = "traces.jsonl"  # one JSON trace per line, appended to by every worker
+    BUNDLES_ENABLED: bool = True  # serve offline bundles, rebuilt in the background after a book's hymns change
+    BUNDLE_BUILD_DELAY_SECONDS: float = 5.0  # writes within this long of each other are bundled in one build
+    BUNDLE_STALENESS_CHECK_SECONDS: int = 60  # how often a download may rescan a book for writes its bundle missed
+    BUNDLE_GRACE_SECONDS: int = 600  # a replaced bundle stays on disk this long for downloads that already looked it up
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,62 @@
+# core/streaming.py
+import zlib
+from typing import AsyncIterator, Dict
+
+from fastapi import Request
+
+# Bytes gathered before handing a chunk to the compressor and the socket
+CHUNK_SIZE = 64 * 1024
+
+# Whole bodies smaller than this are sent as they are; gzip would save next to nothing
+GZIP_MIN_BYTES = 1024
+
+
+def accepted_encodings(request: Request) -> Dict[str, float]:
+    """Content codings of the Accept-Encoding header mapped to their quality values."""
+    encodings = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[coding.strip().lower()] = quality
+    return encodings
+
+
+def accepts_gzip(request: Request) -> bool:
+    encodings = accepted_encodings(request)
+    return encodings.get("gzip", encodings.get("*", 0.0)) > 0
+
+
+async def chunked(lines: AsyncIterator[bytes], size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Coalesce many small lines into chunks of about `size` bytes."""
+    buffer = bytearray()
+    async for line in lines:
+        buffer += line
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    """Compress a whole body into a single gzip member, as `gzipped` does a stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
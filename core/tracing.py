@@ -0,0 +1,216 @@
+# core/tracing.py
+"""
+Per-request span trees: the `Server-Timing` response header and a local JSONL trace file.
+
+A trace is a tree of named spans under the root "request" span. Auth, the permission check
+and each SQL statement open spans of their own (see core.dependencies and core.metrics), and
+"serialize" covers the time from the endpoint returning to the response starting. The header
+reports each phase's own time, without the spans nested in it, so the phases add up to the
+total: `auth;dur=0.4, permission;dur=0.1, db;dur=2.3, serialize;dur=0.8, app;dur=1.1, total;dur=4.7`.
+"""
+import asyncio
+import functools
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+
+from core.query_log import one_line
+from core.settings import settings
+
+# Statements whose SQL a trace keeps; later ones keep only their timing
+MAX_QUERY_STATEMENTS = 100
+# Phases in the order Server-Timing lists them; "app" is the root span's own time
+PHASES = ("auth", "permission", "db", "serialize", "app")
+
+_file_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, start: float, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float, end: float) -> Dict[str, Any]:
+        span_end = self.end if self.end is not None else end
+        body: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((span_end - self.start) * 1000, 3),
+        }
+        if self.attributes:
+            body["attributes"] = self.attributes
+        if self.children:
+            body["children"] = [child.to_dict(origin, end) for child in self.children]
+        return body
+
+
+class Trace:
+    def __init__(self, method: str, route: str, path: str):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc)
+        self.method = method
+        self.route = route
+        self.path = path
+        self.root = Span("request", time.perf_counter())
+        self._open = [self.root]
+        self.endpoint_returned: Optional[float] = None
+        self.query_spans = 0
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        opened = Span(name, time.perf_counter(), attributes or None)
+        self._open[-1].children.append(opened)
+        self._open.append(opened)
+        try:
+            yield opened
+        finally:
+            opened.end = time.perf_counter()
+            self._open.remove(opened)
+
+    def add_query(self, statement: str, seconds: float):
+        end = time.perf_counter()
+        query = Span("db", end - seconds)
+        query.end = end
+        if self.query_spans < MAX_QUERY_STATEMENTS:
+            query.attributes = {"statement": one_line(statement)}
+        self.query_spans += 1
+        self._open[-1].children.append(query)
+
+    def response_started(self):
+        # Everything between the endpoint returning and now was validation, encoding and rendering
+        if self.endpoint_returned is not None:
+            serialize = Span("serialize", self.endpoint_returned)
+            serialize.end = time.perf_counter()
+            self.root.children.append(serialize)
+            self.endpoint_returned = None
+
+    def breakdown(self, end: Optional[float] = None) -> Dict[str, float]:
+        """Milliseconds spent in each phase, excluding time in spans nested inside it."""
+        end = end if end is not None else time.perf_counter()
+        totals = dict.fromkeys(PHASES, 0.0)
+
+        def visit(span: Span, phase: str):
+            span_end = span.end if span.end is not None else end
+            own = span_end - span.start
+            for child in span.children:
+                child_end = child.end if child.end is not None else end
+                own -= child_end - child.start
+                visit(child, child.name if child.name in totals else phase)
+            totals[phase] += max(own, 0.0)
+
+        visit(self.root, "app")
+        breakdown = {phase: round(seconds * 1000, 3) for phase, seconds in totals.items()}
+        breakdown["total"] = round((end - self.root.start) * 1000, 3)
+        return breakdown
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{phase};dur={duration}" for phase, duration in self.breakdown().items())
+
+    def to_dict(self, status: int) -> Dict[str, Any]:
+        end = self.root.end or time.perf_counter()
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at.isoformat(),
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": status,
+            "duration_ms": round((end - self.root.start) * 1000, 3),
+            "breakdown_ms": self.breakdown(end),
+            "spans": self.root.to_dict(self.root.start, end),
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def tracing_enabled() -> bool:
+    return settings.SERVER_TIMING or settings.TRACE_SAMPLE_RATE > 0 or settings.TRACE_SLOW_MS > 0
+
+
+def start_trace(method: str, route: str, path: str) -> Optional[Trace]:
+    """A trace for this request if any tracing is on, or None so the rest costs nothing."""
+    if not tracing_enabled():
+        return None
+    return Trace(method, route, path)
+
+
+def should_export(trace: Trace, sampled: bool) -> bool:
+    if sampled:
+        return True
+    slow_ms = settings.TRACE_SLOW_MS
+    return bool(slow_ms) and (trace.root.end - trace.root.start) * 1000 >= slow_ms
+
+
+def sample() -> bool:
+    rate = settings.TRACE_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+async def export_trace(trace: Trace, status: int):
+    line = json.dumps(trace.to_dict(status), separators=(",", ":"), default=str)
+    await asyncio.to_thread(_append_line, settings.TRACE_FILE, line)
+
+
+def _append_line(path: str, line: str):
+    with _file_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Time the enclosed code as a span of the current request's trace; a no-op when it has none."""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as opened:
+        yield opened
+
+
+def record_query(statement: str, seconds: float):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_query(statement, seconds)
+
+
+def _mark_endpoint_return(endpoint):
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def traced_endpoint(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                trace = current_trace.get()
+                if trace is not None:
+                    trace.endpoint_returned = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def traced_endpoint(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                trace = current_trace.get()
+                if trace is not None:
+                    trace.endpoint_returned = time.perf_counter()
+    return traced_endpoint
+
+
+class TracedRoute(APIRoute):
+    """APIRoute noting when its endpoint returns, so the time until the response starts counts as "serialize"."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _mark_endpoint_return(endpoint), **kwargs)
@@ -1,22 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from core.dependencies import get_db, check_permission
+from typing import List, Optional
+import orjson
+from core.conditional import is_not_modified, not_modified, set_validators
+from core.database import read_session_factory
+from core.dependencies import get_db, get_read_db, check_permission
+from core.media import REVALIDATE_CACHE_CONTROL
+from core.settings import settings
+from core.streaming import GZIP_MIN_BYTES, accepts_gzip, chunked, gzip_bytes, gzipped
+from core.tracing import TracedRoute, span
 from user_management.schemas.user import UserOut
 from hymnal.schemas.hymn import (
     HymnBookCreate, HymnBookOut,
     HymnCreate, HymnOut, HymnUpdate,
-    HymnSearchResult, HymnVariantResult, HymnFilterParams
+    HymnSearchResult, HymnVariantResult, HymnFilterParams, CacheStats, HymnImportResult,
+    HymnBatchRequest, HymnBatchResult, MAX_BATCH_HYMNS, SyncResult
 )
 from hymnal.services.hymn import (
     create_hymn_book, update_hymn_book_thumbnail, delete_hymn_book,
-    create_hymn, get_hymn, update_hymn, delete_hymn, get_hymn_variants, get_hymn_book, get_all_hymn_books, search_hymns_by_filters,
-    get_hymns_by_hymn_book_id
+    create_hymn, update_hymn, delete_hymn, get_hymn_variants, search_hymns_by_filters,
+    get_hymns_by_hymn_book_id, encode_hymn_cursor, get_hymn_cache_stats,
+    get_versioned_hymn, get_versioned_hymn_book, get_versioned_hymn_books, get_hymn_book_hymns_validators,
+    export_hymn_book, get_hymns_batch
+)
+from hymnal.services.bundles import bundle_builder, read_manifest
+from hymnal.services.search_index import IndexedHymn
+from hymnal.services.sync import MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, get_changes
+from hymnal.services.hymn_import import (
+    IMPORT_FORMATS, detect_import_format, parse_hymn_rows, validate_hymn_rows, import_hymns
 )
 
 router = APIRouter(
     prefix="/api/v1/hymnal",
     tags=["Hymnal"],
+    route_class=TracedRoute,
 )
 
 @router.post(
@@ -44,14 +62,21 @@ async def create_hymn_book_endpoint(
     description="""
     Retrieve a list of all available hymn books.
 - Public endpoint (no authentication required).
+- Sends `ETag` and `Last-Modified`; answers `304 Not Modified` to a matching `If-None-Match` or `If-Modified-Since`.
     """,
     response_description="List of hymn books",
 )
 async def read_all_hymn_books(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    hymn_books = await get_all_hymn_books(db)
-    return hymn_books
+    hymn_books = await get_versioned_hymn_books(db)
+    if is_not_modified(request, hymn_books.etag, hymn_books.last_modified):
+        return not_modified(hymn_books.etag, hymn_books.last_modified)
+    # Cached already serialized; response_model only documents the shape
+    response = Response(hymn_books.value, media_type="application/json")
+    set_validators(response, hymn_books.etag, hymn_books.last_modified)
+    return response
 
 @router.get(
     "/hymn_books/{hymn_book_id}",
@@ -61,17 +86,23 @@ async def read_all_hymn_books(
     Retrieve a single hymn book and its details.
 - **hymn_book_id**: The unique ID of the hymn book.
 - Public endpoint (no authentication required).
+- Sends `ETag` and `Last-Modified`; answers `304 Not Modified` to a matching `If-None-Match` or `If-Modified-Since`.
     """,
     response_description="The hymn book object",
 )
 async def read_hymn_book_by_id(
     hymn_book_id: str,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    hymn_book = await get_hymn_book(db, hymn_book_id)
+    hymn_book = await get_versioned_hymn_book(db, hymn_book_id)
     if not hymn_book:
         raise HTTPException(status_code=404, detail="Hymn book not found")
-    return hymn_book
+    if is_not_modified(request, hymn_book.etag, hymn_book.last_modified):
+        return not_modified(hymn_book.etag, hymn_book.last_modified)
+    set_validators(response, hymn_book.etag, hymn_book.last_modified)
+    return hymn_book.value
 
 
 @router.post(
@@ -80,20 +111,22 @@ async def read_hymn_book_by_id(
     description="""
     Upload a thumbnail image for a hymn book.
 - **hymn_book_id**: The ID of the hymn book.
-- **thumbnail**: The image file (JPEG or PNG).
+- **thumbnail**: The image file (JPEG, PNG or WebP), at most `MEDIA_MAX_UPLOAD_BYTES`.
+- Stores resized renditions, listed in `thumbnail_renditions`, next to the original.
 - Requires authentication and `update_hymn_book` permission.
     """,
     response_description="Confirmation of successful upload",
 )
 async def upload_hymn_book_thumbnail(
     hymn_book_id: str,
-    thumbnail: UploadFile = File(..., description="Thumbnail image (JPEG or PNG)"),
+    thumbnail: UploadFile = File(..., description="Thumbnail image (JPEG, PNG or WebP)"),
     db: AsyncSession = Depends(get_db),
     current_user: UserOut = Depends(check_permission("update_hymn_book")),
 ):
     updated_book = await update_hymn_book_thumbnail(db, hymn_book_id, thumbnail, current_user.id)
     if not updated_book:
         raise HTTPException(status_code=404, detail="Hymn book not found")
+    bundle_builder.schedule(hymn_book_id)
     return {"detail": "Thumbnail uploaded"}
 
 @router.delete(
@@ -114,6 +147,7 @@ async def delete_hymn_book_endpoint(
     deleted_book = await delete_hymn_book(db, hymn_book_id, current_user.id)
     if not deleted_book:
         raise HTTPException(status_code=404, detail="Hymn book not found")
+    await bundle_builder.remove(hymn_book_id)
     return {"detail": "Hymn book deleted"}
 
 @router.post(
@@ -133,7 +167,28 @@ async def create_hymn_endpoint(
     db: AsyncSession = Depends(get_db),
     current_user: UserOut = Depends(check_permission("create_hymn")),
 ):
-    return await create_hymn(db, hymn, current_user.id)
+    created_hymn = await create_hymn(db, hymn, current_user.id)
+    bundle_builder.schedule(created_hymn.hymn_book_id)
+    return created_hymn
+
+@router.post(
+    "/hymns/batch",
+    response_model=HymnBatchResult,
+    summary="Get several hymns at once",
+    description=f"""
+    Fetch up to {MAX_BATCH_HYMNS} hymns in one request, e.g. a service's order of worship.
+- **ids**: hymn IDs; or
+- **hymn_book_id** and **numbers**: hymn numbers within one book.
+- Hymns come back in request order (repeats included); `missing_ids` / `missing_numbers` list what was not found.
+- Public endpoint (no authentication required).
+    """,
+    response_description="The hymns found, and what was not",
+)
+async def read_hymns_batch(
+    batch: HymnBatchRequest,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await get_hymns_batch(db, ids=batch.ids, hymn_book_id=batch.hymn_book_id, numbers=batch.numbers)
 
 @router.get(
     "/hymns/{hymn_id}",
@@ -143,17 +198,23 @@ async def create_hymn_endpoint(
     Retrieve a specific hymn.
 - **hymn_id**: The ID of the hymn.
 - Public endpoint (no authentication required).
+- Sends `ETag` and `Last-Modified`; answers `304 Not Modified` to a matching `If-None-Match` or `If-Modified-Since`.
     """,
     response_description="The hymn object",
 )
 async def read_hymn(
     hymn_id: str,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    hymn = await get_hymn(db, hymn_id)
+    hymn = await get_versioned_hymn(db, hymn_id)
     if not hymn:
         raise HTTPException(status_code=404, detail="Hymn not found")
-    return hymn
+    if is_not_modified(request, hymn.etag, hymn.last_modified):
+        return not_modified(hymn.etag, hymn.last_modified)
+    set_validators(response, hymn.etag, hymn.last_modified)
+    return hymn.value
 
 @router.put(
     "/hymns/{hymn_id}",
@@ -177,6 +238,7 @@ async def update_hymn_endpoint(
     updated_hymn = await update_hymn(db, hymn_id, hymn, current_user.id)
     if not updated_hymn:
         raise HTTPException(status_code=404, detail="Hymn not found")
+    bundle_builder.schedule(updated_hymn.hymn_book_id)
     return updated_hymn
 
 @router.delete(
@@ -197,44 +259,181 @@ async def delete_hymn_endpoint(
     deleted_hymn = await delete_hymn(db, hymn_id, current_user.id)
     if not deleted_hymn:
         raise HTTPException(status_code=404, detail="Hymn not found")
+    bundle_builder.schedule(deleted_hymn.hymn_book_id)
     return {"detail": "Hymn deleted"}
 
 @router.get(
     "/hymn_books/{hymn_book_id}/hymns",
     response_model=List[HymnSearchResult],
     summary="Get hymns by hymn book ID",
-    description="Retrieve all hymns belonging to a specific hymn book.",
+    description="Retrieve all hymns belonging to a specific hymn book, in number order. When a page is full, pass its `X-Next-Cursor` response header back as `cursor` to fetch the next one (faster than `skip` deep into large books). Sends `ETag` and `Last-Modified` and answers `304 Not Modified` to a matching `If-None-Match` or `If-Modified-Since` without loading any hymn.",
     response_description="List of hymns in the hymn book",
 )
 async def get_hymns_by_hymn_book(
     hymn_book_id: str,
+    request: Request,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Validators are read before the page, so a concurrent write can only make the body newer than its ETag
+    etag, last_modified = await get_hymn_book_hymns_validators(db, hymn_book_id)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    hymns = await get_hymns_by_hymn_book_id(db, hymn_book_id, skip, limit, cursor)
+    response = _hymn_list_response(hymns)
+    set_validators(response, etag, last_modified)
+    _set_next_cursor(response, hymns, limit)
+    return response
+
+
+@router.get(
+    "/hymn_books/{hymn_book_id}/export",
+    summary="Export a hymn book",
+    description="""
+    Stream every hymn of a hymn book, content included, as newline-delimited JSON in number order.
+- **hymn_book_id**: The ID of the hymn book.
+- Gzip-compressed when the request's `Accept-Encoding` allows it.
+- Public endpoint (no authentication required).
+    """,
+    response_description="One hymn object per line",
+    response_class=StreamingResponse,
+)
+async def export_hymn_book_endpoint(
+    hymn_book_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+):
+    if not await get_versioned_hymn_book(db, hymn_book_id):
+        raise HTTPException(status_code=404, detail="Hymn book not found")
+    body = chunked(export_hymn_book(hymn_book_id, read_session_factory(request)))
+    headers = {
+        "Content-Disposition": f'attachment; filename="hymn_book_{hymn_book_id}.ndjson"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request):
+        body = gzipped(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+@router.get(
+    "/hymn_books/{hymn_book_id}/bundle",
+    summary="Download a hymn book for offline use",
+    description="""
+    The whole hymn book as one gzipped SQLite database: the book with its thumbnail, and every hymn with its content.
+- **hymn_book_id**: The ID of the hymn book.
+- Prebuilt in the background after the book's hymns change, and sent as a file: downloads never scan the hymns.
+- May trail the latest writes by a few seconds; its `hymn_book.sync_seq` (also the `X-Sync-Seq` header) is the `since` to pass to `/sync` to catch up.
+- Sends `ETag`; answers `304 Not Modified` to a matching `If-None-Match`.
+- `404 Not Found` when offline bundles are disabled on the server.
+- Public endpoint (no authentication required).
+    """,
+    response_description="The bundle, a gzip-compressed SQLite file",
+    response_class=FileResponse,
+)
+async def download_hymn_book_bundle(
+    hymn_book_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+):
+    if not settings.BUNDLES_ENABLED:
+        # Nothing would keep a bundle current, so none is served
+        raise HTTPException(status_code=404, detail="Offline bundles are disabled")
+    if not await get_versioned_hymn_book(db, hymn_book_id):
+        raise HTTPException(status_code=404, detail="Hymn book not found")
+    manifest = await read_manifest(hymn_book_id)
+    if manifest is None:
+        # First download since the bundle was built (or lost): concurrent requests share one build
+        manifest = await bundle_builder.build(hymn_book_id)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Hymn book not found")
+    else:
+        # Catches writes no build was scheduled for; the current bundle is served meanwhile
+        await bundle_builder.check(db, hymn_book_id, manifest)
+    headers = {
+        "ETag": manifest.etag,
+        "Cache-Control": REVALIDATE_CACHE_CONTROL,
+        "X-Sync-Seq": str(manifest.sync_seq),
+    }
+    if is_not_modified(request, manifest.etag, None):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        manifest.path,
+        media_type="application/gzip",
+        filename=f"hymn_book_{hymn_book_id}.sqlite.gz",
+        headers=headers,
+    )
+
+
+@router.post(
+    "/hymn_books/{hymn_book_id}/import",
+    response_model=HymnImportResult,
+    summary="Bulk import hymns into a hymn book",
+    description="""
+    Import a whole book's hymns from one file, all or nothing.
+- **hymn_book_id**: The ID of the hymn book.
+- **file**: NDJSON (one hymn per line, e.g. an `/export` file), a JSON array, or CSV with title, number, content (JSON) and optional variant_key columns.
+- **format**: `ndjson`, `json` or `csv`; inferred from the file extension when omitted.
+- Every row is validated before anything is written; errors list the offending rows.
+- Requires authentication and `create_hymn` permission.
+    """,
+    response_description="Number of hymns imported",
+)
+async def import_hymns_endpoint(
+    hymn_book_id: str,
+    file: UploadFile = File(..., description="Hymns as NDJSON, JSON or CSV"),
+    format: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
+    current_user: UserOut = Depends(check_permission("create_hymn")),
 ):
-    hymns = await get_hymns_by_hymn_book_id(db, hymn_book_id, skip, limit)
-    return hymns
+    format = format or detect_import_format(file.filename)
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format; use one of {', '.join(IMPORT_FORMATS)}")
+    hymns = validate_hymn_rows(parse_hymn_rows(await file.read(), format))
+    imported = await import_hymns(db, hymn_book_id, hymns, current_user.id)
+    bundle_builder.schedule(hymn_book_id)
+    return HymnImportResult(hymn_book_id=hymn_book_id, imported=imported)
 
 
 @router.get(
     "/search",
     response_model=List[HymnSearchResult],
     summary="Search hymns by filters",
-    description="Search hymns using optional filters: title (partial match), number, hymn_book_id.",
+    description="Search hymns using optional filters: title (words of the title or lyrics, or part of the hymn number; best matches first), number, hymn_book_id. Set `fuzzy=true` to match misspelled titles, ranked by similarity. Passing `cursor` (empty for the first page) pages through the matches in book and number order instead; follow the `X-Next-Cursor` response header for the next page.",
     response_description="List of matching hymns",
 )
 async def search_hymns_filtered(
     filters: HymnFilterParams = Depends(),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    return await search_hymns_by_filters(
+    hymns = await search_hymns_by_filters(
         db,
         title=filters.title,
         number=filters.number,
         hymn_book_id=filters.hymn_book_id,
         skip=filters.skip,
         limit=filters.limit,
+        fuzzy=filters.fuzzy,
+        cursor=filters.cursor,
     )
+    response = _hymn_list_response(hymns)
+    if filters.cursor is not None:
+        _set_next_cursor(response, hymns, filters.limit)
+    return response
+
+
+def _hymn_list_response(hymns: List[IndexedHymn]) -> Response:
+    # Rows already have HymnSearchResult's fields in its order: skip validating and re-encoding each one
+    with span("serialize"):
+        return ORJSONResponse([hymn._asdict() for hymn in hymns])
+
+
+def _set_next_cursor(response: Response, hymns: List[IndexedHymn], limit: int):
+    # A short page is the last one; keep the cursor out of the body so list responses keep their shape
+    if hymns and len(hymns) >= limit:
+        response.headers["X-Next-Cursor"] = encode_hymn_cursor(hymns[-1])
 
 @router.get(
     "/hymns/{hymn_id}/variants",
@@ -243,13 +442,61 @@ async def search_hymns_filtered(
     description="""
     Get all variants/versions of a hymn from other books.
 - **hymn_id**: The ID of the base hymn.
-- Matches by `variant_key` or title similarity.
+- Hymns sharing a `variant_key`, or else a normalized title with a similar first line (or the same long first line), precomputed into variant groups.
 - Public endpoint.
     """,
     response_description="List of variant hymns",
 )
 async def get_hymn_variants_endpoint(
     hymn_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await get_hymn_variants(db, hymn_id)
+
+@router.get(
+    "/sync",
+    response_model=SyncResult,
+    summary="Get changes since a sync",
+    description=f"""
+    The hymn books and hymns created, changed or deleted since an earlier sync, for keeping an offline copy current.
+- **since**: `next_since` of the previous response; 0 (the default) fetches everything, without deletes.
+- **limit**: Changes per page, at most {MAX_SYNC_PAGE_SIZE}. While `has_more` is true, ask again with `next_since`.
+- Changed rows are sent whole, each once however often it changed; deleted ones by id only.
+- Gzip-compressed when the request's `Accept-Encoding` allows it.
+- Public endpoint (no authentication required).
+    """,
+    response_description="Changed rows, deleted ids and the cursor to sync from next",
+)
+async def sync_endpoint(
+    request: Request,
+    since: int = 0,
+    limit: int = SYNC_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
+):
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must not be negative")
+    if not 1 <= limit <= MAX_SYNC_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SYNC_PAGE_SIZE}")
+    changes = await get_changes(db, since, limit)
+    with span("serialize"):
+        body = orjson.dumps(changes)
+        headers = {"Vary": "Accept-Encoding"}
+        if len(body) >= GZIP_MIN_BYTES and accepts_gzip(request):
+            body = gzip_bytes(body)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
+@router.get(
+    "/cache/stats",
+    response_model=List[CacheStats],
+    summary="Get read cache statistics",
+    description="""
+    Hit, miss and eviction counters of the hymn, hymn book and variant read caches, for sizing them.
+- Requires authentication and `view_cache_stats` permission.
+    """,
+    response_description="Statistics per cache",
+)
+async def get_cache_stats_endpoint(
+    current_user: UserOut = Depends(check_permission("view_cache_stats")),
 ):
-    return await get_hymn_variants(db, hymn_id)
\ No newline at end of file
+    return get_hymn_cache_stats()
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Index, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from core.models.base import Base
@@ -16,4 +16,11 @@ class Hymn(Base):
     number = Column(Integer, index=True)
     variant_key = Column(String, nullable=True, index=True)
     content = Column(JSON)  # e.g., {"verses": [{"verse_tag": "v1", "verse_name": "Verse 1", "verse_content": "Text"}], "chorus": "Chorus"}
-    hymn_book = relationship("HymnBook", back_populates="hymns")
\ No newline at end of file
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # bumped by every write; feeds the ETag
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+    hymn_book = relationship("HymnBook", back_populates="hymns")
+
+    __table_args__ = (
+        # Keyset pagination key: hymns of a book in number order, id breaking ties
+        Index("ix_hymns_book_number_id", "hymn_book_id", "number", "id"),
+    )
\ No newline at end of file
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, DateTime, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from core.models.base import Base
@@ -13,4 +13,6 @@ class HymnBook(Base):
     id = Column(String, primary_key=True, default=generate_uuid, index=True)
     title = Column(String, index=True)
     thumbnail_path = Column(String, nullable=True)  # e.g., "hymn_books/thumbnails/book_1.jpg"
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # bumped by every write; feeds the ETag
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
     hymns = relationship("Hymn", back_populates="hymn_book")
\ No newline at end of file
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from core.models.base import Base
+
+
+class HymnSearchDocument(Base):
+    __tablename__ = "hymn_search_documents"
+    # Integer key so SQLite's FTS5 table can use it as its content rowid
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hymn_id = Column(String, ForeignKey("hymns.id", ondelete="CASCADE"), unique=True, index=True)
+    document = Column(Text)  # title, chorus and verse_content joined by newlines
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, ForeignKey
+from core.models.base import Base
+
+
+class HymnVariantGroup(Base):
+    """A hymn's membership of a variant group: hymns sharing a group_id are versions of one another."""
+    __tablename__ = "hymn_variant_groups"
+    hymn_id = Column(String, ForeignKey("hymns.id", ondelete="CASCADE"), primary_key=True)
+    group_id = Column(String, nullable=False, index=True)  # "key:<variant_key>", else a uuid given to the group when it formed
+    # Normalized title and first line, matched against new hymns; null for hymns grouped by variant_key
+    title_key = Column(String, nullable=True, index=True)
+    first_line_key = Column(String, nullable=True, index=True)
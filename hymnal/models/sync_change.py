@@ -0,0 +1,21 @@
+from sqlalchemy import Boolean, Column, Integer, String, UniqueConstraint
+from core.models.base import Base
+
+
+class SyncChange(Base):
+    """
+    The latest change to a hymn or hymn book, numbered by `seq`: every write replaces the row's
+    entry with a new, higher one, so the table holds one entry per row ever written. Deleted rows
+    keep theirs as a tombstone (`deleted`), which is how syncing clients learn of the delete.
+    """
+    __tablename__ = "sync_changes"
+    # AUTOINCREMENT on SQLite, so the seq of a replaced entry is never handed out again
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)  # "hymn" or "hymn_book"
+    entity_id = Column(String, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id", name="uq_sync_changes_entity"),
+        {"sqlite_autoincrement": True},
+    )
@@ -1,5 +1,9 @@
-from pydantic import BaseModel, field_validator
-from typing import Optional, Dict
+from pydantic import BaseModel, computed_field, field_serializer, field_validator, model_validator
+from typing import Optional, Dict, List
+from core.media import image_renditions, media_url
+
+# Hymns one batch request may ask for, about a dozen services' worth
+MAX_BATCH_HYMNS = 100
 
 class Verse(BaseModel):
     verse_tag: str  # e.g., "v1", "intro" for ordering
@@ -19,9 +23,30 @@ class HymnBookUpdate(BaseModel):
 class HymnBookOut(HymnBookBase):
     id: str
     thumbnail_path: Optional[str] = None
+
+    @field_serializer("thumbnail_path")
+    def serialize_thumbnail_path(self, thumbnail_path: Optional[str]) -> Optional[str]:
+        # Served as its URL, whose file name changes with the image, so clients can cache it for good
+        return media_url(thumbnail_path)
+
+    @computed_field
+    @property
+    def thumbnail_renditions(self) -> Dict[str, str]:
+        # e.g. {"64.webp": "/media/.../64.webp", "256.jpg": ...}; lists should use these, not the original
+        return image_renditions(self.thumbnail_path)
+
     class Config:
         from_attributes = True
 
+def hymn_book_out_dict(id: str, title: str, thumbnail_path: Optional[str]) -> Dict:
+    """HymnBookOut's JSON form, built straight from columns for listings (keep in step with the model)."""
+    return {
+        "title": title,
+        "id": id,
+        "thumbnail_path": media_url(thumbnail_path),
+        "thumbnail_renditions": image_renditions(thumbnail_path),
+    }
+
 class HymnBase(BaseModel):
     title: str
     number: int
@@ -47,10 +72,21 @@ class HymnUpdate(HymnBase):
 
 class HymnOut(HymnBase):
     id: str
-    hymn_book_id: str
+    hymn_book_id: Optional[str] = None  # None once its hymn book has been deleted
     class Config:
         from_attributes = True
 
+def hymn_out_dict(id: str, hymn_book_id: Optional[str], title: str, number: int, variant_key: Optional[str], content: Dict) -> Dict:
+    """HymnOut's JSON form, built straight from columns (keep in step with the model)."""
+    return {
+        "title": title,
+        "number": number,
+        "content": content,
+        "variant_key": variant_key,
+        "id": id,
+        "hymn_book_id": hymn_book_id,
+    }
+
 class HymnSearchResult(BaseModel):
     id: str
     title: str
@@ -66,5 +102,55 @@ class HymnFilterParams(BaseModel):
     title: Optional[str] = None
     number: Optional[int] = None
     hymn_book_id: Optional[str] = None
+    fuzzy: bool = False  # typo-tolerant title match, ranked by similarity
     skip: int = 0
-    limit: int = 10
\ No newline at end of file
+    limit: int = 10
+    cursor: Optional[str] = None  # keyset cursor from X-Next-Cursor; "" starts from the first page
+
+class HymnBatchRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    hymn_book_id: Optional[str] = None
+    numbers: Optional[List[int]] = None  # with hymn_book_id, instead of ids
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        if self.ids is not None:
+            if self.hymn_book_id is not None or self.numbers is not None:
+                raise ValueError("Pass either ids or hymn_book_id with numbers, not both")
+            requested = self.ids
+        elif self.hymn_book_id is not None and self.numbers is not None:
+            requested = self.numbers
+        else:
+            raise ValueError("Pass ids, or hymn_book_id with numbers")
+        if not requested:
+            raise ValueError("Ask for at least one hymn")
+        if len(requested) > MAX_BATCH_HYMNS:
+            raise ValueError(f"Ask for at most {MAX_BATCH_HYMNS} hymns")
+        return self
+
+class HymnBatchResult(BaseModel):
+    hymns: List[HymnOut]  # in request order
+    missing_ids: List[str] = []
+    missing_numbers: List[int] = []
+
+class SyncResult(BaseModel):
+    since: int
+    next_since: int  # pass as `since` next time; unchanged when nothing changed
+    has_more: bool  # another page is waiting: ask again straight away with next_since
+    hymn_books: List[HymnBookOut]  # created or changed
+    hymns: List[HymnOut]  # hymn_book_id None: the hymn outlived its deleted book
+    deleted_hymn_books: List[str]
+    deleted_hymns: List[str]
+
+class HymnImportResult(BaseModel):
+    hymn_book_id: str
+    imported: int
+
+class CacheStats(BaseModel):
+    name: str
+    size: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
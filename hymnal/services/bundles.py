@@ -0,0 +1,313 @@
+# hymnal/services/bundles.py
+import asyncio
+import contextvars
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import AsyncSessionLocal
+from core.media import is_content_addressed
+from core.settings import settings
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_book import HymnBook
+from hymnal.models.sync_change import SyncChange
+from hymnal.services.hymn import get_hymn_book_hymns_validators
+
+logger = logging.getLogger(__name__)
+
+# Bundles are stored under <BUNDLE_DIR>/<first 2 hex digits>/<sha256 of the file>/, with one
+# "<hymn book id>.json" manifest per book pointing at its current bundle
+BUNDLE_DIR = "media/hymn_books/bundles"
+BUNDLE_FILE_NAME = "hymn_book.sqlite.gz"
+
+# PRAGMA user_version of the bundle database; bumped whenever its schema changes
+BUNDLE_FORMAT_VERSION = 1
+
+# The thumbnail rendition bundled for content-addressed images; older images go in as uploaded
+BUNDLE_THUMBNAIL = "256.webp"
+
+BUNDLE_SCHEMA = """
+CREATE TABLE hymn_book (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    sync_seq INTEGER NOT NULL,
+    thumbnail BLOB,
+    thumbnail_name TEXT
+);
+CREATE TABLE hymns (
+    id TEXT PRIMARY KEY,
+    number INTEGER,
+    title TEXT,
+    variant_key TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX ix_hymns_number ON hymns (number, id);
+CREATE INDEX ix_hymns_title ON hymns (title);
+"""
+
+
+class BundleManifest(NamedTuple):
+    path: str  # gzipped SQLite file, under MEDIA_ROOT
+    sha256: str
+    size: int
+    source_etag: str  # the book's hymn listing ETag when the bundle was built
+    sync_seq: int  # change sequence the bundle is current to; sync from here after installing it
+    built_at: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256[:32]}"'
+
+
+def _manifest_path(hymn_book_id: str) -> str:
+    return os.path.join(BUNDLE_DIR, f"{hymn_book_id}.json")
+
+
+async def read_manifest(hymn_book_id: str) -> Optional[BundleManifest]:
+    """The book's current bundle as last built by any worker, or None if it has none (on disk)."""
+    try:
+        async with aiofiles.open(_manifest_path(hymn_book_id), "r") as f:
+            manifest = BundleManifest(**json.loads(await f.read()))
+    except (FileNotFoundError, ValueError, TypeError):
+        return None
+    return manifest if await aiofiles.os.path.exists(manifest.path) else None
+
+
+def _thumbnail(path: Optional[str]):
+    if not path:
+        return None, None
+    if is_content_addressed(path):
+        rendition = os.path.join(os.path.dirname(path), BUNDLE_THUMBNAIL)
+        if os.path.exists(rendition):
+            path = rendition
+    try:
+        with open(path, "rb") as f:
+            return f.read(), os.path.basename(path)
+    except FileNotFoundError:
+        return None, None
+
+
+def _write_bundle(hymn_book: Dict, hymns: List[tuple], sync_seq: int) -> tuple:
+    """Write the SQLite file, gzip it and move it into place; returns (path, sha256, size)."""
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    build_path = os.path.join(BUNDLE_DIR, f".build-{uuid.uuid4()}")
+    try:
+        connection = sqlite3.connect(build_path + ".sqlite")
+        try:
+            connection.executescript(BUNDLE_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {BUNDLE_FORMAT_VERSION}")
+            thumbnail, thumbnail_name = _thumbnail(hymn_book["thumbnail_path"])
+            connection.execute(
+                "INSERT INTO hymn_book VALUES (?, ?, ?, ?, ?, ?)",
+                (hymn_book["id"], hymn_book["title"], hymn_book["version"], sync_seq, thumbnail, thumbnail_name),
+            )
+            connection.executemany("INSERT INTO hymns VALUES (?, ?, ?, ?, ?)", hymns)
+            connection.commit()
+        finally:
+            connection.close()
+
+        # No file name or build time in the gzip header, so rebuilding unchanged data gives the same file
+        digest = hashlib.sha256()
+        with open(build_path + ".sqlite", "rb") as source, open(build_path + ".gz", "wb") as raw:
+            with gzip.GzipFile(filename="", fileobj=raw, mode="wb", compresslevel=9, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed)
+        with open(build_path + ".gz", "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        directory = os.path.join(BUNDLE_DIR, sha256[:2], sha256)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, BUNDLE_FILE_NAME)
+        os.replace(build_path + ".gz", path)
+        return path, sha256, os.path.getsize(path)
+    finally:
+        for suffix in (".sqlite", ".gz"):
+            if os.path.exists(build_path + suffix):
+                os.remove(build_path + suffix)
+
+
+def _retire(path: str):
+    """Leave a bundle no manifest points at any more to `_sweep`, timed from now."""
+    try:
+        os.utime(os.path.dirname(path))
+    except FileNotFoundError:
+        pass
+
+
+def _sweep():
+    """
+    Delete bundles that no manifest points at and that were retired (or, for builds that never
+    got installed, written) over BUNDLE_GRACE_SECONDS ago. Until then a download that read the
+    old manifest just before it was replaced still finds its file.
+    """
+    current = set()
+    for manifest_path in glob.glob(os.path.join(BUNDLE_DIR, "*.json")):
+        try:
+            with open(manifest_path) as f:
+                current.add(os.path.dirname(json.load(f)["path"]))
+        except (FileNotFoundError, ValueError, KeyError):
+            continue
+    expired = time.time() - settings.BUNDLE_GRACE_SECONDS
+    for directory in glob.glob(os.path.join(BUNDLE_DIR, "*", "*")):
+        try:
+            if directory not in current and os.path.getmtime(directory) < expired:
+                shutil.rmtree(directory, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+
+def _install_manifest(hymn_book_id: str, manifest: BundleManifest, previous: Optional[BundleManifest]):
+    temporary = _manifest_path(hymn_book_id) + f".{uuid.uuid4()}"
+    with open(temporary, "w") as f:
+        json.dump(manifest._asdict(), f)
+    os.replace(temporary, _manifest_path(hymn_book_id))
+    if previous and previous.path != manifest.path:
+        _retire(previous.path)
+    _sweep()
+
+
+def _remove_bundle(hymn_book_id: str):
+    try:
+        with open(_manifest_path(hymn_book_id)) as f:
+            path = json.load(f)["path"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return
+    os.remove(_manifest_path(hymn_book_id))
+    _retire(path)
+    _sweep()
+
+
+async def build_bundle(hymn_book_id: str) -> Optional[BundleManifest]:
+    """Build a book's bundle from one scan of its hymns and make it current; None if the book is gone."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(HymnBook.id, HymnBook.title, HymnBook.version, HymnBook.thumbnail_path).filter(HymnBook.id == hymn_book_id)
+        )
+        hymn_book = result.first()
+        if hymn_book is None:
+            return None
+        # Read before the hymns, so a concurrent write can only leave the bundle newer than both
+        source_etag, _ = await get_hymn_book_hymns_validators(db, hymn_book_id)
+        sync_seq = (await db.execute(select(func.max(SyncChange.seq)))).scalar() or 0
+        result = await db.execute(
+            select(Hymn.id, Hymn.number, Hymn.title, Hymn.variant_key, Hymn.content)
+            .filter(Hymn.hymn_book_id == hymn_book_id)
+            .order_by(Hymn.number.asc(), Hymn.id.asc())
+        )
+        hymns = [(row.id, row.number, row.title, row.variant_key, json.dumps(row.content)) for row in result]
+
+    previous = await read_manifest(hymn_book_id)
+    path, sha256, size = await asyncio.to_thread(_write_bundle, hymn_book._asdict(), hymns, sync_seq)
+    manifest = BundleManifest(path, sha256, size, source_etag, sync_seq, datetime.now(timezone.utc).isoformat())
+    await asyncio.to_thread(_install_manifest, hymn_book_id, manifest, previous)
+    return manifest
+
+
+class BundleBuilder:
+    """
+    Builds hymn book bundles in the background, at most one build per book at a time.
+
+    `schedule` is called after every write to a book's hymns; the build starts
+    `delay_seconds` later, so an import or a burst of edits is bundled once. A write that
+    lands while a build is reading schedules another round after it. `build` is for
+    requests finding no bundle at all: they wait for the running build, or start one.
+
+    Builds run in a context of their own, not the one of the request that started them: their
+    queries are background work, charged to no route, budget or trace.
+    """
+
+    def __init__(self, delay_seconds: float):
+        self.delay_seconds = delay_seconds
+        self._scheduled: Dict[str, asyncio.Task] = {}
+        self._building: Dict[str, asyncio.Task] = {}
+        self._dirty = set()
+        self._checked: Dict[str, Tuple[int, float]] = {}  # book -> (latest seq it was found current at, when)
+
+    async def check(self, db: AsyncSession, hymn_book_id: str, manifest: BundleManifest):
+        """
+        Schedule a rebuild if the bundle missed writes, e.g. made by a script rather than the API.
+
+        Costs one lookup of the latest change seq while nothing has been written since the bundle
+        was built or last found current. Otherwise the book's hymns are aggregated, at most once
+        every BUNDLE_STALENESS_CHECK_SECONDS per book, never on every download.
+        """
+        latest = (await db.execute(select(func.max(SyncChange.seq)))).scalar() or 0
+        current_at, checked_at = self._checked.get(hymn_book_id, (0, 0.0))
+        if latest <= max(current_at, manifest.sync_seq):
+            return
+        now = time.monotonic()
+        if now - checked_at < settings.BUNDLE_STALENESS_CHECK_SECONDS:
+            return
+        # Noted before the query, so concurrent downloads do not run it as well
+        self._checked[hymn_book_id] = (current_at, now)
+        source_etag, _ = await get_hymn_book_hymns_validators(db, hymn_book_id)
+        if source_etag != manifest.source_etag:
+            self.schedule(hymn_book_id)
+        else:
+            self._checked[hymn_book_id] = (latest, now)
+
+    def schedule(self, hymn_book_id: str):
+        if not settings.BUNDLES_ENABLED:
+            return
+        self._dirty.add(hymn_book_id)
+        task = self._scheduled.get(hymn_book_id)
+        if task is None or task.done():
+            self._scheduled[hymn_book_id] = asyncio.create_task(self._rebuild(hymn_book_id), context=contextvars.Context())
+
+    async def _rebuild(self, hymn_book_id: str):
+        try:
+            while hymn_book_id in self._dirty:
+                await asyncio.sleep(self.delay_seconds)
+                self._dirty.discard(hymn_book_id)
+                try:
+                    await self.build(hymn_book_id)
+                except Exception:
+                    logger.exception("Building the bundle of hymn book %s failed", hymn_book_id)
+        finally:
+            self._scheduled.pop(hymn_book_id, None)
+
+    async def build(self, hymn_book_id: str) -> Optional[BundleManifest]:
+        task = self._building.get(hymn_book_id)
+        if task is None:
+            task = self._building[hymn_book_id] = asyncio.create_task(build_bundle(hymn_book_id), context=contextvars.Context())
+            task.add_done_callback(lambda _: self._building.pop(hymn_book_id, None))
+        # Shielded: a client hanging up must not cancel the build everyone else is waiting on
+        return await asyncio.shield(task)
+
+    async def remove(self, hymn_book_id: str):
+        """Drop a deleted book's bundle, and any build of it still pending."""
+        self._dirty.discard(hymn_book_id)
+        self._checked.pop(hymn_book_id, None)
+        task = self._scheduled.pop(hymn_book_id, None)
+        if task is not None:
+            task.cancel()
+        # A build that read the book before it was deleted would otherwise install its bundle afterwards
+        building = self._building.get(hymn_book_id)
+        if building is not None:
+            await asyncio.gather(asyncio.shield(building), return_exceptions=True)
+        await asyncio.to_thread(_remove_bundle, hymn_book_id)
+
+    async def stop(self):
+        """Cancel pending rebuilds; a book left stale is rebuilt when its bundle is next asked for."""
+        tasks = list(self._scheduled.values()) + list(self._building.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+bundle_builder = BundleBuilder(settings.BUNDLE_BUILD_DELAY_SECONDS)
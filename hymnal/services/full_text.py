@@ -0,0 +1,73 @@
+# hymnal/services/full_text.py
+from typing import Dict, Optional
+
+from sqlalchemy import Float, column, delete, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_search_document import HymnSearchDocument
+from hymnal.services.search_index import hymn_text_fields, tokenize
+
+# Postgres: must match the expression of the GIN index created by the migration exactly.
+# The 'simple' configuration does no stemming, which suits hymns written in several languages.
+TS_CONFIG = literal_column("'simple'::regconfig")
+search_vector = func.to_tsvector(TS_CONFIG, HymnSearchDocument.document)
+
+# SQLite: FTS5 virtual table whose content is hymn_search_documents, kept in sync by triggers
+hymn_search_fts = table("hymn_search_fts", column("rowid"), column("hymn_search_fts"))
+
+
+def build_search_document(title: Optional[str], content: Optional[Dict]) -> str:
+    """
+    The hymn's searchable text as the tokens `match_hymn_ids` queries with: lowercased and
+    without accents. Postgres' 'simple' configuration keeps accents, so the document must not.
+    """
+    return "\n".join(" ".join(tokenize(text)) for text, _ in hymn_text_fields(title, content) if text)
+
+
+async def sync_search_document(db: AsyncSession, hymn: Hymn, created: bool = False):
+    """Write the hymn's search document in the caller's transaction (flush a new hymn first)."""
+    document = build_search_document(hymn.title, hymn.content)
+    if not created:
+        result = await db.execute(select(HymnSearchDocument).filter(HymnSearchDocument.hymn_id == hymn.id))
+        search_document = result.scalars().first()
+        if search_document:
+            search_document.document = document
+            return
+    db.add(HymnSearchDocument(hymn_id=hymn.id, document=document))
+
+
+async def delete_search_document(db: AsyncSession, hymn_id: str):
+    await db.execute(delete(HymnSearchDocument).where(HymnSearchDocument.hymn_id == hymn_id))
+
+
+def match_hymn_ids(dialect_name: str, text: str) -> Optional[Select]:
+    """
+    Select (hymn_id, rank) for hymns whose title or lyrics contain every word of `text`,
+    the last word as a prefix, using the database's own full-text index.
+    Returns None when `text` has no searchable words.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    if dialect_name == "postgresql":
+        ts_query = func.to_tsquery(TS_CONFIG, " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"]))
+        return (
+            select(HymnSearchDocument.hymn_id, func.ts_rank(search_vector, ts_query).label("rank"))
+            .where(search_vector.op("@@")(ts_query))
+        )
+    if dialect_name == "sqlite":
+        fts_query = " ".join([f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*'])
+        return (
+            select(
+                HymnSearchDocument.hymn_id,
+                # bm25() is lower-is-better; negate so every backend ranks descending
+                (-func.bm25(literal_column("hymn_search_fts"), type_=Float)).label("rank"),
+            )
+            .join(hymn_search_fts, hymn_search_fts.c.rowid == HymnSearchDocument.id)
+            .where(hymn_search_fts.c.hymn_search_fts.op("MATCH")(fts_query))
+        )
+    # No native full-text support: still cheaper than unnesting the content JSON of every hymn
+    conditions = [HymnSearchDocument.document.ilike(f"%{token}%") for token in tokens]
+    return select(HymnSearchDocument.hymn_id, literal_column("0.0", Float).label("rank")).where(*conditions)
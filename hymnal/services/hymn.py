@@ -1,14 +1,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func, String, and_, cast, exists
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select, update, or_, func, String, and_, cast, false, tuple_
 from fastapi import HTTPException, UploadFile
 from hymnal.models.hymn_book import HymnBook
 from hymnal.models.hymn import Hymn
-from hymnal.schemas.hymn import HymnSearchResult
+from hymnal.models.hymn_variant_group import HymnVariantGroup
+from hymnal.schemas.hymn import HymnBatchResult, HymnBookOut, HymnOut, HymnVariantResult, hymn_book_out_dict
+from hymnal.services.search_index import IndexedHymn, hymn_search_index
+from hymnal.services.full_text import match_hymn_ids, sync_search_document, delete_search_document
+from hymnal.services.trigram_index import title_trigram_index
+from hymnal.services.variant_groups import assign_variant_groups, delete_variant_group_member
+from hymnal.services.sync import HYMN, HYMN_BOOK, record_changes
+from core.cache import MISSING, TTLCache
+from core.conditional import Versioned, collection_validators, collection_validators_from_aggregate, row_validators
+from core.database import AsyncSessionLocal
+from core.media import delete_image, store_image
+from core.settings import settings
 from user_management.services.user import log_action
-from typing import Dict, List, Optional
-import aiofiles
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+import orjson
 import os
-import uuid
 
 # Base directory for media files
 MEDIA_DIR = "media/hymn_books/thumbnails"
@@ -16,11 +30,116 @@ MEDIA_DIR = "media/hymn_books/thumbnails"
 # Ensure media directory exists (synchronous, run at startup)
 os.makedirs(MEDIA_DIR, exist_ok=True)
 
+# Rows fetched per round trip while streaming a book export
+EXPORT_YIELD_PER = 500
+
+# In-process search indexes kept in step with the write paths below
+SEARCH_INDEXES = (hymn_search_index, title_trigram_index)
+
+
+def _index_hymn(hymn: Hymn, hymn_book_title: str):
+    for index in SEARCH_INDEXES:
+        if index.ready:
+            index.add(hymn, hymn_book_title)
+
+
+def _unindex_hymn(hymn_id: str):
+    for index in SEARCH_INDEXES:
+        if index.ready:
+            index.remove(hymn_id)
+
+
+def _unindex_hymn_book(hymn_book_id: str):
+    for index in SEARCH_INDEXES:
+        if index.ready:
+            index.remove_book(hymn_book_id)
+
+
+# Read-through caches of the public reads. They hold pydantic snapshots rather than ORM
+# instances, which would be bound to the session that loaded them.
+hymn_cache = TTLCache("hymns", settings.HYMN_CACHE_MAX_ENTRIES, settings.HYMN_CACHE_TTL_SECONDS)
+hymn_book_cache = TTLCache("hymn_books", settings.HYMN_CACHE_MAX_ENTRIES, settings.HYMN_CACHE_TTL_SECONDS)
+hymn_variants_cache = TTLCache("hymn_variants", settings.HYMN_CACHE_MAX_ENTRIES, settings.HYMN_CACHE_TTL_SECONDS)
+HYMN_CACHES = (hymn_cache, hymn_book_cache, hymn_variants_cache)
+ALL_HYMN_BOOKS = ("all",)  # hymn_book_cache key of the full listing
+
+
+def get_hymn_cache_stats() -> List[Dict]:
+    return [cache.stats() for cache in HYMN_CACHES]
+
+
+def _fill_generation(db: AsyncSession, cache: TTLCache) -> int:
+    """
+    Generation to store a freshly loaded entry under. Rows read from a replica shortly after
+    a local write may predate it, so they are not cached (a generation that cannot match).
+    """
+    if db.info.get("replica") and cache.seconds_since_invalidation() < settings.REPLICA_MAX_LAG_SECONDS:
+        return -1
+    return cache.generation
+
+
+def _invalidate_hymn(hymn_id: str):
+    hymn_cache.delete(hymn_id)
+    # Any hymn's variants may list this one (same variant_key or a similar title)
+    hymn_variants_cache.clear()
+
+
+def _invalidate_hymn_book(hymn_book_id: str):
+    hymn_book_cache.delete(hymn_book_id)
+    hymn_book_cache.delete(ALL_HYMN_BOOKS)
+
+
+def _bump_version(row):
+    # Evaluated in the UPDATE itself so concurrent writers cannot hand out the same version;
+    # updated_at follows through the column's onupdate
+    row.version = type(row).version + 1
+
+
+def register_imported_hymns(hymns: List[Hymn], hymn_book_title: str):
+    """Bring the search indexes and read caches up to date with hymns inserted in bulk."""
+    for hymn in hymns:
+        _index_hymn(hymn, hymn_book_title)
+    # Imported hymns may be variants of hymns already cached
+    hymn_variants_cache.clear()
+
+
+def encode_hymn_cursor(hymn: IndexedHymn) -> str:
+    """Opaque keyset cursor pointing just past `hymn` in (hymn_book_id, number, id) order."""
+    key = json.dumps([hymn.hymn_book_id, hymn.number, hymn.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_hymn_cursor(cursor: str) -> Optional[Tuple[str, int, str]]:
+    """Decode a cursor from `encode_hymn_cursor`; an empty cursor means the first page."""
+    if not cursor:
+        return None
+    try:
+        hymn_book_id, number, hymn_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not (isinstance(hymn_book_id, str) and isinstance(number, int) and isinstance(hymn_id, str)):
+            raise ValueError
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return hymn_book_id, number, hymn_id
+
+
+def _hymn_key():
+    return tuple_(Hymn.hymn_book_id, Hymn.number, Hymn.id)
+
+
+def _select_hymn_rows():
+    # Just HymnSearchResult's columns, in its field order, so rows load as IndexedHymn tuples without ORM objects
+    return select(
+        Hymn.id, Hymn.title, Hymn.number, Hymn.hymn_book_id, HymnBook.title.label("hymn_book_title"), Hymn.variant_key
+    ).join(HymnBook)
+
 
 async def create_hymn_book(db: AsyncSession, hymn_book: "HymnBookCreate", user_id: str) -> HymnBook:
     db_hymn_book = HymnBook(**hymn_book.dict())
     db.add(db_hymn_book)
+    await db.flush()  # assigns db_hymn_book.id for its change record
+    await record_changes(db, HYMN_BOOK, [db_hymn_book.id])
     await db.commit()
+    hymn_book_cache.delete(ALL_HYMN_BOOKS)
     await db.refresh(db_hymn_book)
     await log_action(db, user_id, "CREATE_HYMN_BOOK", f"Created hymn book {hymn_book.title}")
     return db_hymn_book
@@ -33,31 +152,38 @@ async def update_hymn_book_thumbnail(db: AsyncSession, hymn_book_id: str, thumbn
     hymn_book = result.scalars().first()
     if not hymn_book:
         raise HTTPException(status_code=404, detail="Hymn book not found")
-    if thumbnail.content_type not in ["image/jpeg", "image/png"]:
+    if thumbnail.content_type not in ["image/jpeg", "image/png", "image/webp"]:
         raise HTTPException(status_code=400, detail="Invalid image format")
 
-    # Generate unique filename
-    file_extension = thumbnail.filename.split(".")[-1]
-    filename = f"book_{hymn_book_id}_{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(MEDIA_DIR, filename)
-
-    # Save file asynchronously
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(await thumbnail.read())
-
-    # Delete old thumbnail if exists
-    if hymn_book.thumbnail_path and os.path.exists(hymn_book.thumbnail_path):
-        os.remove(hymn_book.thumbnail_path)  # Synchronous, as aiofiles.delete is not critical
+    # Streamed to disk and resized off the event loop; identical images are stored once
+    file_path = await store_image(thumbnail, MEDIA_DIR)
+    old_path = hymn_book.thumbnail_path
+    delete_old = old_path != file_path and not await _thumbnail_shared(db, old_path, hymn_book_id)
 
     # Update path
     hymn_book.thumbnail_path = file_path
+    _bump_version(hymn_book)
+    await record_changes(db, HYMN_BOOK, [hymn_book_id])
     await db.commit()
+    _invalidate_hymn_book(hymn_book_id)
+    if delete_old:
+        await delete_image(old_path)
     await db.refresh(hymn_book)
     await log_action(db, user_id, "UPDATE_HYMN_BOOK_THUMBNAIL",
                      f"Updated thumbnail for hymn book {hymn_book.title}")
     return hymn_book
 
 
+async def _thumbnail_shared(db: AsyncSession, path: Optional[str], hymn_book_id: str) -> bool:
+    """Whether another book uses the same (content-addressed) thumbnail, which must then stay."""
+    if not path:
+        return False
+    result = await db.execute(
+        select(HymnBook.id).filter(HymnBook.thumbnail_path == path, HymnBook.id != hymn_book_id).limit(1)
+    )
+    return result.first() is not None
+
+
 async def create_hymn(db: AsyncSession, hymn: "HymnCreate", user_id: str) -> Hymn:
 
     result = await db.execute(select(HymnBook).filter(HymnBook.id == hymn.hymn_book_id))
@@ -67,25 +193,114 @@ async def create_hymn(db: AsyncSession, hymn: "HymnCreate", user_id: str) -> Hym
     validate_hymn_content(hymn.content)  # Synchronous validation, as it's CPU-bound
     db_hymn = Hymn(**hymn.dict())
     db.add(db_hymn)
+    await db.flush()  # assigns db_hymn.id for its search document
+    await sync_search_document(db, db_hymn, created=True)
+    await assign_variant_groups(db, [db_hymn])
+    await record_changes(db, HYMN, [db_hymn.id])
     await db.commit()
+    _invalidate_hymn(db_hymn.id)
     await db.refresh(db_hymn)
+    _index_hymn(db_hymn, hymn_book.title)
     await log_action(db, user_id, "CREATE_HYMN", f"Created hymn {hymn.title} in book {hymn_book.title}")
     return db_hymn
 
 
-async def get_hymn_book(db: AsyncSession, hymn_book_id: str) -> HymnBook:
-    result = await db.execute(select(HymnBook).filter(HymnBook.id == hymn_book_id))
-    return result.scalars().first()
+async def get_versioned_hymn_book(db: AsyncSession, hymn_book_id: str) -> Optional[Versioned]:
+    entry = hymn_book_cache.get(hymn_book_id, MISSING)
+    if entry is MISSING:
+        generation = _fill_generation(db, hymn_book_cache)
+        result = await db.execute(select(HymnBook).filter(HymnBook.id == hymn_book_id))
+        hymn_book = result.scalars().first()
+        if not hymn_book:
+            return None
+        entry = Versioned(HymnBookOut.model_validate(hymn_book), *row_validators(hymn_book.id, hymn_book.version, hymn_book.updated_at))
+        hymn_book_cache.set(hymn_book_id, entry, generation)
+    return entry
 
 
-async def get_all_hymn_books(db: AsyncSession) -> List[HymnBook]:
-    result = await db.execute(select(HymnBook).order_by(HymnBook.title.asc()))
-    return result.scalars().all()
+async def get_hymn_book(db: AsyncSession, hymn_book_id: str) -> Optional[HymnBookOut]:
+    entry = await get_versioned_hymn_book(db, hymn_book_id)
+    return entry.value if entry else None
 
 
-async def get_hymn(db: AsyncSession, hymn_id: str) -> Hymn:
-    result = await db.execute(select(Hymn).filter(Hymn.id == hymn_id))
-    return result.scalars().first()
+async def get_versioned_hymn_books(db: AsyncSession) -> Versioned:
+    """All hymn books by title. The value is the listing's JSON body, serialized once per cache fill."""
+    entry = hymn_book_cache.get(ALL_HYMN_BOOKS, MISSING)
+    if entry is MISSING:
+        generation = _fill_generation(db, hymn_book_cache)
+        result = await db.execute(
+            select(HymnBook.id, HymnBook.title, HymnBook.thumbnail_path, HymnBook.version, HymnBook.updated_at)
+            .order_by(HymnBook.title.asc())
+        )
+        hymn_books = result.all()
+        entry = Versioned(
+            orjson.dumps([hymn_book_out_dict(row.id, row.title, row.thumbnail_path) for row in hymn_books]),
+            *collection_validators((row.version, row.updated_at) for row in hymn_books),
+        )
+        hymn_book_cache.set(ALL_HYMN_BOOKS, entry, generation)
+    return entry
+
+
+async def get_versioned_hymn(db: AsyncSession, hymn_id: str) -> Optional[Versioned]:
+    entry = hymn_cache.get(hymn_id, MISSING)
+    if entry is MISSING:
+        generation = _fill_generation(db, hymn_cache)
+        result = await db.execute(select(Hymn).filter(Hymn.id == hymn_id))
+        hymn = result.scalars().first()
+        if not hymn:
+            return None
+        entry = Versioned(HymnOut.model_validate(hymn), *row_validators(hymn.id, hymn.version, hymn.updated_at))
+        hymn_cache.set(hymn_id, entry, generation)
+    return entry
+
+
+async def get_hymn(db: AsyncSession, hymn_id: str) -> Optional[HymnOut]:
+    entry = await get_versioned_hymn(db, hymn_id)
+    return entry.value if entry else None
+
+
+async def get_hymns_batch(db: AsyncSession, ids: Optional[List[str]] = None, hymn_book_id: Optional[str] = None,
+                          numbers: Optional[List[int]] = None) -> HymnBatchResult:
+    """
+    Fetch several hymns at once, either by id or by number within one book, in request order.
+
+    By id, cached hymns are served from the hymn cache and the rest come from a single
+    `IN` query. By number, one `IN` query returns every hymn carrying one of the numbers
+    (all of them, by id, when a book numbers several hymns alike).
+    """
+    if ids is not None:
+        found: Dict[str, HymnOut] = {}
+        for hymn_id in ids:
+            entry = hymn_cache.get(hymn_id, MISSING)
+            if entry is not MISSING:
+                found[hymn_id] = entry.value
+        uncached = sorted(set(ids) - found.keys())
+        if uncached:
+            generation = _fill_generation(db, hymn_cache)
+            result = await db.execute(select(Hymn).filter(Hymn.id.in_(uncached)))
+            for hymn in result.scalars():
+                entry = Versioned(HymnOut.model_validate(hymn), *row_validators(hymn.id, hymn.version, hymn.updated_at))
+                hymn_cache.set(hymn.id, entry, generation)
+                found[hymn.id] = entry.value
+        return HymnBatchResult(
+            hymns=[found[hymn_id] for hymn_id in ids if hymn_id in found],
+            missing_ids=[hymn_id for hymn_id in dict.fromkeys(ids) if hymn_id not in found],
+        )
+
+    result = await db.execute(
+        select(Hymn)
+        .filter(Hymn.hymn_book_id == hymn_book_id, Hymn.number.in_(set(numbers)))
+        .order_by(Hymn.id)
+    )
+    by_number: Dict[int, List[HymnOut]] = {}
+    for hymn in result.scalars():
+        by_number.setdefault(hymn.number, []).append(HymnOut.model_validate(hymn))
+    if not by_number and await get_versioned_hymn_book(db, hymn_book_id) is None:
+        raise HTTPException(status_code=404, detail="Hymn book not found")
+    return HymnBatchResult(
+        hymns=[hymn for number in numbers for hymn in by_number.get(number, [])],
+        missing_numbers=[number for number in dict.fromkeys(numbers) if number not in by_number],
+    )
 
 
 async def update_hymn(db: AsyncSession, hymn_id: str, hymn: "HymnUpdate", user_id: str) -> Hymn:
@@ -101,24 +316,37 @@ async def update_hymn(db: AsyncSession, hymn_id: str, hymn: "HymnUpdate", user_i
         validate_hymn_content(hymn.content)
         for key, value in hymn.dict(exclude_unset=True).items():
             setattr(db_hymn, key, value)
-        await db.commit()
-        await db.refresh(db_hymn)
-        await log_action(db, user_id, "UPDATE_HYMN", f"Updated hymn {hymn.title} in book {hymn_book.title}")
-        return db_hymn
+        _bump_version(db_hymn)
+        await sync_search_document(db, db_hymn)
+        await assign_variant_groups(db, [db_hymn])
+        await record_changes(db, HYMN, [hymn_id])
+    # Committed by the block; the session cannot be used inside it once that transaction is closed
+    _invalidate_hymn(hymn_id)
+    await db.refresh(db_hymn)
+    _index_hymn(db_hymn, hymn_book.title)
+    await log_action(db, user_id, "UPDATE_HYMN", f"Updated hymn {hymn.title} in book {hymn_book.title}")
+    return db_hymn
 
 
 async def delete_hymn(db: AsyncSession, hymn_id: str, user_id: str) -> Hymn:
     async with db.begin():
         result = await db.execute(select(Hymn).filter(Hymn.id == hymn_id))
         db_hymn = result.scalars().first()
-        if db_hymn:
-            result = await db.execute(select(HymnBook).filter(HymnBook.id == db_hymn.hymn_book_id))
-            hymn_book = result.scalars().first()
-            await db.delete(db_hymn)
-            await db.commit()
-            await log_action(db, user_id, "DELETE_HYMN", f"Deleted hymn {db_hymn.title} in book {hymn_book.title}")
-            return db_hymn
-        raise HTTPException(status_code=404, detail="Hymn not found")
+        if not db_hymn:
+            raise HTTPException(status_code=404, detail="Hymn not found")
+        result = await db.execute(select(HymnBook).filter(HymnBook.id == db_hymn.hymn_book_id))
+        hymn_book = result.scalars().first()
+        await delete_search_document(db, db_hymn.id)
+        await delete_variant_group_member(db, db_hymn.id)
+        await db.delete(db_hymn)
+        await record_changes(db, HYMN, [db_hymn.id], deleted=True)
+    # Committed by the block; the session cannot be used inside it once that transaction is closed
+    _invalidate_hymn(hymn_id)
+    _unindex_hymn(db_hymn.id)
+    # A hymn whose book was deleted has none to name
+    in_book = f" in book {hymn_book.title}" if hymn_book else ""
+    await log_action(db, user_id, "DELETE_HYMN", f"Deleted hymn {db_hymn.title}{in_book}")
+    return db_hymn
 
 
 async def delete_hymn_book(db: AsyncSession, hymn_book_id: str, user_id: str) -> HymnBook:
@@ -127,36 +355,56 @@ async def delete_hymn_book(db: AsyncSession, hymn_book_id: str, user_id: str) ->
         hymn_book = result.scalars().first()
         if not hymn_book:
             raise HTTPException(status_code=404, detail="Hymn book not found")
-        if hymn_book.thumbnail_path and os.path.exists(hymn_book.thumbnail_path):
-            os.remove(hymn_book.thumbnail_path)  # Synchronous, as aiofiles.delete is not critical
+        delete_thumbnail = not await _thumbnail_shared(db, hymn_book.thumbnail_path, hymn_book_id)
+        # Its hymns stay, without a book: they changed too, for ETags and for syncing clients
+        result = await db.execute(select(Hymn.id).filter(Hymn.hymn_book_id == hymn_book_id))
+        orphaned_ids = result.scalars().all()
+        await db.execute(
+            update(Hymn).where(Hymn.hymn_book_id == hymn_book_id).values(hymn_book_id=None, version=Hymn.version + 1)
+        )
         await db.delete(hymn_book)
-        await db.commit()
-        await log_action(db, user_id, "DELETE_HYMN_BOOK", f"Deleted hymn book {hymn_book.title}")
-        return hymn_book
+        await record_changes(db, HYMN_BOOK, [hymn_book_id], deleted=True)
+        await record_changes(db, HYMN, orphaned_ids)
+    # Committed by the block; the session cannot be used inside it once that transaction is closed
+    if delete_thumbnail:
+        await delete_image(hymn_book.thumbnail_path)
+    _invalidate_hymn_book(hymn_book_id)
+    # Its hymns lose their book, which cached hymns and variant listings still show
+    hymn_cache.clear()
+    hymn_variants_cache.clear()
+    _unindex_hymn_book(hymn_book.id)
+    await log_action(db, user_id, "DELETE_HYMN_BOOK", f"Deleted hymn book {hymn_book.title}")
+    return hymn_book
 
 
-async def get_hymns_by_hymn_book_id(
-    db: AsyncSession, hymn_book_id: str, skip: int = 0, limit: int = 10
-) -> List[HymnSearchResult]:
+async def get_hymn_book_hymns_validators(db: AsyncSession, hymn_book_id: str):
+    """ETag and Last-Modified of a book's hymn listing, from one aggregate query and no hymn rows."""
+    # Every hymn in the listing carries the book title, so the book's own version counts too
+    hymn_book_version = select(HymnBook.version).filter(HymnBook.id == hymn_book_id).scalar_subquery()
     result = await db.execute(
-        select(Hymn, HymnBook.title.label("hymn_book_title"))
-        .join(HymnBook)
+        select(func.count(Hymn.id), func.sum(Hymn.version), func.max(Hymn.updated_at), hymn_book_version)
+        .filter(Hymn.hymn_book_id == hymn_book_id)
+    )
+    return collection_validators_from_aggregate(*result.one())
+
+
+async def get_hymns_by_hymn_book_id(
+    db: AsyncSession, hymn_book_id: str, skip: int = 0, limit: int = 10, cursor: Optional[str] = None
+) -> List[IndexedHymn]:
+    query = (
+        _select_hymn_rows()
         .filter(Hymn.hymn_book_id == hymn_book_id)
-        .offset(skip)
-        .limit(limit)
+        .order_by(Hymn.number.asc(), Hymn.id.asc())
     )
+    after = decode_hymn_cursor(cursor) if cursor is not None else None
+    if after is not None:
+        # Seek straight to the cursor through ix_hymns_book_number_id instead of skipping rows
+        query = query.filter(_hymn_key() > tuple_(*after))
+    elif cursor is None:
+        query = query.offset(skip)
+    result = await db.execute(query.limit(limit))
     results = result.all()
-    return [
-        HymnSearchResult(
-            id=hymn.id,
-            title=hymn.title,
-            number=hymn.number,
-            hymn_book_id=hymn.hymn_book_id,
-            hymn_book_title=hymn_book_title,
-            variant_key=hymn.variant_key,
-        )
-        for hymn, hymn_book_title in results
-    ]
+    return [IndexedHymn(*row) for row in results]
 
 
 async def search_hymns_by_filters(
@@ -166,20 +414,43 @@ async def search_hymns_by_filters(
     hymn_book_id: Optional[str] = None,
     skip: int = 0,
     limit: int = 10,
-) -> List[HymnSearchResult]:
-    query = select(Hymn, HymnBook.title.label("hymn_book_title")).join(HymnBook)
+    fuzzy: bool = False,
+    cursor: Optional[str] = None,
+) -> List[IndexedHymn]:
+    # A cursor (even an empty one, for the first page) switches to (hymn_book_id, number, id) keyset order
+    after = decode_hymn_cursor(cursor) if cursor is not None else None
+    if title and fuzzy:
+        return await search_hymns_by_similar_title(db, title, number, hymn_book_id, skip, limit, cursor)
+
+    if title and settings.SEARCH_INDEX_ENABLED and hymn_search_index.ready:
+        # Ranked lookup in the in-process inverted index; covers title, number and content at once
+        if cursor is not None:
+            after = after or ()  # every key sorts after the empty tuple
+        return hymn_search_index.search(title, number, hymn_book_id, skip, limit, after)
+
+    query = _select_hymn_rows()
 
     filters = []
-    is_asc = False
+    rank = None
     if title is not None:
-        # ilike for title (case-insensitive partial match)
-        title_filter = Hymn.title.ilike(f"%{title}%")
-
-        # ilike for number (cast number to string for partial numeric match)
-        number_filter = cast(Hymn.number, String).ilike(f"%{title}%")
-
-        # combine both
-        filters.append(or_(title_filter, number_filter))
+        # Title and lyrics words, matched through the database's full-text index
+        matches = match_hymn_ids(db.bind.dialect.name, title)
+        title_filters = []
+        if matches is not None:
+            matches = matches.subquery()
+            rank = matches.c.rank
+            if title.isdigit():
+                query = query.outerjoin(matches, matches.c.hymn_id == Hymn.id)
+                title_filters.append(matches.c.hymn_id.is_not(None))
+            else:
+                query = query.join(matches, matches.c.hymn_id == Hymn.id)
+        if title.isdigit():
+            # ilike for number (cast number to string for partial numeric match)
+            title_filters.append(cast(Hymn.number, String).ilike(f"%{title}%"))
+        if title_filters:
+            filters.append(or_(*title_filters))
+        elif matches is None:
+            filters.append(false())
     if number is not None:
         filters.append(Hymn.number == number)
     if hymn_book_id is not None:
@@ -188,87 +459,123 @@ async def search_hymns_by_filters(
     if filters:
         query = query.filter(and_(*filters))
 
-    if hymn_book_id:
+    # Within a book, or for a purely numeric title, order by number ascending; otherwise best match first
+    if cursor is not None:
+        query = query.order_by(Hymn.hymn_book_id.asc(), Hymn.number.asc(), Hymn.id.asc())
+        if after is not None:
+            query = query.filter(_hymn_key() > tuple_(*after))
+        skip = 0
+    elif hymn_book_id or (title and title.isdigit()):
         query = query.order_by(Hymn.number.asc())
-        is_asc = True
-
-    # If title is purely numeric, order by number ascending
-    if title and title.isdigit():
-        if not is_asc:
-            query = query.order_by(Hymn.number.asc())
+    elif rank is not None:
+        query = query.order_by(rank.desc(), Hymn.number.asc())
 
     result = await db.execute(query.offset(skip).limit(limit))
     results = result.all()
 
-    if not results and title:
-        try:
-            # Fallback: Search in content (any verse_content or chorus)
-            content_query = select(Hymn, HymnBook.title.label("hymn_book_title")).join(HymnBook)
+    return [IndexedHymn(*row) for row in results]
 
-            # Chorus filter (assuming chorus is a string)
-            chorus_filter = cast(Hymn.content.op('->>')('chorus'), String).ilike(f"%{title}%")
 
-            # Verses filter (any verse_content in the array) - Use json_array_elements for JSON type
-            verses_elem = func.json_array_elements(Hymn.content.op('->')('verses')).alias('verse_elem')
-            verses_subquery = (
-                select(1)
-                .select_from(verses_elem)
-                .where(cast(verses_elem.c.verse_elem.op('->>')('verse_content'), String).ilike(f"%{title}%"))
-            )
-            verses_filter = exists(verses_subquery)
-
-            content_filters = [or_(chorus_filter, verses_filter)]
-            if hymn_book_id is not None:
-                content_filters.append(Hymn.hymn_book_id == hymn_book_id)
-
-            content_query = content_query.filter(and_(*content_filters))
-            content_result = await db.execute(content_query.offset(skip).limit(limit))
-            results = content_result.all()
-
-        except AttributeError:
-            pass
-
-    return [
-        HymnSearchResult(
-            id=hymn.id,
-            title=hymn.title,
-            number=hymn.number,
-            hymn_book_id=hymn.hymn_book_id,
-            hymn_book_title=hymn_book_title,
-            variant_key=hymn.variant_key,
+async def search_hymns_by_similar_title(
+    db: AsyncSession,
+    title: str,
+    number: Optional[int] = None,
+    hymn_book_id: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+) -> List[IndexedHymn]:
+    """Typo-tolerant title search ranked by trigram similarity (pg_trgm on Postgres, in-process elsewhere)."""
+    threshold = settings.FUZZY_SEARCH_THRESHOLD
+    after = decode_hymn_cursor(cursor) if cursor is not None else None
+    if db.bind.dialect.name != "postgresql" and title_trigram_index.ready:
+        if cursor is not None:
+            after = after or ()  # every key sorts after the empty tuple
+        return [doc for doc, _ in title_trigram_index.search(title, threshold, number, hymn_book_id, skip, limit, after)]
+
+    score = func.similarity(Hymn.title, title)
+    query = (
+        _select_hymn_rows()
+        .filter(Hymn.title.op("%")(title), score >= threshold)  # `%` lets Postgres use the GIN trigram index
+    )
+    if number is not None:
+        query = query.filter(Hymn.number == number)
+    if hymn_book_id is not None:
+        query = query.filter(Hymn.hymn_book_id == hymn_book_id)
+    if cursor is not None:
+        query = query.order_by(Hymn.hymn_book_id.asc(), Hymn.number.asc(), Hymn.id.asc())
+        if after is not None:
+            query = query.filter(_hymn_key() > tuple_(*after))
+        skip = 0
+    else:
+        query = query.order_by(score.desc(), Hymn.number.asc())
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [IndexedHymn(*row) for row in result.all()]
+
+
+async def export_hymn_book(hymn_book_id: str, session_factory: sessionmaker = AsyncSessionLocal) -> AsyncIterator[bytes]:
+    """
+    Yield every hymn of a book, content included, as NDJSON lines in number order.
+
+    Rows come through a server-side cursor `EXPORT_YIELD_PER` at a time, so memory stays flat
+    whatever the size of the book. The generator opens its own session, from `session_factory`
+    (the replica's for the public export), because it keeps running after the endpoint has
+    returned the response.
+    """
+    async with session_factory() as db:
+        hymns = await db.stream_scalars(
+            select(Hymn)
+            .filter(Hymn.hymn_book_id == hymn_book_id)
+            .order_by(Hymn.number.asc(), Hymn.id.asc())
+            .execution_options(yield_per=EXPORT_YIELD_PER)
         )
-        for hymn, hymn_book_title in results
-    ]
+        async for hymn in hymns:
+            yield HymnOut.model_validate(hymn).model_dump_json().encode() + b"\n"
+            # Rows already written out are not needed in the identity map any more
+            db.expunge(hymn)
+
+
+async def get_hymn_variants(db: AsyncSession, hymn_id: str) -> List[HymnVariantResult]:
+    variants = hymn_variants_cache.get(hymn_id, MISSING)
+    if variants is MISSING:
+        generation = _fill_generation(db, hymn_variants_cache)
+        variants = tuple(await _load_hymn_variants(db, hymn_id))
+        hymn_variants_cache.set(hymn_id, variants, generation)
+    return list(variants)
 
 
-async def get_hymn_variants(db: AsyncSession, hymn_id: str) -> List[Dict]:
+async def _load_hymn_variants(db: AsyncSession, hymn_id: str) -> List[HymnVariantResult]:
     async with db.begin():
-        result = await db.execute(select(Hymn).filter(Hymn.id == hymn_id))
-        hymn = result.scalars().first()
+        result = await db.execute(
+            select(Hymn.title, Hymn.variant_key, HymnVariantGroup.group_id)
+            .outerjoin(HymnVariantGroup, HymnVariantGroup.hymn_id == Hymn.id)
+            .filter(Hymn.id == hymn_id)
+        )
+        hymn = result.first()
         if not hymn:
             raise HTTPException(status_code=404, detail="Hymn not found")
-        if hymn.variant_key:
-            result = await db.execute(
-                select(Hymn, HymnBook.title.label("hymn_book_title"))
-                .join(HymnBook)
-                .filter(Hymn.variant_key == hymn.variant_key, Hymn.id != hymn_id)
+        query = select(Hymn, HymnBook.title.label("hymn_book_title")).join(HymnBook).filter(Hymn.id != hymn_id)
+        if hymn.group_id:
+            # Precomputed by hymnal.services.variant_groups: one lookup on the group_id index
+            query = query.join(HymnVariantGroup, HymnVariantGroup.hymn_id == Hymn.id).filter(
+                HymnVariantGroup.group_id == hymn.group_id
             )
+        elif hymn.variant_key:
+            query = query.filter(Hymn.variant_key == hymn.variant_key)
         else:
-            result = await db.execute(
-                select(Hymn, HymnBook.title.label("hymn_book_title"))
-                .join(HymnBook)
-                .filter(Hymn.title.ilike(f"%{hymn.title}%"), Hymn.id != hymn_id)
-            )
+            # Hymn not grouped yet (groups not backfilled); match titles as before
+            query = query.filter(Hymn.title.ilike(f"%{hymn.title}%"))
+        result = await db.execute(query)
         variants = result.all()
         return [
-            {
-                "id": variant.id,
-                "title": variant.title,
-                "number": variant.number,
-                "hymn_book_id": variant.hymn_book_id,
-                "hymn_book_title": hymn_book_title,
-                "variant_key": variant.variant_key,
-            }
+            HymnVariantResult(
+                id=variant.id,
+                title=variant.title,
+                number=variant.number,
+                hymn_book_id=variant.hymn_book_id,
+                hymn_book_title=hymn_book_title,
+                variant_key=variant.variant_key,
+            )
             for variant, hymn_book_title in variants
         ]
 
@@ -0,0 +1,158 @@
+# hymnal/services/hymn_import.py
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hymnal.models.hymn import Hymn, generate_uuid
+from hymnal.models.hymn_book import HymnBook
+from hymnal.models.hymn_search_document import HymnSearchDocument
+from hymnal.schemas.hymn import HymnBase
+from hymnal.services.full_text import build_search_document
+from hymnal.services.hymn import register_imported_hymns, validate_hymn_content
+from hymnal.services.sync import HYMN, record_changes
+from hymnal.services.variant_groups import assign_variant_groups
+from user_management.services.user import log_action
+
+IMPORT_FORMATS = ("ndjson", "json", "csv")
+
+# Rows per multi-row INSERT (or per COPY on Postgres)
+IMPORT_BATCH_SIZE = 1000
+
+# Validation errors reported back before giving up on listing more
+MAX_REPORTED_ERRORS = 20
+
+HYMN_COLUMNS = ("id", "hymn_book_id", "title", "number", "variant_key", "content", "version", "updated_at")
+
+
+def detect_import_format(filename: Optional[str]) -> Optional[str]:
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "jsonl":
+        return "ndjson"
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def parse_hymn_rows(data: bytes, format: str) -> List[Dict]:
+    """
+    Parse an import file into raw hymn rows.
+
+    - **ndjson**: one hymn object per line; a book's `/export` output imports as is.
+    - **json**: an array of hymn objects, or an object with a `hymns` array.
+    - **csv**: columns title, number, content (a JSON object) and optionally variant_key.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+        if format == "ndjson":
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        if format == "json":
+            rows = json.loads(text)
+            return rows.get("hymns", []) if isinstance(rows, dict) else rows
+        if format == "csv":
+            rows = []
+            for row in csv.DictReader(io.StringIO(text)):
+                if row.get("content"):
+                    row["content"] = json.loads(row["content"])
+                rows.append({key: value for key, value in row.items() if value not in (None, "")})
+            return rows
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {format} file: {e}")
+    raise HTTPException(status_code=400, detail=f"Unsupported import format; use one of {', '.join(IMPORT_FORMATS)}")
+
+
+def validate_hymn_rows(rows: List) -> List[HymnBase]:
+    """Validate every row before anything is written; raises 400 listing the offending rows."""
+    if not rows:
+        raise HTTPException(status_code=400, detail="No hymns to import")
+    hymns, errors = [], []
+    for position, row in enumerate(rows, start=1):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Hymn must be an object")
+            hymn = HymnBase.model_validate(row)
+            validate_hymn_content(hymn.content)
+            hymns.append(hymn)
+        except ValidationError as e:
+            errors.append(f"Row {position}: " + "; ".join(error["msg"] for error in e.errors()))
+        except HTTPException as e:
+            errors.append(f"Row {position}: {e.detail}")
+        except ValueError as e:
+            errors.append(f"Row {position}: {e}")
+        if len(errors) >= MAX_REPORTED_ERRORS:
+            break
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+    return hymns
+
+
+async def import_hymns(db: AsyncSession, hymn_book_id: str, hymns: List[HymnBase], user_id: Optional[str]) -> int:
+    """
+    Insert validated hymns into a book in one transaction, with their search documents.
+
+    Rows go in batches of `IMPORT_BATCH_SIZE`: COPY on Postgres, multi-row INSERTs elsewhere.
+    The import is recorded as a single audit entry rather than one per hymn.
+    """
+    result = await db.execute(select(HymnBook).filter(HymnBook.id == hymn_book_id))
+    hymn_book = result.scalars().first()
+    if not hymn_book:
+        raise HTTPException(status_code=404, detail="Hymn book not found")
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "id": generate_uuid(),
+            "hymn_book_id": hymn_book_id,
+            "title": hymn.title,
+            "number": hymn.number,
+            "variant_key": hymn.variant_key,
+            "content": hymn.content,
+            "version": 1,
+            "updated_at": now,
+        }
+        for hymn in hymns
+    ]
+    documents = [{"hymn_id": row["id"], "document": build_search_document(row["title"], row["content"])} for row in rows]
+
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        await _copy_rows(db, rows, documents)
+    else:
+        for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+            # A list of parameter sets is sent as multi-row VALUES ("insertmanyvalues")
+            await db.execute(insert(Hymn), rows[start:start + IMPORT_BATCH_SIZE])
+            await db.execute(insert(HymnSearchDocument), documents[start:start + IMPORT_BATCH_SIZE])
+    imported = [Hymn(**row) for row in rows]
+    await assign_variant_groups(db, imported)
+    await record_changes(db, HYMN, [row["id"] for row in rows])
+    await db.commit()
+
+    register_imported_hymns(imported, hymn_book.title)
+    await log_action(db, user_id, "IMPORT_HYMNS", f"Imported {len(rows)} hymns into book {hymn_book.title}")
+    return len(rows)
+
+
+async def _copy_rows(db: AsyncSession, rows: List[Dict], documents: List[Dict]):
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    # The asyncpg connection under SQLAlchemy's adapter, for its binary COPY support
+    driver_connection = raw_connection.driver_connection
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        batch = rows[start:start + IMPORT_BATCH_SIZE]
+        await driver_connection.copy_records_to_table(
+            Hymn.__tablename__,
+            columns=HYMN_COLUMNS,
+            records=[
+                tuple(json.dumps(row[column]) if column == "content" else row[column] for column in HYMN_COLUMNS)
+                for row in batch
+            ],
+        )
+        await driver_connection.copy_records_to_table(
+            HymnSearchDocument.__tablename__,
+            columns=("hymn_id", "document"),
+            records=[(document["hymn_id"], document["document"]) for document in documents[start:start + IMPORT_BATCH_SIZE]],
+        )
@@ -0,0 +1,390 @@
+# hymnal/services/search_index.py
+import bisect
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_book import HymnBook
+
+# Relative weight of a token occurrence in each indexed field
+TITLE_WEIGHT = 3.0
+CHORUS_WEIGHT = 1.5
+VERSE_WEIGHT = 1.0
+
+# Upper bound on vocabulary terms a trailing prefix may expand to
+MAX_PREFIX_EXPANSIONS = 64
+# Score factor for prefix completions, so exact word hits rank first
+PREFIX_FACTOR = 0.8
+# Multi-word matches up to this many hymns are scored exhaustively rather than by threshold walk
+EXHAUSTIVE_SCORING_LIMIT = 4096
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, strip accents and split text into word tokens."""
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+
+def hymn_text_fields(title: Optional[str], content: Optional[Dict]) -> List[Tuple[str, float]]:
+    """Return the searchable (text, weight) pairs of a hymn: title, chorus and every verse_content."""
+    fields = [(title or "", TITLE_WEIGHT)]
+    content = content or {}
+    chorus = content.get("chorus")
+    if isinstance(chorus, str):
+        fields.append((chorus, CHORUS_WEIGHT))
+    for verse in content.get("verses") or []:
+        if isinstance(verse, dict) and isinstance(verse.get("verse_content"), str):
+            fields.append((verse["verse_content"], VERSE_WEIGHT))
+    return fields
+
+
+class IndexedHymn(NamedTuple):
+    id: str
+    title: str
+    number: int
+    hymn_book_id: str
+    hymn_book_title: str
+    variant_key: Optional[str]
+
+
+class _TokenMatcher:
+    """One query token, resolved to the vocabulary terms it matches (several for a trailing prefix)."""
+
+    def __init__(self, index: "HymnSearchIndex", terms: List[Tuple[str, float]]):
+        self.index = index
+        self.terms = terms
+        self.postings = [(index._postings[term], factor) for term, factor in terms]
+        document_frequency = sum(len(postings) for postings, _ in self.postings)
+        self.idf = math.log(1.0 + len(index._docs) / (1.0 + document_frequency))
+
+    def __len__(self):
+        return sum(len(postings) for postings, _ in self.postings)
+
+    def hymn_ids(self):
+        if len(self.postings) == 1:
+            return self.postings[0][0].keys()
+        return set().union(*(postings.keys() for postings, _ in self.postings))
+
+    def weight(self, hymn_id: str) -> float:
+        if len(self.postings) == 1:
+            postings, factor = self.postings[0]
+            return postings.get(hymn_id, 0.0) * factor
+        return max(postings.get(hymn_id, 0.0) * factor for postings, factor in self.postings)
+
+    def ranked(self) -> Iterator[Tuple[float, int, str]]:
+        """Yield (-weight, number, hymn_id) best first; a hymn matching several terms may repeat."""
+        streams = [
+            ((weight * factor, number, hymn_id) for weight, number, hymn_id in self.index._ranked_postings(term))
+            for term, factor in self.terms
+        ]
+        return heapq.merge(*streams) if len(streams) > 1 else streams[0]
+
+
+class HymnSearchIndex:
+    """
+    Tokenized inverted index over hymn title, chorus and verse_content.
+
+    Postings map a token to the per-hymn weight of that token, so a query is answered
+    from dictionary lookups instead of a table scan. Postings are also kept sorted by
+    weight, which lets ranked queries stop after the first `skip + limit` hits instead
+    of scoring every match (Fagin's threshold algorithm).
+
+    The index lives in process memory; each worker builds its own copy at startup and
+    keeps it current through the write services (see `hymnal/services/hymn.py`).
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self._docs: Dict[str, IndexedHymn] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []  # sorted, for prefix expansion
+        self._by_book: Dict[str, Set[str]] = defaultdict(set)
+        self._by_number: Dict[int, Set[str]] = defaultdict(set)
+        # Lazily (re)built orderings, dropped whenever the underlying set changes
+        self._ranked: Dict[str, List[Tuple[float, int, str]]] = {}
+        self._book_order: Dict[str, List[str]] = {}
+        self._numbers: Optional[List[int]] = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    async def rebuild(self, db: AsyncSession):
+        """Load every hymn from the database and replace the index contents."""
+        result = await db.stream(
+            select(
+                Hymn.id, Hymn.title, Hymn.number, Hymn.hymn_book_id, Hymn.variant_key, Hymn.content,
+                HymnBook.title.label("hymn_book_title"),
+            )
+            .join(HymnBook)
+            .execution_options(yield_per=1000)
+        )
+        fresh = HymnSearchIndex()
+        async for row in result:
+            fresh._add(
+                IndexedHymn(row.id, row.title, row.number, row.hymn_book_id, row.hymn_book_title, row.variant_key),
+                row.content,
+            )
+        fresh._vocabulary = sorted(fresh._postings)
+        self.__dict__.update(fresh.__dict__)
+        self.ready = True
+
+    def add(self, hymn: Hymn, hymn_book_title: str):
+        """Index a new hymn, or re-index an existing one after an update."""
+        self.remove(hymn.id)
+        doc = IndexedHymn(hymn.id, hymn.title, hymn.number, hymn.hymn_book_id, hymn_book_title, hymn.variant_key)
+        for token in self._add(doc, hymn.content):
+            if len(self._postings[token]) == 1:
+                bisect.insort(self._vocabulary, token)
+
+    def remove(self, hymn_id: str):
+        doc = self._docs.pop(hymn_id, None)
+        if doc is None:
+            return
+        self._by_book[doc.hymn_book_id].discard(hymn_id)
+        self._book_order.pop(doc.hymn_book_id, None)
+        self._by_number[doc.number].discard(hymn_id)
+        if not self._by_number[doc.number]:
+            del self._by_number[doc.number]
+            self._numbers = None
+        for token in self._doc_tokens.pop(hymn_id, ()):
+            self._ranked.pop(token, None)
+            postings = self._postings[token]
+            postings.pop(hymn_id, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def remove_book(self, hymn_book_id: str):
+        for hymn_id in list(self._by_book.get(hymn_book_id, ())):
+            self.remove(hymn_id)
+        self._by_book.pop(hymn_book_id, None)
+
+    def _add(self, doc: IndexedHymn, content: Optional[Dict]) -> Set[str]:
+        texts: Dict[float, List[str]] = defaultdict(list)
+        for text, weight in hymn_text_fields(doc.title, content):
+            texts[weight].append(text)
+        weights: Dict[str, float] = defaultdict(float)
+        for weight, parts in texts.items():
+            for token, count in Counter(tokenize("\n".join(parts))).items():
+                weights[token] += count * weight
+        self._docs[doc.id] = doc
+        self._doc_tokens[doc.id] = set(weights)
+        self._by_book[doc.hymn_book_id].add(doc.id)
+        self._book_order.pop(doc.hymn_book_id, None)
+        if doc.number not in self._by_number:
+            self._numbers = None
+        self._by_number[doc.number].add(doc.id)
+        postings = self._postings
+        for token, weight in weights.items():
+            # Dampen repeated occurrences so a long verse cannot drown out a title hit
+            postings[token][doc.id] = 1.0 + math.log(weight)
+        if self._ranked:
+            for token in weights:
+                self._ranked.pop(token, None)
+        return set(weights)
+
+    def _ranked_postings(self, term: str) -> List[Tuple[float, int, str]]:
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            ranked = sorted((-weight, self._docs[hymn_id].number, hymn_id)
+                            for hymn_id, weight in self._postings[term].items())
+            self._ranked[term] = ranked
+        return ranked
+
+    def _book_hymns(self, hymn_book_id: str) -> List[str]:
+        ordered = self._book_order.get(hymn_book_id)
+        if ordered is None:
+            ordered = sorted(self._by_book.get(hymn_book_id, ()), key=lambda hymn_id: (self._docs[hymn_id].number, hymn_id))
+            self._book_order[hymn_book_id] = ordered
+        return ordered
+
+    def _sorted_numbers(self) -> List[int]:
+        if self._numbers is None:
+            self._numbers = sorted(self._by_number)
+        return self._numbers
+
+    def _matcher(self, token: str, prefix: bool) -> Optional[_TokenMatcher]:
+        terms = []
+        if token in self._postings:
+            terms.append((token, 1.0))
+        if prefix:
+            position = bisect.bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[position:position + MAX_PREFIX_EXPANSIONS]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    terms.append((term, PREFIX_FACTOR))
+        return _TokenMatcher(self, terms) if terms else None
+
+    def search(
+        self,
+        query: str,
+        number: Optional[int] = None,
+        hymn_book_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[Tuple[str, int, str]] = None,
+    ) -> List[IndexedHymn]:
+        """
+        Return hymns matching every query token (the last one as a prefix), best match first.
+
+        A purely numeric query also matches hymn numbers containing it, as the SQL search does.
+        Results scoped to a book or matched by number are ordered by hymn number instead.
+        With `after`, a (hymn_book_id, number, id) keyset cursor, results come in that key
+        order starting past the cursor, and `skip` is ignored.
+        """
+        tokens = tokenize(query)
+        matchers = [self._matcher(token, prefix=position == len(tokens) - 1) for position, token in enumerate(tokens)]
+        needle = query.strip() if query.strip().isdigit() else None
+        if None in matchers:
+            if needle is None:
+                return []
+            matchers = []
+        # Check the rarest token first so non-matches are rejected early
+        matchers.sort(key=len)
+        wanted = skip + limit
+
+        def is_match(hymn_id: str) -> bool:
+            if needle is not None and needle in str(self._docs[hymn_id].number):
+                return True
+            return bool(matchers) and all(matcher.weight(hymn_id) for matcher in matchers)
+
+        if after is not None:
+            return self._after(after, limit, is_match, matchers, needle, number, hymn_book_id)
+
+        by_number = hymn_book_id is not None or needle is not None
+        if number is not None:
+            candidates = [
+                hymn_id for hymn_id in self._by_number.get(number, ())
+                if (hymn_book_id is None or self._docs[hymn_id].hymn_book_id == hymn_book_id) and is_match(hymn_id)
+            ]
+            if by_number:
+                candidates.sort()
+            else:
+                candidates.sort(key=lambda hymn_id: (-_score(matchers, hymn_id), hymn_id))
+            ordered: Iterable[str] = candidates
+        elif hymn_book_id is not None:
+            ordered = filter(is_match, self._book_hymns(hymn_book_id))
+        elif needle is not None:
+            ordered = self._numeric_matches(needle, matchers)
+        else:
+            ordered = self._top_ranked(matchers, wanted)
+        return [self._docs[hymn_id] for hymn_id in itertools.islice(ordered, skip, wanted)]
+
+    def _after(self, after, limit, is_match, matchers, needle, number, hymn_book_id) -> List[IndexedHymn]:
+        if number is not None:
+            candidates: Iterable[str] = self._by_number.get(number, ())
+        elif hymn_book_id is not None:
+            candidates = self._by_book.get(hymn_book_id, ())
+        else:
+            candidates = set(matchers[0].hymn_ids()) if matchers else set()
+            if needle is not None:
+                for value in self._sorted_numbers():
+                    if needle in str(value):
+                        candidates.update(self._by_number[value])
+        docs = (self._docs[hymn_id] for hymn_id in candidates)
+        return heapq.nsmallest(
+            limit,
+            (doc for doc in docs
+             if (doc.hymn_book_id, doc.number, doc.id) > after
+             and (hymn_book_id is None or doc.hymn_book_id == hymn_book_id)
+             and is_match(doc.id)),
+            key=lambda doc: (doc.hymn_book_id, doc.number, doc.id),
+        )
+
+    def _numeric_matches(self, needle: str, matchers: List[_TokenMatcher]) -> Iterator[str]:
+        """Hymns whose number contains `needle`, merged with text hits on it, in number order."""
+        def by_number() -> Iterator[Tuple[int, str]]:
+            for number in self._sorted_numbers():
+                if needle in str(number):
+                    for hymn_id in sorted(self._by_number[number]):
+                        yield number, hymn_id
+
+        text_hits = sorted(
+            (self._docs[hymn_id].number, hymn_id)
+            for matcher in matchers for postings, _ in matcher.postings for hymn_id in postings
+        )
+        previous = None
+        for _, hymn_id in heapq.merge(by_number(), text_hits):
+            if hymn_id != previous:
+                previous = hymn_id
+                yield hymn_id
+
+    def _top_ranked(self, matchers: List[_TokenMatcher], wanted: int) -> Iterable[str]:
+        if not matchers or wanted <= 0:
+            return []
+        if len(matchers) == 1:
+            # Ranked postings already are the answer; drop repeats from overlapping prefix terms
+            seen: Set[str] = set()
+            return (hymn_id for _, _, hymn_id in matchers[0].ranked() if not (hymn_id in seen or seen.add(hymn_id)))
+        if len(matchers[0]) <= 2 * EXHAUSTIVE_SCORING_LIMIT:
+            candidates = matchers[0].hymn_ids()
+            for matcher in matchers[1:]:
+                candidates = candidates & matcher.hymn_ids()  # set intersection runs in C
+                if not candidates:
+                    return []
+        else:
+            candidates = None
+        if candidates is not None and len(candidates) <= EXHAUSTIVE_SCORING_LIMIT:
+            return heapq.nsmallest(
+                wanted, candidates, key=lambda hymn_id: (-_score(matchers, hymn_id), self._docs[hymn_id].number, hymn_id)
+            )
+        return self._threshold_walk(matchers, wanted)
+
+    def _threshold_walk(self, matchers: List[_TokenMatcher], wanted: int) -> List[str]:
+        """
+        Threshold algorithm: walk every token's ranked postings in lockstep, scoring each new
+        hymn by random access, and stop once no unseen hymn can beat the current top `wanted`.
+        """
+        streams = [matcher.ranked() for matcher in matchers]
+        frontier = [0.0] * len(matchers)
+        seen: Set[str] = set()
+        top: List[Tuple[float, int, str]] = []  # min-heap on (score, -number, id)
+        while True:
+            for position, stream in enumerate(streams):
+                entry = next(stream, None)
+                if entry is None:
+                    # Every match appears in every token's postings, so nothing unseen can match
+                    return [hymn_id for _, _, hymn_id in sorted(top, key=lambda e: (-e[0], -e[1], e[2]))]
+                weight, number, hymn_id = entry
+                frontier[position] = -weight
+                if hymn_id in seen:
+                    continue
+                seen.add(hymn_id)
+                if not all(matcher.weight(hymn_id) for matcher in matchers):
+                    continue
+                item = (_score(matchers, hymn_id), -number, hymn_id)
+                if len(top) < wanted:
+                    heapq.heappush(top, item)
+                elif item[:2] > top[0][:2]:
+                    heapq.heapreplace(top, item)
+            threshold = sum(bound * matcher.idf for bound, matcher in zip(frontier, matchers))
+            if len(top) == wanted and top[0][0] >= threshold:
+                return [hymn_id for _, _, hymn_id in sorted(top, key=lambda e: (-e[0], -e[1], e[2]))]
+
+
+def _score(matchers: List[_TokenMatcher], hymn_id: str) -> float:
+    return sum(matcher.weight(hymn_id) * matcher.idf for matcher in matchers)
+
+
+hymn_search_index = HymnSearchIndex()
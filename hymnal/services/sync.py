@@ -0,0 +1,95 @@
+# hymnal/services/sync.py
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_book import HymnBook
+from hymnal.models.sync_change import SyncChange
+from hymnal.schemas.hymn import hymn_book_out_dict, hymn_out_dict
+
+HYMN = "hymn"
+HYMN_BOOK = "hymn_book"
+
+# Changes per sync page by default, and at most
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# Ids per IN (...) query, and rows per multi-row INSERT
+BATCH_SIZE = 500
+
+# Postgres advisory lock taken by writers while they number their changes
+SYNC_LOCK_KEY = 0x68796D6E  # "hymn"
+
+
+def _batches(items: List, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def record_changes(db: AsyncSession, entity: str, ids: Iterable[str], deleted: bool = False):
+    """
+    Give rows written in the caller's transaction new change numbers, just before it commits.
+
+    A client resumes from the highest seq it has seen, so seqs must become visible in the
+    order they were handed out. SQLite has one writer at a time anyway; on Postgres writers
+    take a transaction-scoped advisory lock here, held until they commit.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SYNC_LOCK_KEY})
+    for batch in _batches(ids):
+        await db.execute(delete(SyncChange).where(SyncChange.entity == entity, SyncChange.entity_id.in_(batch)))
+        await db.execute(insert(SyncChange), [{"entity": entity, "entity_id": id, "deleted": deleted} for id in batch])
+
+
+async def get_changes(db: AsyncSession, since: int, limit: int = SYNC_PAGE_SIZE) -> Dict:
+    """
+    The hymn books and hymns changed or deleted after change `since`, at most `limit` of them.
+
+    Only each row's latest change is kept, so a client that was away for a month fetches each
+    edited hymn once. From 0 (a first sync) deletes are left out: there is nothing to remove.
+    A row deleted while this page is read shows up in a later page as its tombstone.
+    """
+    query = select(SyncChange.seq, SyncChange.entity, SyncChange.entity_id, SyncChange.deleted).filter(SyncChange.seq > since)
+    if not since:
+        query = query.filter(SyncChange.deleted.is_(False))
+    result = await db.execute(query.order_by(SyncChange.seq).limit(limit + 1))
+    changes = result.all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    changed = {HYMN: [], HYMN_BOOK: []}
+    deleted = {HYMN: [], HYMN_BOOK: []}
+    for change in changes:
+        (deleted if change.deleted else changed)[change.entity].append(change.entity_id)
+
+    hymn_books = []
+    for batch in _batches(changed[HYMN_BOOK]):
+        result = await db.execute(
+            select(HymnBook.id, HymnBook.title, HymnBook.thumbnail_path).filter(HymnBook.id.in_(batch))
+        )
+        hymn_books.extend(hymn_book_out_dict(row.id, row.title, row.thumbnail_path) for row in result)
+    hymns = []
+    for batch in _batches(changed[HYMN]):
+        result = await db.execute(
+            select(Hymn.id, Hymn.hymn_book_id, Hymn.title, Hymn.number, Hymn.variant_key, Hymn.content)
+            .filter(Hymn.id.in_(batch))
+        )
+        hymns.extend(
+            hymn_out_dict(row.id, row.hymn_book_id, row.title, row.number, row.variant_key, row.content) for row in result
+        )
+
+    return {
+        "since": since,
+        "next_since": changes[-1].seq if changes else since,
+        "has_more": has_more,
+        "hymn_books": hymn_books,
+        "hymns": hymns,
+        "deleted_hymn_books": deleted[HYMN_BOOK],
+        "deleted_hymns": deleted[HYMN],
+    }
@@ -0,0 +1,162 @@
+# hymnal/services/trigram_index.py
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_book import HymnBook
+from hymnal.services.search_index import IndexedHymn, tokenize
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# Similarity levels tried before the configured threshold when looking for the top hits
+STRICTER_THRESHOLDS = (0.9, 0.7, 0.5)
+
+
+def trigrams(text: Optional[str]) -> FrozenSet[str]:
+    """
+    Trigrams of text the way pg_trgm builds them: per word, lowercased and padded with
+    two spaces in front and one behind, so "Grace" yields "  g", " gr", "gra", "rac", "ace", "ce ".
+    """
+    grams = set()
+    for word in tokenize(_NON_WORD_RE.sub(" ", text or "")):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """pg_trgm's similarity(): shared trigrams over distinct trigrams of both strings."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TitleTrigramIndex:
+    """
+    In-process trigram index over hymn titles, the pure-Python stand-in for a pg_trgm GIN index.
+
+    Only the rarest trigrams of a query are looked up (prefix filtering): a title reaching
+    the similarity threshold must share at least `ceil(threshold * |query trigrams|)` of them,
+    so it necessarily contains one of the `|query| - that + 1` rarest. Candidates found that
+    way are then scored exactly, which keeps lookups proportional to the rare postings rather
+    than to the number of hymns.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self._docs: Dict[str, IndexedHymn] = {}
+        self._grams: Dict[str, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self._docs)
+
+    async def rebuild(self, db: AsyncSession):
+        result = await db.stream(
+            select(
+                Hymn.id, Hymn.title, Hymn.number, Hymn.hymn_book_id, Hymn.variant_key,
+                HymnBook.title.label("hymn_book_title"),
+            )
+            .join(HymnBook)
+            .execution_options(yield_per=1000)
+        )
+        fresh = TitleTrigramIndex()
+        async for row in result:
+            fresh._add(IndexedHymn(row.id, row.title, row.number, row.hymn_book_id, row.hymn_book_title, row.variant_key))
+        self.__dict__.update(fresh.__dict__)
+        self.ready = True
+
+    def add(self, hymn: Hymn, hymn_book_title: str):
+        self.remove(hymn.id)
+        self._add(IndexedHymn(hymn.id, hymn.title, hymn.number, hymn.hymn_book_id, hymn_book_title, hymn.variant_key))
+
+    def remove(self, hymn_id: str):
+        if self._docs.pop(hymn_id, None) is None:
+            return
+        for gram in self._grams.pop(hymn_id, ()):
+            postings = self._postings[gram]
+            postings.discard(hymn_id)
+            if not postings:
+                del self._postings[gram]
+
+    def remove_book(self, hymn_book_id: str):
+        for hymn_id in [hymn_id for hymn_id, doc in self._docs.items() if doc.hymn_book_id == hymn_book_id]:
+            self.remove(hymn_id)
+
+    def _add(self, doc: IndexedHymn):
+        grams = trigrams(doc.title)
+        self._docs[doc.id] = doc
+        self._grams[doc.id] = grams
+        for gram in grams:
+            self._postings[gram].add(doc.id)
+
+    def search(
+        self,
+        title: str,
+        threshold: float,
+        number: Optional[int] = None,
+        hymn_book_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[Tuple[str, int, str]] = None,
+    ) -> List[Tuple[IndexedHymn, float]]:
+        """
+        Return (hymn, similarity) for titles at least `threshold` similar, most similar first,
+        or in (hymn_book_id, number, id) order past the keyset cursor `after` when given.
+        """
+        query = trigrams(title)
+        if not query:
+            return []
+        wanted = skip + limit
+        rarest = sorted(query, key=lambda gram: len(self._postings.get(gram, ())))
+        if after is not None:
+            scored = [
+                (score, doc) for score, doc in self._scan(query, rarest, threshold, number, hymn_book_id)
+                if (doc.hymn_book_id, doc.number, doc.id) > after
+            ]
+            top = heapq.nsmallest(limit, scored, key=lambda item: (item[1].hymn_book_id, item[1].number, item[1].id))
+            return [(doc, score) for score, doc in top]
+        scored: List[Tuple[float, IndexedHymn]] = []
+        # A stricter threshold needs fewer (and rarer) postings scanned; relax it only while the
+        # page is not full. Each pass is complete for its own threshold, so the top hits are exact.
+        for level in [level for level in STRICTER_THRESHOLDS if level > threshold] + [threshold]:
+            scored = self._scan(query, rarest, level, number, hymn_book_id)
+            if len(scored) >= wanted:
+                break
+        top = heapq.nsmallest(wanted, scored, key=lambda item: (-item[0], item[1].number, item[1].id))
+        return [(doc, score) for score, doc in top[skip:]]
+
+    def _scan(self, query, rarest, threshold, number, hymn_book_id) -> List[Tuple[float, IndexedHymn]]:
+        required = max(1, math.ceil(threshold * len(query)))
+        candidates: Set[str] = set()
+        for gram in rarest[:len(query) - required + 1]:
+            candidates.update(self._postings.get(gram, ()))
+        # Length filter: similarity >= t needs t*|q| <= |title| <= |q|/t
+        shortest, longest = threshold * len(query), len(query) / threshold
+        scored = []
+        for hymn_id in candidates:
+            grams = self._grams[hymn_id]
+            if not shortest <= len(grams) <= longest:
+                continue
+            doc = self._docs[hymn_id]
+            if hymn_book_id is not None and doc.hymn_book_id != hymn_book_id:
+                continue
+            if number is not None and doc.number != number:
+                continue
+            score = similarity(query, grams)
+            if score >= threshold:
+                scored.append((score, doc))
+        return scored
+
+
+title_trigram_index = TitleTrigramIndex()
@@ -0,0 +1,171 @@
+# hymnal/services/variant_groups.py
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_variant_group import HymnVariantGroup
+from hymnal.services.search_index import tokenize
+from hymnal.services.trigram_index import similarity, trigrams
+
+KEY_GROUP_PREFIX = "key:"
+
+# Hymns with the same title are variants when their first lines are at least this similar
+FIRST_LINE_SIMILARITY = 0.5
+
+# Identical first lines group hymns whatever their titles, if long enough not to be a stock phrase
+MIN_SHARED_FIRST_LINE_WORDS = 4
+
+# Hymn ids or keys per IN (...) query, and rows per multi-row INSERT
+BATCH_SIZE = 500
+
+
+def title_key(title: Optional[str]) -> str:
+    return " ".join(tokenize(title))
+
+
+def first_line(content: Optional[Dict]) -> str:
+    """The first non-empty line of the first verse, or of the chorus for hymns without verses."""
+    content = content or {}
+    texts = [verse.get("verse_content") for verse in content.get("verses") or [] if isinstance(verse, dict)]
+    texts.append(content.get("chorus"))
+    for text in texts:
+        if isinstance(text, str):
+            for line in text.splitlines():
+                if line.strip():
+                    return line
+    return ""
+
+
+def first_line_key(content: Optional[Dict]) -> str:
+    return " ".join(tokenize(first_line(content)))
+
+
+def _related(a: Dict, b: Dict) -> bool:
+    if a["first_line_key"] and a["first_line_key"] == b["first_line_key"]:
+        return len(a["first_line_key"].split()) >= MIN_SHARED_FIRST_LINE_WORDS or a["title_key"] == b["title_key"]
+    if not a["title_key"] or a["title_key"] != b["title_key"]:
+        return False
+    if not a["first_line_key"] or not b["first_line_key"]:
+        return True
+    return similarity(trigrams(a["first_line_key"]), trigrams(b["first_line_key"])) >= FIRST_LINE_SIMILARITY
+
+
+class VariantGrouper:
+    """
+    Clusters hymns into variant groups, one hymn at a time.
+
+    Hymns with a `variant_key` form one group per key, as they always have. The others join
+    every group holding a related hymn (same normalized title and a similar first line, or
+    the same long first line), merging those groups when there are several. Groups are
+    tracked union-find style, so adding a hymn only looks at hymns sharing its title or
+    first line, whether in the `members` it starts from or in hymns added before it.
+    """
+
+    def __init__(self, members: Iterable[Dict] = ()):
+        self._merged_into: Dict[str, str] = {}
+        self._by_title: Dict[str, List[Dict]] = defaultdict(list)
+        self._by_first_line: Dict[str, List[Dict]] = defaultdict(list)
+        for member in members:
+            self._remember(member)
+
+    def _remember(self, member: Dict):
+        if member["title_key"]:
+            self._by_title[member["title_key"]].append(member)
+        if member["first_line_key"]:
+            self._by_first_line[member["first_line_key"]].append(member)
+
+    def find(self, group_id: str) -> str:
+        root = group_id
+        while root in self._merged_into:
+            root = self._merged_into[root]
+        while group_id != root:
+            self._merged_into[group_id], group_id = root, self._merged_into[group_id]
+        return root
+
+    def add(self, hymn_id: str, title: Optional[str], variant_key: Optional[str], content: Optional[Dict]) -> Dict:
+        """Group one hymn; returns its hymn_variant_groups row (call `resolve` before writing it)."""
+        if variant_key:
+            return {"hymn_id": hymn_id, "group_id": KEY_GROUP_PREFIX + variant_key, "title_key": None, "first_line_key": None}
+        # A new group gets a label of its own, not the founding hymn's id: re-added after an edit that
+        # leaves its group, the founder would otherwise come back carrying the old members' label
+        member = {
+            "hymn_id": hymn_id, "group_id": str(uuid.uuid4()), "title_key": title_key(title), "first_line_key": first_line_key(content),
+        }
+        candidates = self._by_title.get(member["title_key"], []) + self._by_first_line.get(member["first_line_key"], [])
+        groups = {self.find(candidate["group_id"]) for candidate in candidates if _related(member, candidate)}
+        if groups:
+            member["group_id"] = group = min(groups)
+            for merged in groups - {group}:
+                self._merged_into[merged] = group
+        self._remember(member)
+        return member
+
+    def resolve(self, members: Iterable[Dict]):
+        """Point members at their group as it stands after later merges."""
+        for member in members:
+            member["group_id"] = self.find(member["group_id"])
+
+    def merged_groups(self) -> Dict[str, str]:
+        return {group_id: self.find(group_id) for group_id in list(self._merged_into)}
+
+
+def _batches(items: Sequence, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def assign_variant_groups(db: AsyncSession, hymns: Sequence[Hymn]):
+    """
+    Place new or changed hymns into variant groups, in the caller's transaction.
+
+    Only existing members sharing a normalized title or first line with these hymns are read.
+    Writes that race each other can leave related hymns in separate groups until the next
+    `rebuild_variant_groups`.
+    """
+    hymn_ids = [hymn.id for hymn in hymns]
+    for batch in _batches(hymn_ids):
+        await db.execute(delete(HymnVariantGroup).where(HymnVariantGroup.hymn_id.in_(batch)))
+
+    unkeyed = [hymn for hymn in hymns if not hymn.variant_key]
+    titles = sorted({title_key(hymn.title) for hymn in unkeyed} - {""})
+    first_lines = sorted({first_line_key(hymn.content) for hymn in unkeyed} - {""})
+    existing: Dict[str, Dict] = {}
+    for column, keys in ((HymnVariantGroup.title_key, titles), (HymnVariantGroup.first_line_key, first_lines)):
+        for batch in _batches(keys):
+            result = await db.execute(select(HymnVariantGroup.__table__).where(column.in_(batch)))
+            existing.update((row.hymn_id, dict(row._mapping)) for row in result)
+
+    grouper = VariantGrouper(existing.values())
+    members = [grouper.add(hymn.id, hymn.title, hymn.variant_key, hymn.content) for hymn in hymns]
+    grouper.resolve(members)
+    for merged, group_id in grouper.merged_groups().items():
+        await db.execute(update(HymnVariantGroup).where(HymnVariantGroup.group_id == merged).values(group_id=group_id))
+    for batch in _batches(members):
+        await db.execute(insert(HymnVariantGroup), batch)
+
+
+async def delete_variant_group_member(db: AsyncSession, hymn_id: str):
+    await db.execute(delete(HymnVariantGroup).where(HymnVariantGroup.hymn_id == hymn_id))
+
+
+async def rebuild_variant_groups(db: AsyncSession) -> int:
+    """Recluster every hymn from scratch and replace the table's contents; returns the number of hymns."""
+    grouper = VariantGrouper()
+    members = []
+    result = await db.stream(
+        select(Hymn.id, Hymn.title, Hymn.variant_key, Hymn.content)
+        .order_by(Hymn.id)
+        .execution_options(yield_per=1000)
+    )
+    async for row in result:
+        members.append(grouper.add(row.id, row.title, row.variant_key, row.content))
+    grouper.resolve(members)
+    await db.execute(delete(HymnVariantGroup))
+    for batch in _batches(members):
+        await db.execute(insert(HymnVariantGroup), batch)
+    await db.commit()
+    return len(members)
@@ -1,17 +1,112 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from core.database import Base, engine
+import asyncio
+import logging
+import secrets
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Response
+from core.database import Base, engine, read_engine, AsyncSessionLocal
+from core.media import MEDIA_ROOT, MEDIA_URL_PREFIX, MediaFiles
+from core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, instrumentation_enabled, metrics
+from core.middleware import ReadYourWritesMiddleware, RequestBodyLimitMiddleware
+from core.settings import settings
 from user_management.controller.api.v1 import user
 from hymnal.controllers.api.v1 import hymn
+from hymnal.services.search_index import hymn_search_index
+from hymnal.services.trigram_index import title_trigram_index
+from hymnal.services.variant_groups import rebuild_variant_groups
+from hymnal.services.hymn import hymn_variants_cache
+from hymnal.services.bundles import bundle_builder
+from user_management.services.audit_log import audit_log_writer
+from core.services.auth import auth_versions
+
+logger = logging.getLogger(__name__)
+
+IMAGE_UPLOAD_ROUTES = ("upload_user_image", "upload_hymn_book_thumbnail")
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+async def refresh_search_index():
+    async with AsyncSessionLocal() as db:
+        if settings.SEARCH_INDEX_ENABLED:
+            await hymn_search_index.rebuild(db)
+        if engine.dialect.name != "postgresql":
+            # Postgres answers fuzzy title search from its pg_trgm index instead
+            await title_trigram_index.rebuild(db)
+
+
+async def refresh_search_index_periodically(interval: int):
+    # Picks up hymns written through other workers, whose in-process index we never see
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_search_index()
+        except Exception:
+            logger.exception("Refreshing the search index failed")
+
+
+async def rebuild_variant_groups_periodically(interval: int):
+    # Groups are kept up to date on every write; this repairs what concurrent writes may have split
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await rebuild_variant_groups(db)
+        except Exception:
+            logger.exception("Rebuilding hymn variant groups failed")
+            continue
+        hymn_variants_cache.clear()
+
+
+async def refresh_auth_versions():
+    async with AsyncSessionLocal() as db:
+        await auth_versions.refresh(db)
+
+
+async def refresh_auth_versions_periodically(interval: int):
+    # Revocations written through other workers only reach this one's table this way
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_auth_versions()
+        except Exception:
+            # Stale revocations must not be trusted: tokens take the database path until a refresh succeeds
+            auth_versions.ready = False
+            logger.exception("Refreshing the auth version table failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refreshers = []
+    await refresh_search_index()
+    if settings.SEARCH_INDEX_REFRESH_SECONDS > 0:
+        refreshers.append(asyncio.create_task(refresh_search_index_periodically(settings.SEARCH_INDEX_REFRESH_SECONDS)))
+    if settings.VARIANT_GROUPS_REBUILD_SECONDS > 0:
+        refreshers.append(asyncio.create_task(rebuild_variant_groups_periodically(settings.VARIANT_GROUPS_REBUILD_SECONDS)))
+    if settings.STATELESS_AUTH:
+        await refresh_auth_versions()
+        refreshers.append(asyncio.create_task(refresh_auth_versions_periodically(settings.AUTH_VERSIONS_REFRESH_SECONDS)))
+    if not settings.AUDIT_LOG_SYNC:
+        await audit_log_writer.start()
+    yield
+    for refresher in refreshers:
+        refresher.cancel()
+    # return_exceptions: a refresher that died must not keep the audit log below from draining
+    await asyncio.gather(*refreshers, return_exceptions=True)
+    await bundle_builder.stop()
+    # Drain queued audit entries before the process exits
+    await audit_log_writer.stop()
+
 
 app = FastAPI(
     title="Hymnal API",
     description="A FastAPI-based API for managing hymn books and hymns, with admin user management and search functionality.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Serve media files
-app.mount("/media", StaticFiles(directory="media"), name="media")
+app.mount(MEDIA_URL_PREFIX, MediaFiles(directory=MEDIA_ROOT), name="media")
 
 
 
@@ -19,6 +114,37 @@ app.mount("/media", StaticFiles(directory="media"), name="media")
 app.include_router(user.router)
 app.include_router(hymn.router)
 
+# Image uploads: MEDIA_MAX_UPLOAD_BYTES of file plus room for the multipart framing around it
+app.add_middleware(
+    RequestBodyLimitMiddleware,
+    max_bytes=settings.MEDIA_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    routes=[route for route in app.routes if getattr(route, "name", None) in IMAGE_UPLOAD_ROUTES],
+)
+
+if read_engine is not engine:
+    app.add_middleware(
+        ReadYourWritesMiddleware,
+        max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+        read_only_paths=[app.url_path_for("read_hymns_batch")],
+    )
+
+if instrumentation_enabled():
+    # Outermost, so its latency covers every other middleware
+    app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics(authorization: Optional[str] = Header(None)):
+        # Route traffic, query timings and pool state are not for anyone who can reach the port
+        if settings.METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        # async: rendered on the event loop thread, which is the only one updating the counters
+        pools = {"primary": engine.pool}
+        if read_engine is not engine:
+            pools["replica"] = read_engine.pool
+        return Response(metrics.render(pools), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Hymnal API"}
\ No newline at end of file
+    return {"message": "Welcome to the Hymnal API"}
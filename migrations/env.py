@@ -10,7 +10,7 @@ from core.database import engine
 
 # Import models so Alembic can detect schema
 from user_management.models import user, role, permission, audit_log
-from hymnal.models import hymn, hymn_book
+from hymnal.models import hymn, hymn_book, hymn_search_document, hymn_variant_group, sync_change
 
 # Alembic config
 config = context.config
@@ -33,18 +33,21 @@ def run_migrations_offline():
 
 async def run_migrations_online():
     """Run migrations in 'online' mode using async engine."""
-    async with engine.begin() as conn:
-
-        def do_migrations(sync_conn):
-            context.configure(
-                connection=sync_conn,
-                target_metadata=target_metadata,
-                compare_type=True,
-            )
-            with context.begin_transaction():
-                context.run_migrations()
-
-        await conn.run_sync(do_migrations)
+    def do_migrations(sync_conn):
+        context.configure(
+            connection=sync_conn,
+            target_metadata=target_metadata,
+            compare_type=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(do_migrations)
+    finally:
+        # Release pooled connections, failed run or not, or aiosqlite's worker thread keeps the process alive
+        await engine.dispose()
 
 
 def run():
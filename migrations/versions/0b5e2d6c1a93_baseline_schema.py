@@ -0,0 +1,142 @@
+"""baseline schema
+
+Revision ID: 0b5e2d6c1a93
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+The users, roles, permissions, audit log, hymn book and hymn tables as they
+were before the first migration. A database that already has them, created
+before migrations were kept, is left as it is: upgrading it only records this
+revision, as `alembic stamp 0b5e2d6c1a93` would.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b5e2d6c1a93'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["users", "roles", "permissions", "role_permissions", "user_roles", "audit_logs", "hymn_books", "hymns"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if existing.issuperset(TABLES):
+        return
+    if existing.intersection(TABLES):
+        raise RuntimeError(
+            f"Only some of the baseline tables exist ({', '.join(sorted(existing.intersection(TABLES)))}); "
+            "create the rest by hand or start from an empty database"
+        )
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("other_name", sa.String(), nullable=True),
+        sa.Column("image_path", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.Column("is_super_user", sa.Boolean(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("totp_secret", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "roles",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_roles_id", "roles", ["id"])
+    op.create_index("ix_roles_name", "roles", ["name"], unique=True)
+
+    op.create_table(
+        "permissions",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_permissions_id", "permissions", ["id"])
+    op.create_index("ix_permissions_name", "permissions", ["name"], unique=True)
+
+    op.create_table(
+        "role_permissions",
+        sa.Column("role_id", sa.String(), nullable=False),
+        sa.Column("permission_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["permission_id"], ["permissions.id"]),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+        sa.PrimaryKeyConstraint("role_id", "permission_id"),
+    )
+
+    op.create_table(
+        "user_roles",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("role_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "role_id"),
+    )
+
+    op.create_table(
+        "audit_logs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=True),
+        sa.Column("action", sa.String(), nullable=True),
+        sa.Column("details", sa.String(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_audit_logs_id", "audit_logs", ["id"])
+
+    op.create_table(
+        "hymn_books",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("thumbnail_path", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_hymn_books_id", "hymn_books", ["id"])
+    op.create_index("ix_hymn_books_title", "hymn_books", ["title"])
+
+    op.create_table(
+        "hymns",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("hymn_book_id", sa.String(), nullable=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("number", sa.Integer(), nullable=True),
+        sa.Column("variant_key", sa.String(), nullable=True),
+        sa.Column("content", sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(["hymn_book_id"], ["hymn_books.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_hymns_id", "hymns", ["id"])
+    op.create_index("ix_hymns_title", "hymns", ["title"])
+    op.create_index("ix_hymns_number", "hymns", ["number"])
+    op.create_index("ix_hymns_variant_key", "hymns", ["variant_key"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_table(table)
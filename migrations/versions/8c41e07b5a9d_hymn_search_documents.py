@@ -0,0 +1,105 @@
+"""hymn search documents with native full-text index
+
+Revision ID: 8c41e07b5a9d
+Revises: 3f9a2c1d7b4e
+Create Date: 2026-10-17 11:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e07b5a9d'
+down_revision: Union[str, Sequence[str], None] = '3f9a2c1d7b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+SQLITE_FTS = [
+    # External-content FTS5 table over hymn_search_documents, accent-insensitive like the in-process index
+    """
+    CREATE VIRTUAL TABLE hymn_search_fts USING fts5(
+        document, content='hymn_search_documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER hymn_search_documents_ai AFTER INSERT ON hymn_search_documents BEGIN
+        INSERT INTO hymn_search_fts(rowid, document) VALUES (new.id, new.document);
+    END
+    """,
+    """
+    CREATE TRIGGER hymn_search_documents_ad AFTER DELETE ON hymn_search_documents BEGIN
+        INSERT INTO hymn_search_fts(hymn_search_fts, rowid, document) VALUES ('delete', old.id, old.document);
+    END
+    """,
+    """
+    CREATE TRIGGER hymn_search_documents_au AFTER UPDATE ON hymn_search_documents BEGIN
+        INSERT INTO hymn_search_fts(hymn_search_fts, rowid, document) VALUES ('delete', old.id, old.document);
+        INSERT INTO hymn_search_fts(rowid, document) VALUES (new.id, new.document);
+    END
+    """,
+]
+
+
+# Frozen copies of the application code this revision ran with, so it keeps writing what it did then
+def hymn_text_fields(title, content):
+    fields = [title or ""]
+    content = content or {}
+    if isinstance(content.get("chorus"), str):
+        fields.append(content["chorus"])
+    for verse in content.get("verses") or []:
+        if isinstance(verse, dict) and isinstance(verse.get("verse_content"), str):
+            fields.append(verse["verse_content"])
+    return fields
+
+
+def build_search_document(title, content):
+    return "\n".join(text for text in hymn_text_fields(title, content) if text)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "hymn_search_documents",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("hymn_id", sa.String(), sa.ForeignKey("hymns.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("document", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_hymn_search_documents_hymn_id", "hymn_search_documents", ["hymn_id"], unique=True)
+
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "CREATE INDEX ix_hymn_search_documents_tsv ON hymn_search_documents "
+            "USING gin (to_tsvector('simple'::regconfig, document))"
+        )
+    elif bind.dialect.name == "sqlite":
+        for statement in SQLITE_FTS:
+            op.execute(statement)
+
+    # Backfill from existing hymns; the SQLite triggers populate the FTS table as rows go in
+    hymns = sa.table("hymns", sa.column("id"), sa.column("title"), sa.column("content", sa.JSON))
+    documents = sa.table("hymn_search_documents", sa.column("hymn_id"), sa.column("document"))
+    batch = []
+    for row in bind.execute(sa.select(hymns.c.id, hymns.c.title, hymns.c.content)):
+        batch.append({"hymn_id": row.id, "document": build_search_document(row.title, row.content)})
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            bind.execute(documents.insert(), batch)
+            batch = []
+    if batch:
+        bind.execute(documents.insert(), batch)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        for trigger in ("hymn_search_documents_ai", "hymn_search_documents_ad", "hymn_search_documents_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS hymn_search_fts")
+    op.drop_index("ix_hymn_search_documents_hymn_id", table_name="hymn_search_documents")
+    op.drop_table("hymn_search_documents")
@@ -0,0 +1,29 @@
+"""user auth version
+
+Revision ID: a1f6d83b29c5
+Revises: e5a8c3f20d17
+Create Date: 2026-10-17 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f6d83b29c5'
+down_revision: Union[str, Sequence[str], None] = 'e5a8c3f20d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("auth_version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("auth_version")
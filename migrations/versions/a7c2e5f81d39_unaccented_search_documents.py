@@ -0,0 +1,76 @@
+"""store hymn search documents without accents
+
+Revision ID: a7c2e5f81d39
+Revises: f1b3c7d92a48
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c2e5f81d39'
+down_revision: Union[str, Sequence[str], None] = 'f1b3c7d92a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Frozen copies of the application code this revision ran with, so it keeps writing what it did then
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(text)
+
+
+def hymn_text_fields(title, content):
+    fields = [title or ""]
+    content = content or {}
+    if isinstance(content.get("chorus"), str):
+        fields.append(content["chorus"])
+    for verse in content.get("verses") or []:
+        if isinstance(verse, dict) and isinstance(verse.get("verse_content"), str):
+            fields.append(verse["verse_content"])
+    return fields
+
+
+def build_search_document(title, content):
+    return "\n".join(" ".join(tokenize(text)) for text in hymn_text_fields(title, content) if text)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Queries are tokenized without accents; documents stored as written never matched accented
+    # words on Postgres. The SQLite triggers refresh the FTS table as documents are rewritten.
+    bind = op.get_bind()
+    hymns = sa.table("hymns", sa.column("id"), sa.column("title"), sa.column("content", sa.JSON))
+    documents = sa.table("hymn_search_documents", sa.column("hymn_id"), sa.column("document"))
+    rewrite = (
+        documents.update()
+        .where(documents.c.hymn_id == sa.bindparam("b_hymn_id"))
+        .values(document=sa.bindparam("b_document"))
+    )
+    rows = bind.execute(sa.select(hymns.c.id, hymns.c.title, hymns.c.content)).all()
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        bind.execute(rewrite, [
+            {"b_hymn_id": row.id, "b_document": build_search_document(row.title, row.content)}
+            for row in rows[start:start + BACKFILL_BATCH_SIZE]
+        ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Unaccented documents still match everything the previous code searched for
+    pass
@@ -0,0 +1,28 @@
+"""hymn keyset pagination index
+
+Revision ID: b7d2e94f1c36
+Revises: 8c41e07b5a9d
+Create Date: 2026-10-17 11:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e94f1c36'
+down_revision: Union[str, Sequence[str], None] = '8c41e07b5a9d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_hymns_book_number_id", "hymns", ["hymn_book_id", "number", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_hymns_book_number_id", table_name="hymns")
@@ -0,0 +1,149 @@
+"""precomputed hymn variant groups
+
+Revision ID: c92e5d4a7f18
+Revises: a1f6d83b29c5
+Create Date: 2026-10-17 16:10:00.000000
+
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c92e5d4a7f18'
+down_revision: Union[str, Sequence[str], None] = 'a1f6d83b29c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of the grouping the application did when this revision was written, so the
+# backfill keeps producing the same groups whatever later becomes of that code
+KEY_GROUP_PREFIX = "key:"
+FIRST_LINE_SIMILARITY = 0.5
+MIN_SHARED_FIRST_LINE_WORDS = 4
+BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(text)
+
+
+def trigrams(text):
+    grams = set()
+    for word in tokenize(NON_WORD_RE.sub(" ", text or "")):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def first_line(content):
+    content = content or {}
+    texts = [verse.get("verse_content") for verse in content.get("verses") or [] if isinstance(verse, dict)]
+    texts.append(content.get("chorus"))
+    for text in texts:
+        if isinstance(text, str):
+            for line in text.splitlines():
+                if line.strip():
+                    return line
+    return ""
+
+
+def related(a, b):
+    if a["first_line_key"] and a["first_line_key"] == b["first_line_key"]:
+        return len(a["first_line_key"].split()) >= MIN_SHARED_FIRST_LINE_WORDS or a["title_key"] == b["title_key"]
+    if not a["title_key"] or a["title_key"] != b["title_key"]:
+        return False
+    if not a["first_line_key"] or not b["first_line_key"]:
+        return True
+    return similarity(trigrams(a["first_line_key"]), trigrams(b["first_line_key"])) >= FIRST_LINE_SIMILARITY
+
+
+def group_hymns(rows):
+    """One hymn_variant_groups row per hymn, groups merged union-find style and labelled with a member's id."""
+    merged_into = {}
+    by_title = defaultdict(list)
+    by_first_line = defaultdict(list)
+
+    def find(group_id):
+        while group_id in merged_into:
+            group_id = merged_into[group_id]
+        return group_id
+
+    members = []
+    for row in rows:
+        if row.variant_key:
+            members.append({"hymn_id": row.id, "group_id": KEY_GROUP_PREFIX + row.variant_key, "title_key": None, "first_line_key": None})
+            continue
+        member = {
+            "hymn_id": row.id,
+            "group_id": row.id,
+            "title_key": " ".join(tokenize(row.title)),
+            "first_line_key": " ".join(tokenize(first_line(row.content))),
+        }
+        candidates = by_title.get(member["title_key"], []) + by_first_line.get(member["first_line_key"], [])
+        groups = {find(candidate["group_id"]) for candidate in candidates if related(member, candidate)}
+        if groups:
+            member["group_id"] = group = min(groups)
+            for merged in groups - {group}:
+                merged_into[merged] = group
+        if member["title_key"]:
+            by_title[member["title_key"]].append(member)
+        if member["first_line_key"]:
+            by_first_line[member["first_line_key"]].append(member)
+        members.append(member)
+    for member in members:
+        member["group_id"] = find(member["group_id"])
+    return members
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "hymn_variant_groups",
+        sa.Column("hymn_id", sa.String(), sa.ForeignKey("hymns.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("group_id", sa.String(), nullable=False),
+        sa.Column("title_key", sa.String(), nullable=True),
+        sa.Column("first_line_key", sa.String(), nullable=True),
+    )
+    op.create_index("ix_hymn_variant_groups_group_id", "hymn_variant_groups", ["group_id"])
+    op.create_index("ix_hymn_variant_groups_title_key", "hymn_variant_groups", ["title_key"])
+    op.create_index("ix_hymn_variant_groups_first_line_key", "hymn_variant_groups", ["first_line_key"])
+
+    # Backfill: cluster the existing hymns in one pass
+    bind = op.get_bind()
+    hymns = sa.table("hymns", sa.column("id"), sa.column("title"), sa.column("variant_key"), sa.column("content", sa.JSON))
+    groups = sa.table(
+        "hymn_variant_groups", sa.column("hymn_id"), sa.column("group_id"), sa.column("title_key"), sa.column("first_line_key")
+    )
+    members = group_hymns(
+        bind.execute(sa.select(hymns.c.id, hymns.c.title, hymns.c.variant_key, hymns.c.content).order_by(hymns.c.id))
+    )
+    for start in range(0, len(members), BATCH_SIZE):
+        bind.execute(groups.insert(), members[start:start + BATCH_SIZE])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_hymn_variant_groups_first_line_key", table_name="hymn_variant_groups")
+    op.drop_index("ix_hymn_variant_groups_title_key", table_name="hymn_variant_groups")
+    op.drop_index("ix_hymn_variant_groups_group_id", table_name="hymn_variant_groups")
+    op.drop_table("hymn_variant_groups")
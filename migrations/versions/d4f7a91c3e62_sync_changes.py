@@ -0,0 +1,46 @@
+"""change log for incremental sync
+
+Revision ID: d4f7a91c3e62
+Revises: c92e5d4a7f18
+Create Date: 2026-10-17 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7a91c3e62'
+down_revision: Union[str, Sequence[str], None] = 'c92e5d4a7f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "sync_changes",
+        sa.Column("seq", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("entity", sa.String(), nullable=False),
+        sa.Column("entity_id", sa.String(), nullable=False),
+        sa.Column("deleted", sa.Boolean(), nullable=False, server_default="0"),
+        sa.UniqueConstraint("entity", "entity_id", name="uq_sync_changes_entity"),
+        sqlite_autoincrement=True,
+    )
+
+    # Backfill: every existing book, then every hymn, as changed, so a first sync returns them all
+    op.execute(
+        "INSERT INTO sync_changes (entity, entity_id, deleted) "
+        "SELECT 'hymn_book', id, false FROM hymn_books ORDER BY id"
+    )
+    op.execute(
+        "INSERT INTO sync_changes (entity, entity_id, deleted) "
+        "SELECT 'hymn', id, false FROM hymns ORDER BY hymn_book_id, number, id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("sync_changes")
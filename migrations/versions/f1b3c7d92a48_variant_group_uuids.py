@@ -0,0 +1,40 @@
+"""label hymn variant groups with uuids instead of a member's hymn id
+
+Revision ID: f1b3c7d92a48
+Revises: d4f7a91c3e62
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b3c7d92a48'
+down_revision: Union[str, Sequence[str], None] = 'd4f7a91c3e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Label prefix of groups formed by a shared variant_key, as the application wrote them at this revision
+KEY_GROUP_PREFIX = "key:"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A group labelled with its founder's id kept that label when the founder was edited out of it
+    bind = op.get_bind()
+    groups = sa.table("hymn_variant_groups", sa.column("group_id"))
+    labels = bind.execute(
+        sa.select(groups.c.group_id).distinct().where(groups.c.group_id.notlike(KEY_GROUP_PREFIX + "%"))
+    ).scalars().all()
+    for label in labels:
+        bind.execute(groups.update().where(groups.c.group_id == label).values(group_id=str(uuid.uuid4())))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # uuid labels work as they are with the previous code
+    pass
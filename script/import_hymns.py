@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+# Adjust path if script is run from root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.database import AsyncSessionLocal, engine
+from hymnal.models.hymn_book import HymnBook
+from hymnal.services.hymn_import import IMPORT_FORMATS, detect_import_format, import_hymns, parse_hymn_rows, validate_hymn_rows
+from user_management.models.user import User
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk import a hymn book's hymns from NDJSON, JSON or CSV.")
+    parser.add_argument("path", help="File to import")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--hymn-book-id", help="Import into this existing hymn book")
+    target.add_argument("--new-book", metavar="TITLE", help="Create a hymn book with this title and import into it")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--username", help="User the audit log entry is recorded for")
+    return parser.parse_args()
+
+
+async def import_file(args):
+    format = args.format or detect_import_format(args.path)
+    if not format:
+        print(f"❌ Cannot tell the format of {args.path}; pass --format.")
+        return 1
+    with open(args.path, "rb") as f:
+        data = f.read()
+
+    started = time.perf_counter()
+    try:
+        hymns = validate_hymn_rows(parse_hymn_rows(data, format))
+        async with AsyncSessionLocal() as db:
+            user_id = None
+            if args.username:
+                result = await db.execute(select(User).filter(User.username == args.username))
+                user = result.scalars().first()
+                if not user:
+                    print(f"❌ User '{args.username}' not found.")
+                    return 1
+                user_id = user.id
+            hymn_book_id = args.hymn_book_id
+            if args.new_book:
+                hymn_book = HymnBook(title=args.new_book)
+                db.add(hymn_book)
+                await db.flush()
+                hymn_book_id = hymn_book.id
+            imported = await import_hymns(db, hymn_book_id, hymns, user_id)
+    except HTTPException as e:
+        details = e.detail if isinstance(e.detail, list) else [e.detail]
+        print("❌ Import failed:\n" + "\n".join(f"  {detail}" for detail in details))
+        return 1
+    finally:
+        # Close pooled connections, or aiosqlite's worker thread keeps the process alive
+        await engine.dispose()
+
+    print(f"✅ Imported {imported} hymns into book {hymn_book_id} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(import_file(parse_args())))
+    except KeyboardInterrupt:
+        print("\nCancelled.")
@@ -0,0 +1,26 @@
+import asyncio
+import os
+import sys
+import time
+
+# Adjust path if script is run from root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.database import AsyncSessionLocal, engine
+from hymnal.services.variant_groups import rebuild_variant_groups
+
+
+async def rebuild():
+    """Recluster all hymn variant groups, e.g. nightly from cron when running several workers."""
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            grouped = await rebuild_variant_groups(db)
+    finally:
+        # Close pooled connections, or aiosqlite's worker thread keeps the process alive
+        await engine.dispose()
+    print(f"✅ Grouped {grouped} hymns in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
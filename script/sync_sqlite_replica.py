@@ -0,0 +1,56 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from sqlalchemy.engine import make_url
+
+# Adjust path if script is run from root
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.settings import settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Copy the SQLite primary (DATABASE_URL) onto the SQLite replica (READ_DATABASE_URL), "
+                    "to try out read-replica routing locally. Repeat with --every to simulate replication lag."
+    )
+    parser.add_argument("--every", type=float, metavar="SECONDS", help="Keep copying at this interval")
+    return parser.parse_args()
+
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        sys.exit(f"Not a file-based SQLite URL: {url}")
+    return parsed.database
+
+
+def sync(primary: str, replica: str):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        # The backup API copies a consistent snapshot even while the app is writing
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    args = parse_args()
+    if not settings.READ_DATABASE_URL:
+        sys.exit("READ_DATABASE_URL is not set")
+    primary, replica = sqlite_path(settings.DATABASE_URL), sqlite_path(settings.READ_DATABASE_URL)
+    while True:
+        sync(primary, replica)
+        print(f"Copied {primary} to {replica}")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.models.base import Base
+from hymnal.models import hymn, hymn_book, hymn_search_document, hymn_variant_group, sync_change
+from hymnal.schemas.hymn import HymnBookCreate, HymnCreate, HymnUpdate
+from hymnal.services.hymn import create_hymn, create_hymn_book, delete_hymn, delete_hymn_book, update_hymn
+from hymnal.services.sync import get_changes
+from user_management.models import audit_log, permission, role, user
+
+USER_ID = "admin"
+
+
+def _hymn(hymn_book_id, number, title=None):
+    return HymnCreate(
+        hymn_book_id=hymn_book_id,
+        title=title or f"Hymn {number}",
+        number=number,
+        content={"verses": [{"verse_tag": "v1", "verse_name": "Verse 1", "verse_content": f"Line of hymn {number}"}]},
+    )
+
+
+async def _run(path, scenario):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        # One session per call, as each request gets its own
+        return await scenario(async_sessionmaker(engine, expire_on_commit=False))
+    finally:
+        await engine.dispose()
+
+
+async def _changes(sessions, since, limit=500):
+    async with sessions() as db:
+        return await get_changes(db, since, limit)
+
+
+async def _create_update_delete(sessions):
+    async with sessions() as db:
+        book = await create_hymn_book(db, HymnBookCreate(title="Book"), USER_ID)
+    async with sessions() as db:
+        kept = await create_hymn(db, _hymn(book.id, 1), USER_ID)
+    async with sessions() as db:
+        removed = await create_hymn(db, _hymn(book.id, 2), USER_ID)
+    created = await _changes(sessions, 0)
+
+    for title in ("Edited once", "Edited twice"):
+        async with sessions() as db:
+            await update_hymn(db, kept.id, HymnUpdate(**_hymn(book.id, 1, title).dict(exclude={"hymn_book_id"})), USER_ID)
+    async with sessions() as db:
+        await delete_hymn(db, removed.id, USER_ID)
+
+    return book.id, kept.id, removed.id, created, await _changes(sessions, created["next_since"]), await _changes(sessions, 0)
+
+
+def test_create_update_delete(tmp_path):
+    book_id, kept_id, removed_id, created, since_created, from_scratch = asyncio.run(
+        _run(tmp_path / "sync.db", _create_update_delete)
+    )
+
+    assert [b["id"] for b in created["hymn_books"]] == [book_id]
+    assert sorted(h["id"] for h in created["hymns"]) == sorted([kept_id, removed_id])
+    assert not created["has_more"]
+
+    # Two edits, one entry with the latest content; the deleted hymn as a tombstone only
+    assert [(h["id"], h["title"]) for h in since_created["hymns"]] == [(kept_id, "Edited twice")]
+    assert since_created["deleted_hymns"] == [removed_id]
+    assert since_created["next_since"] > created["next_since"]
+
+    # A first sync has nothing to remove, so it gets no tombstones
+    assert [h["id"] for h in from_scratch["hymns"]] == [kept_id]
+    assert from_scratch["deleted_hymns"] == []
+    assert from_scratch["deleted_hymn_books"] == []
+
+
+async def _page_through(sessions):
+    async with sessions() as db:
+        book = await create_hymn_book(db, HymnBookCreate(title="Book"), USER_ID)
+    for number in range(1, 6):
+        async with sessions() as db:
+            await create_hymn(db, _hymn(book.id, number), USER_ID)
+
+    pages, since = [], 0
+    while True:
+        page = await _changes(sessions, since, limit=2)
+        pages.append(page)
+        since = page["next_since"]
+        if not page["has_more"]:
+            break
+    return pages, await _changes(sessions, since, limit=2)
+
+
+def test_paging(tmp_path):
+    pages, after_last = asyncio.run(_run(tmp_path / "sync.db", _page_through))
+
+    assert [len(page["hymn_books"]) + len(page["hymns"]) for page in pages] == [2, 2, 2]
+    assert [page["has_more"] for page in pages] == [True, True, False]
+    numbers = [h["number"] for page in pages for h in page["hymns"]]
+    assert sorted(numbers) == [1, 2, 3, 4, 5]
+    seqs = [page["next_since"] for page in pages]
+    assert seqs == sorted(set(seqs))
+
+    assert after_last["hymns"] == [] and after_last["hymn_books"] == []
+    assert not after_last["has_more"]
+    assert after_last["next_since"] == pages[-1]["next_since"]
+
+
+async def _delete_book(sessions):
+    async with sessions() as db:
+        book = await create_hymn_book(db, HymnBookCreate(title="Book"), USER_ID)
+    hymn_ids = []
+    for number in range(1, 4):
+        async with sessions() as db:
+            hymn_ids.append((await create_hymn(db, _hymn(book.id, number), USER_ID)).id)
+    before = await _changes(sessions, 0)
+
+    async with sessions() as db:
+        await delete_hymn_book(db, book.id, USER_ID)
+    return book.id, hymn_ids, await _changes(sessions, before["next_since"]), await _changes(sessions, 0)
+
+
+def test_deleting_a_book_keeps_its_hymns_in_sync(tmp_path):
+    book_id, hymn_ids, since_before, from_scratch = asyncio.run(_run(tmp_path / "sync.db", _delete_book))
+
+    assert since_before["deleted_hymn_books"] == [book_id]
+    assert since_before["hymn_books"] == []
+    # The book's hymns stay, without a book, and clients must learn that
+    assert sorted(h["id"] for h in since_before["hymns"]) == sorted(hymn_ids)
+    assert all(h["hymn_book_id"] is None for h in since_before["hymns"])
+    assert since_before["deleted_hymns"] == []
+
+    assert from_scratch["hymn_books"] == [] and from_scratch["deleted_hymn_books"] == []
+    assert sorted(h["id"] for h in from_scratch["hymns"]) == sorted(hymn_ids)
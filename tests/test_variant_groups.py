@@ -0,0 +1,68 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.models.base import Base
+from hymnal.models.hymn import Hymn
+from hymnal.models.hymn_book import HymnBook
+from hymnal.models.hymn_variant_group import HymnVariantGroup
+from hymnal.services.variant_groups import assign_variant_groups
+
+
+def _content(first_line):
+    return {"verses": [{"verse_tag": "v1", "verse_name": "Verse 1", "verse_content": first_line}]}
+
+
+async def _groups(db):
+    result = await db.execute(select(HymnVariantGroup.hymn_id, HymnVariantGroup.group_id))
+    return dict(result.all())
+
+
+async def _edit_founding_hymn(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[HymnBook.__table__, Hymn.__table__, HymnVariantGroup.__table__]
+            )
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            db.add(HymnBook(id="book", title="Book"))
+            founder = Hymn(id="a", hymn_book_id="book", title="Amazing Grace", number=1,
+                           content=_content("Amazing grace how sweet the sound"))
+            variant = Hymn(id="b", hymn_book_id="book", title="Amazing Grace", number=2,
+                           content=_content("Amazing grace how sweet the sound that saved"))
+            db.add_all([founder, variant])
+            await db.flush()
+            await assign_variant_groups(db, [founder])
+            await assign_variant_groups(db, [variant])
+            await db.commit()
+            before = await _groups(db)
+
+            # As update_hymn does: the founder is edited so it no longer matches its group
+            founder.title = "Completely Different"
+            founder.content = _content("Nothing like the other hymn at all")
+            await assign_variant_groups(db, [founder])
+            await db.commit()
+            after_edit = await _groups(db)
+
+            newcomer = Hymn(id="c", hymn_book_id="book", title="Completely Different", number=3,
+                            content=_content("Nothing like the other hymn at all"))
+            db.add(newcomer)
+            await db.flush()
+            await assign_variant_groups(db, [newcomer])
+            await db.commit()
+            return before, after_edit, await _groups(db)
+    finally:
+        await engine.dispose()
+
+
+def test_editing_the_founding_hymn_out_of_its_group(tmp_path):
+    before, after_edit, after_join = asyncio.run(_edit_founding_hymn(tmp_path / "groups.db"))
+
+    assert before["a"] == before["b"]
+    assert after_edit["a"] != after_edit["b"]
+    assert after_edit["b"] == before["b"]
+    # A hymn joining the founder's new title must not pull its former variant along
+    assert after_join["c"] == after_join["a"]
+    assert after_join["b"] != after_join["a"]
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
+from typing import Any, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
 from user_management.schemas.user import UserCreate, UserUpdate, UserOut, Token
 from user_management.services.user import (
@@ -8,9 +9,11 @@ from user_management.services.user import (
     assign_permission_to_role, create_role, create_permission
 )
 from core.dependencies import get_db, check_permission
-from core.services.auth import create_access_token, verify_password, get_current_user
+from core.database import engine, read_engine, pool_stats
+from core.tracing import TracedRoute
+from core.services.auth import create_user_access_token, verify_password_async, get_current_user, password_hash_pool
 
-router = APIRouter(prefix="/api/v1/user_management", tags=["User Management"])
+router = APIRouter(prefix="/api/v1/user_management", tags=["User Management"], route_class=TracedRoute)
 
 @router.post(
     "/register",
@@ -50,7 +53,7 @@ async def login_for_access_token(
     db: AsyncSession = Depends(get_db)
 ):
     user = await get_user_by_username(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -59,7 +62,7 @@ async def login_for_access_token(
     if user.totp_secret:
         # TODO: Enforce 2FA verification in production
         pass
-    access_token = create_access_token(data={"sub": user.username, "is_super_user": user.is_super_user})
+    access_token = await create_user_access_token(db, user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post(
@@ -131,7 +134,8 @@ async def update_user_endpoint(
     description="""
     Upload a profile image for a user.
 - **user_id**: The ID of the user.
-- **image**: The image file (must be JPEG or PNG).
+- **image**: The image file (JPEG, PNG or WebP), at most `MEDIA_MAX_UPLOAD_BYTES`.
+- Stores resized renditions, listed in `image_renditions`, next to the original.
 - Requires authentication and `update_user` permission.
     """,
     response_description="Confirmation of successful image upload",
@@ -248,4 +252,41 @@ async def assign_permission(
     current_user: UserOut = Depends(check_permission("assign_permission"))
 ):
     await assign_permission_to_role(db, role_id, permission_id, current_user.id)
-    return {"detail": "Permission assigned"}
\ No newline at end of file
+    return {"detail": "Permission assigned"}
+
+@router.get(
+    "/password_hashing/stats",
+    response_model=Dict[str, int],
+    summary="Get password hashing pool statistics",
+    description="""
+    Concurrency and queue depth of the thread pool that runs bcrypt for logins and user creation.
+- `queued` waiting calls beyond `PASSWORD_HASH_MAX_QUEUED` are refused with 503 and counted in `rejected`.
+- Requires authentication and `view_auth_stats` permission.
+    """,
+    response_description="Pool counters",
+)
+async def get_password_hashing_stats(
+    current_user: UserOut = Depends(check_permission("view_auth_stats"))
+):
+    return password_hash_pool.stats()
+
+@router.get(
+    "/database/pool_stats",
+    response_model=Dict[str, Any],
+    summary="Get database connection pool statistics",
+    description="""
+    Occupancy of this worker's database connection pool and the time requests waited for a connection.
+- `checked_out` near `size` + `DB_MAX_OVERFLOW`, or a growing `wait_ms_max`, means the pool is undersized for the load.
+- `timeouts` counts requests that gave up after `DB_POOL_TIMEOUT`.
+- With a read replica configured, its pool is reported under `replica`.
+- Requires authentication and `view_database_stats` permission.
+    """,
+    response_description="Pool counters",
+)
+async def get_database_pool_stats(
+    current_user: UserOut = Depends(check_permission("view_database_stats"))
+):
+    stats = pool_stats()
+    if read_engine is not engine:
+        stats["replica"] = pool_stats(read_engine)
+    return stats
@@ -23,4 +23,5 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
-    totp_secret = Column(String, nullable=True)
\ No newline at end of file
+    totp_secret = Column(String, nullable=True)
+    auth_version = Column(Integer, nullable=False, default=1, server_default="1")  # bumped to outdate issued tokens
\ No newline at end of file
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional
+from pydantic import BaseModel, EmailStr, computed_field, field_serializer, field_validator
+from typing import Dict, Optional
+from core import media
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -37,6 +38,15 @@ class UserOut(UserBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    @field_serializer("image_path")
+    def serialize_image_path(self, image_path: Optional[str]) -> Optional[str]:
+        return media.media_url(image_path)
+
+    @computed_field
+    @property
+    def image_renditions(self) -> Dict[str, str]:
+        return media.image_renditions(self.image_path)
+
     class Config:
         from_attributes = True
 
@@ -0,0 +1,100 @@
+# user_management/services/audit_log.py
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+from core.database import AsyncSessionLocal
+from core.settings import settings
+from user_management.models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop(): everything ahead of it is written, then the writer exits
+_STOP = object()
+
+
+class AuditLogWriter:
+    """
+    Buffers audit entries in an in-process queue and writes them in batches.
+
+    A background task inserts up to `batch_size` entries per multi-row INSERT, as soon as
+    that many are waiting or `flush_seconds` after the oldest one arrived. Entries reach the
+    database after the request that produced them has returned, so a crash can lose the
+    last batch; deployments that cannot accept that set AUDIT_LOG_SYNC.
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float, queue_size: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether entries are being accepted; callers write synchronously otherwise."""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop accepting entries and wait until everything queued so far is written."""
+        if not self.running:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+
+    async def put(self, entry: Dict):
+        # A full queue makes writers wait, rather than growing without bound if the database stalls
+        await self._queue.put(entry)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            stopping = entry is _STOP
+            batch: List[Dict] = [] if stopping else [entry]
+            deadline = time.monotonic() + self.flush_seconds
+            while not stopping and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                else:
+                    batch.append(entry)
+            await self._write(batch)
+        # Entries from writers that were still waiting on a full queue when stop() was called
+        leftovers = []
+        while not self._queue.empty():
+            leftovers.append(self._queue.get_nowait())
+        for start in range(0, len(leftovers), self.batch_size):
+            await self._write(leftovers[start:start + self.batch_size])
+
+    async def _write(self, entries: List[Dict]):
+        if not entries:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(AuditLog), entries)
+                await db.commit()
+        except Exception:
+            # Never let a bad batch kill the writer; the entries are lost but the service keeps going
+            logger.exception("Failed to write %d audit log entries", len(entries))
+
+
+audit_log_writer = AuditLogWriter(
+    settings.AUDIT_LOG_BATCH_SIZE, settings.AUDIT_LOG_FLUSH_SECONDS, settings.AUDIT_LOG_QUEUE_SIZE
+)
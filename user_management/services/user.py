@@ -1,16 +1,17 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from fastapi import HTTPException, UploadFile
 from user_management.models.user import User
-from user_management.models.audit_log import AuditLog
+from user_management.models.audit_log import AuditLog, generate_uuid
 from user_management.models.role import Role, UserRole
 from user_management.models.permission import Permission, RolePermission
 from user_management.schemas.user import UserCreate, UserUpdate, UserOut
-from core.services.auth import get_password_hash, verify_password
+from core.services.auth import get_password_hash_async, verify_password, invalidate_principal, auth_versions
+from core.media import delete_image, store_image
+from core.settings import settings
+from user_management.services.audit_log import audit_log_writer
 import pyotp
-import aiofiles
 import os
-import uuid
 from datetime import datetime
 
 # Base directory for user images
@@ -20,6 +21,16 @@ USER_IMAGE_DIR = "media/users/images"
 os.makedirs(USER_IMAGE_DIR, exist_ok=True)
 
 
+def _bump_auth_version(user: User):
+    # Outdates the claims of tokens already issued to the user
+    user.auth_version = User.auth_version + 1
+
+
+def _invalidate_auth(user: User):
+    invalidate_principal(user.username)
+    auth_versions.invalidate(user.id)
+
+
 async def create_user(db: AsyncSession, user: UserCreate, current_user_id: str = None) -> User:
     async with db.begin():
         result = await db.execute(select(User).filter(User.username == user.username, User.is_active == True))
@@ -29,7 +40,7 @@ async def create_user(db: AsyncSession, user: UserCreate, current_user_id: str =
         result = await db.execute(select(User).filter(User.email == user.email, User.is_active == True))
         if result.scalars().first():
             raise HTTPException(status_code=400, detail="Email already registered")
-        hashed_password = get_password_hash(user.password) if user.password else None
+        hashed_password = await get_password_hash_async(user.password) if user.password else None
         db_user = User(
             username=user.username,
             email=user.email,
@@ -63,7 +74,9 @@ async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate, c
             raise HTTPException(status_code=403, detail="Only superusers can modify superuser status")
         for key, value in user_update.dict(exclude_unset=True).items():
             setattr(user, key, value)
+        _bump_auth_version(user)
         await db.commit()
+        _invalidate_auth(user)
         await db.refresh(user)
         await log_action(db, current_user.id, "UPDATE_USER",
                          f"Updated user {user.username}, is_super_user={user.is_super_user}")
@@ -76,25 +89,24 @@ async def update_user_image(db: AsyncSession, user_id: str, image: UploadFile, c
         user = result.scalars().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        if image.content_type not in ["image/jpeg", "image/png"]:
+        if image.content_type not in ["image/jpeg", "image/png", "image/webp"]:
             raise HTTPException(status_code=400, detail="Invalid image format")
 
-        # Generate unique filename
-        file_extension = image.filename.split(".")[-1]
-        filename = f"user_{user_id}_{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(USER_IMAGE_DIR, filename)
-
-        # Save file asynchronously
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(await image.read())
-
-        # Delete old image if exists
-        if user.image_path and os.path.exists(user.image_path):
-            os.remove(user.image_path)  # Synchronous, as aiofiles.delete is not critical
+        # Streamed to disk and resized off the event loop; identical images are stored once
+        file_path = await store_image(image, USER_IMAGE_DIR)
+        old_path = user.image_path
+        delete_old = False
+        if old_path and old_path != file_path:
+            # Another user may have uploaded the same image, which then has to stay
+            result = await db.execute(select(User.id).filter(User.image_path == old_path, User.id != user_id).limit(1))
+            delete_old = result.first() is None
 
         # Update path
         user.image_path = file_path
         await db.commit()
+        invalidate_principal(user.username)
+        if delete_old:
+            await delete_image(old_path)
         await db.refresh(user)
         await log_action(db, current_user_id, "UPDATE_USER_IMAGE", f"Updated image for user {user.username}")
         return user
@@ -110,7 +122,9 @@ async def soft_delete_user(db: AsyncSession, user_id: str, current_user_id: str)
             raise HTTPException(status_code=403, detail="Cannot delete superuser")
         user.is_active = False
         user.deleted_at = datetime.utcnow()
+        _bump_auth_version(user)
         await db.commit()
+        _invalidate_auth(user)
         await db.refresh(user)
         await log_action(db, current_user_id, "DELETE_USER", f"Soft-deleted user {user.username}")
         return user
@@ -179,7 +193,9 @@ async def assign_role_to_user(db: AsyncSession, user_id: str, role_id: str, curr
             raise HTTPException(status_code=400, detail="Role already assigned to user")
         user_role = UserRole(user_id=user_id, role_id=role_id)
         db.add(user_role)
+        _bump_auth_version(user)
         await db.commit()
+        _invalidate_auth(user)
         await log_action(db, current_user_id, "ASSIGN_ROLE", f"Assigned role {role_id} to user {user_id}")
 
 
@@ -197,12 +213,28 @@ async def assign_permission_to_role(db: AsyncSession, role_id: str, permission_i
             raise HTTPException(status_code=400, detail="Permission already assigned to role")
         role_permission = RolePermission(role_id=role_id, permission_id=permission_id)
         db.add(role_permission)
+        # Every holder of the role gains the permission, so their tokens are outdated too
+        result = await db.execute(select(UserRole.user_id).filter(UserRole.role_id == role_id))
+        holder_ids = result.scalars().all()
+        await db.execute(
+            update(User).where(User.id.in_(holder_ids)).values(auth_version=User.auth_version + 1)
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
+        invalidate_principal()
+        auth_versions.invalidate(*holder_ids)
         await log_action(db, current_user_id, "ASSIGN_PERMISSION",
                          f"Assigned permission {permission_id} to role {role_id}")
 
 
 async def log_action(db: AsyncSession, user_id: str, action: str, details: str = None):
+    # Batched by the background writer unless strict durability (AUDIT_LOG_SYNC) is asked for
+    # or the writer is not running, as in scripts
+    if not settings.AUDIT_LOG_SYNC and audit_log_writer.running:
+        await audit_log_writer.put(
+            {"id": generate_uuid(), "user_id": user_id, "action": action, "details": details, "timestamp": datetime.utcnow()}
+        )
+        return
     audit_log = AuditLog(user_id=user_id, action=action, details=details, timestamp=datetime.utcnow())
     db.add(audit_log)
     await db.commit()
\ No newline at end of file